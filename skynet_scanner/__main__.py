@@ -0,0 +1,130 @@
+"""Scanner en ligne de commande, sans passer par l'API HTTP.
+
+    python -m skynet_scanner scan domaines.txt -o rapports.ndjson --checkpoint scan.ckpt
+    python -m skynet_scanner import prospects.csv --column email | python -m skynet_scanner scan - --format csv
+
+scan lit un domaine par ligne (fichier ou entrée standard), lance les mêmes fonctions
+que /api/scan/batch et écrit chaque rapport dès qu'il est prêt. Avec --checkpoint, chaque
+domaine terminé y est ajouté après l'écriture de son rapport : une exécution interrompue
+puis relancée avec les mêmes options reprend là où elle s'était arrêtée (sortie complétée).
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+
+# Les modules du scanner s'importent à plat (comme sous uvicorn main:app)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+CSV_COLUMNS = ("domain", "scanned_at", "criticality_score", "email_template_id", "has_vulnerability", "vulnerability_reasons",
+               "timed_out_checks")
+
+
+def _read_domains(source, normalize):
+    if normalize:
+        from importer import DomainImporter
+        return list(DomainImporter().domains(source))
+    domains = (line.strip() for line in source)
+    # Doublons sans tenir compte de la casse (comme /api/scan/batch et le checkpoint) ; la première forme est gardée
+    unique = {}
+    for d in domains:
+        if d and not d.startswith("#"): unique.setdefault(d.lower(), d)
+    return list(unique.values())
+
+
+def _read_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.strip().lower() for line in f if line.strip()}
+
+
+class _ReportWriter:
+    def __init__(self, path, fmt, append):
+        self.format = fmt
+        new = path == "-" or not append or not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = sys.stdout if path == "-" else open(path, "a" if append else "w", newline="", encoding="utf-8")
+        self.csv = csv.writer(self.file) if fmt == "csv" else None
+        if self.csv and new: self.csv.writerow(CSV_COLUMNS)
+
+    def write(self, report):
+        if self.csv:
+            self.csv.writerow([" | ".join(report[c]) if c in ("vulnerability_reasons", "timed_out_checks") else report[c]
+                               for c in CSV_COLUMNS])
+        else:
+            self.file.write(json.dumps(report, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        if self.file is not sys.stdout: self.file.close()
+
+
+async def scan_command(args):
+    import main
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8-sig", errors="replace")
+    with source:
+        domains = _read_domains(source, args.normalize)
+    done = _read_checkpoint(args.checkpoint)
+    invalid = [d for d in domains if not main.DOMAIN_RE.match(d)]
+    todo = [d for d in domains if main.DOMAIN_RE.match(d) and d.lower() not in done]
+    for d in invalid: print(f"Domaine ignoré (format invalide) : {d}", file=sys.stderr)
+    print(f"{len(todo)} domaines à scanner, {len(domains) - len(todo) - len(invalid)} déjà faits (checkpoint)", file=sys.stderr)
+
+    writer = _ReportWriter(args.output, args.format, append=bool(done))
+    checkpoint = open(args.checkpoint, "a", encoding="utf-8") if args.checkpoint else None
+    limiter = main.ScanLimiter(global_limit=args.concurrency)
+    started, count = time.monotonic(), 0
+    try:
+        async for report in main.iter_batch_scan(todo, limiter, args.force_refresh, args.ports, deadline=args.deadline,
+                                                 incremental=args.incremental):
+            writer.write(report)
+            if checkpoint:
+                checkpoint.write(report["domain"] + "\n")
+                checkpoint.flush()
+            count += 1
+            if args.progress and count % args.progress == 0:
+                print(f"{count}/{len(todo)} ({count / (time.monotonic() - started):.1f} domaines/s)", file=sys.stderr)
+    finally:
+        writer.close()
+        if checkpoint: checkpoint.close()
+        await main.close_shared_clients()
+    print(f"{count} domaines scannés en {time.monotonic() - started:.1f} s", file=sys.stderr)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m skynet_scanner")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan = commands.add_parser("scan", help="scanne une liste de domaines et écrit les rapports au fil de l'eau")
+    scan.add_argument("input", nargs="?", default="-", help="un domaine par ligne ; - pour l'entrée standard (défaut)")
+    scan.add_argument("-o", "--output", default="-", help="fichier de sortie (défaut : sortie standard)")
+    scan.add_argument("--format", default="ndjson", choices=("ndjson", "csv"))
+    scan.add_argument("-c", "--concurrency", type=int, default=int(os.getenv("SCAN_GLOBAL_CONCURRENCY", "200")),
+                      help="vérifications simultanées, tous domaines confondus")
+    scan.add_argument("--checkpoint", help="fichier des domaines terminés : relancer avec le même fichier reprend le scan")
+    scan.add_argument("--ports", help="profil de ports (critical, top100, well_known) ou liste \"22,80,8000-8100\"")
+    scan.add_argument("--deadline", type=float, help="délai max par domaine, en secondes")
+    scan.add_argument("--force-refresh", action="store_true", help="ignore le cache de résultats")
+    scan.add_argument("--incremental", action="store_true", help="ne relance que les vérifications dont les entrées ont changé")
+    scan.add_argument("--normalize", action="store_true", help="entrée brute (URL, e-mails, CSV...) : normalise et déduplique")
+    scan.add_argument("--progress", type=int, default=100, help="avancement sur stderr tous les N domaines (0 : jamais)")
+
+    commands.add_parser("import", help="normalise une liste de prospects (voir importer.py)", add_help=False)
+
+    args, rest = parser.parse_known_args(argv)
+    if args.command == "import":
+        from importer import main as import_main
+        return import_main(rest)
+    if rest: parser.error(f"arguments inconnus : {' '.join(rest)}")
+    try:
+        asyncio.run(scan_command(args))
+    except KeyboardInterrupt:
+        print("Interrompu : relancer avec le même --checkpoint pour reprendre", file=sys.stderr)
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main_cli()
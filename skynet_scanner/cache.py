@@ -0,0 +1,140 @@
+"""Cache des résultats de vérification par domaine, avec un TTL propre à chaque vérification.
+
+Mémoire bornée (éviction LRU) + stockage SQLite optionnel qui survit aux redémarrages.
+Depuis la boucle asyncio, passer par aget() / aset() : SQLite (un commit par écriture) part dans un thread.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# TTL par défaut (secondes) : SSL et DNS bougent peu, les ports beaucoup plus
+DEFAULT_TTLS = {
+    "ssl": 6 * 3600,
+    "email_security": 6 * 3600,
+    "web": 30 * 60,
+    "exposed_ports": 10 * 60,
+}
+
+
+class SQLiteCacheBackend:
+    """Persistance du cache : une ligne par (vérification, domaine)"""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS scan_cache (key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)")
+        self._db.execute("DELETE FROM scan_cache WHERE expires_at < ?", (time.time(),))
+        self._db.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT expires_at, value FROM scan_cache WHERE key = ?", (key,)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def set(self, key, expires_at, value):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO scan_cache VALUES (?, ?, ?)",
+                             (key, expires_at, json.dumps(value, ensure_ascii=False)))
+            self._db.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute("DELETE FROM scan_cache WHERE key = ?", (key,))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class ResultCache:
+    """get/set par (domaine, vérification) ; un TTL absent ou nul désactive le cache pour cette vérification.
+
+    variant distingue deux exécutions d'une même vérification avec des paramètres différents (ex : profil de ports)."""
+
+    def __init__(self, ttls=None, max_entries=50000, backend=None):
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.max_entries = max_entries
+        self.backend = backend
+        self._entries = OrderedDict()  # clé -> (expire_à, valeur)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(domain, check, variant=None):
+        key = f"{check}:{domain.lower()}"
+        return f"{key}#{variant}" if variant else key
+
+    def get(self, domain, check, variant=None):
+        if not self.ttls.get(check):
+            return None
+        key = self._key(domain, check, variant)
+        entry = self._entries.get(key)
+        if entry is None and self.backend is not None:
+            entry = self.backend.get(key)
+            if entry is not None: self._store(key, entry)
+        if entry is not None and entry[0] < time.time():
+            self._entries.pop(key, None)
+            if self.backend is not None: self.backend.delete(key)
+            entry = None
+        return self._count(key, entry)
+
+    async def aget(self, domain, check, variant=None):
+        """get() sans bloquer la boucle : une entrée en mémoire est servie tout de suite, SQLite est lu dans un thread"""
+        if not self.ttls.get(check):
+            return None
+        key = self._key(domain, check, variant)
+        entry = self._entries.get(key)
+        if entry is None and self.backend is not None:
+            entry = await asyncio.to_thread(self.backend.get, key)
+            if entry is not None: self._store(key, entry)
+        if entry is not None and entry[0] < time.time():
+            self._entries.pop(key, None)
+            if self.backend is not None: await asyncio.to_thread(self.backend.delete, key)
+            entry = None
+        return self._count(key, entry)
+
+    def _count(self, key, entry):
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, domain, check, value, variant=None):
+        entry = self._entry(domain, check, value, variant)
+        if entry and self.backend is not None: self.backend.set(*entry)
+
+    async def aset(self, domain, check, value, variant=None):
+        """set() sans bloquer la boucle : la mémoire est à jour tout de suite, l'écriture SQLite suit dans un thread"""
+        entry = self._entry(domain, check, value, variant)
+        if entry and self.backend is not None: await asyncio.to_thread(self.backend.set, *entry)
+
+    def _entry(self, domain, check, value, variant):
+        """Met la valeur en mémoire ; (clé, expire_à, valeur) à persister, ou None si le cache est désactivé pour check"""
+        ttl = self.ttls.get(check)
+        if not ttl:
+            return None
+        key = self._key(domain, check, variant)
+        entry = (time.time() + ttl, value)
+        self._store(key, entry)
+        return (key, *entry)
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None}
+
+    def close(self):
+        if self.backend is not None: self.backend.close()
@@ -0,0 +1,128 @@
+"""Certificats déjà vus, indexés par empreinte SHA-256 du DER, et suivi de leur expiration.
+
+Un certificat déjà connu n'est plus décodé : son résumé (sujet, émetteur, SAN, dates)
+est relu depuis la mémoire ou SQLite. La table cert_domains garde, pour chaque domaine
+scanné, le certificat qu'il présentait en dernier : expiring(days) liste ainsi tout ce
+qui expire bientôt sans rien rescanner (balayage quotidien).
+
+Les lectures et écritures SQLite (un fsync par commit sur disque) partent dans un thread,
+comme dans history.py : acertificate() et aseen() n'arrêtent pas la boucle asyncio.
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import ssl
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from tls_inspect import describe_certificate
+
+_FIELDS = ("fingerprint", "subject", "issuer", "sans", "not_before", "not_after", "expires_at")
+
+
+def fingerprint(der):
+    return hashlib.sha256(der).hexdigest()
+
+
+def days_remaining(record, now=None):
+    return int((record["expires_at"] - (time.time() if now is None else now)) // 86400)
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class CertificateStore:
+    """acertificate(der, decode) -> résumé ; path=":memory:" si aucune persistance n'est voulue"""
+
+    def __init__(self, path=":memory:", max_entries=50000):
+        self.max_entries = max_entries
+        self._records = OrderedDict()  # empreinte -> résumé
+        self._current = OrderedDict()  # domaine -> empreinte déjà enregistrée (max_entries au plus)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS certificates ("
+            "fingerprint TEXT PRIMARY KEY, subject TEXT, issuer TEXT, sans TEXT NOT NULL, not_before TEXT, not_after TEXT, "
+            "expires_at REAL NOT NULL, first_seen TEXT NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS certificates_expiry ON certificates(expires_at)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cert_domains (domain TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, since TEXT NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS cert_domains_fingerprint ON cert_domains(fingerprint)")
+        self._db.commit()
+
+    def _lookup(self, key):
+        with self._lock:
+            row = self._db.execute(f"SELECT {','.join(_FIELDS)} FROM certificates WHERE fingerprint = ?", (key,)).fetchone()
+        return dict(zip(_FIELDS, row), sans=json.loads(row[3])) if row is not None else None
+
+    def _insert(self, record):
+        with self._lock:
+            self._db.execute(f"INSERT OR IGNORE INTO certificates VALUES ({','.join('?' * (len(_FIELDS) + 1))})",
+                             [json.dumps(record[f]) if f == "sans" else record[f] for f in _FIELDS] + [_now()])
+            self._db.commit()
+
+    def _link(self, domain, fingerprint):
+        with self._lock:
+            self._db.execute("INSERT INTO cert_domains VALUES (?, ?, ?) ON CONFLICT(domain) DO UPDATE SET "
+                             "fingerprint = excluded.fingerprint, since = excluded.since WHERE fingerprint != excluded.fingerprint",
+                             (domain, fingerprint, _now()))
+            self._db.commit()
+
+    def _decode(self, key, decode):
+        self.misses += 1
+        summary = describe_certificate(decode())
+        return {"fingerprint": key, **{f: summary[f] for f in _FIELDS[1:-1]}, "expires_at": ssl.cert_time_to_seconds(summary["not_after"])}
+
+    def _remember(self, cache, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+    async def acertificate(self, der, decode):
+        """Résumé du certificat der ; decode() (ssock.getpeercert) n'est appelé que s'il est inconnu, SQLite dans un thread"""
+        key = fingerprint(der)
+        record = self._records.get(key) or await asyncio.to_thread(self._lookup, key)
+        if record is not None:
+            self.hits += 1
+        else:
+            record = self._decode(key, decode)
+            await asyncio.to_thread(self._insert, record)
+        self._remember(self._records, key, record)
+        return record
+
+    async def aseen(self, domain, fingerprint):
+        """domain présente désormais ce certificat (écrit seulement s'il a changé)"""
+        domain = domain.lower()
+        if self._current.get(domain) != fingerprint:
+            await asyncio.to_thread(self._link, domain, fingerprint)
+        self._remember(self._current, domain, fingerprint)
+
+    def expiring(self, days, limit=100, offset=0):
+        """Certificats encore présentés par au moins un domaine et qui expirent d'ici days jours (déjà expirés inclus)"""
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {','.join('c.' + f for f in _FIELDS)}, GROUP_CONCAT(d.domain) FROM certificates c "
+                "JOIN cert_domains d ON d.fingerprint = c.fingerprint WHERE c.expires_at <= ? "
+                "GROUP BY c.fingerprint ORDER BY c.expires_at LIMIT ? OFFSET ?",
+                (now + days * 86400, limit, offset)).fetchall()
+        certificates = []
+        for row in rows:
+            record = dict(zip(_FIELDS, row), sans=json.loads(row[3]))
+            certificates.append({**record, "days_remaining": days_remaining(record, now), "domains": sorted(row[-1].split(","))})
+        return certificates
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._records)}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
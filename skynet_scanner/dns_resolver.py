@@ -0,0 +1,165 @@
+"""Résolution DNS directe (UDP, repli TCP si réponse tronquée) avec cache TTL en mémoire.
+
+- les TTL des enregistrements sont respectés (bornés par min_ttl / max_ttl) ;
+- les réponses négatives (NXDOMAIN, pas d'enregistrement) sont aussi mises en cache ;
+- deux lookups simultanés du même nom partagent la même requête réseau ;
+- DoH (dns.google) sert de secours si aucun résolveur ne répond.
+"""
+import asyncio
+import functools
+import re
+import time
+from collections import OrderedDict
+
+import dns.asyncquery
+import dns.exception
+import dns.message
+import dns.rcode
+import dns.rdatatype
+
+
+class DNSError(Exception):
+    pass
+
+
+def _rdata_to_text(rdata):
+    if rdata.rdtype == dns.rdatatype.TXT:
+        return b"".join(rdata.strings).decode("utf-8", "replace")
+    return rdata.to_text()
+
+
+def _doh_data_to_text(rdtype, data):
+    # dns.google renvoie parfois les TXT multi-chaînes sous la forme "abc" "def"
+    if rdtype == "TXT" and data.startswith('"'):
+        return "".join(re.findall(r'"((?:[^"\\]|\\.)*)"', data))
+    return data
+
+
+def parse_nameservers(value):
+    """ "1.1.1.1,127.0.0.1:5353" -> [("1.1.1.1", 53), ("127.0.0.1", 5353)]"""
+    servers = []
+    for item in filter(None, (v.strip() for v in value.split(","))):
+        if item.startswith("["):  # [IPv6]:port
+            host, _, port = item[1:].partition("]")
+            servers.append((host, int(port.lstrip(":") or 53)))
+        elif item.count(":") == 1:
+            host, port = item.split(":")
+            servers.append((host, int(port)))
+        else:
+            servers.append((item, 53))
+    return servers
+
+
+def system_nameservers():
+    servers = []
+    try:
+        with open("/etc/resolv.conf") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == "nameserver": servers.append((parts[1], 53))
+    except OSError:
+        pass
+    return servers or [("1.1.1.1", 53), ("8.8.8.8", 53)]
+
+
+class Resolver:
+    """resolve(name, "TXT") -> liste de chaînes ; [] si le nom ou l'enregistrement n'existe pas.
+
+    doh_client : fonction sans argument qui renvoie un httpx.AsyncClient (repli DoH), ou None."""
+
+    def __init__(self, nameservers=None, timeout=2.0, doh_client=None, doh_url="https://dns.google/resolve",
+                 max_entries=100000, min_ttl=30, max_ttl=86400, negative_ttl=300):
+        self.nameservers = nameservers or system_nameservers()
+        self.timeout = timeout
+        self.doh_client = doh_client
+        self.doh_url = doh_url
+        self.max_entries = max_entries
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self._cache = OrderedDict()  # (nom, type) -> (expire_à, enregistrements)
+        self._inflight = {}          # (nom, type) -> tâche de résolution en cours
+        self.hits = 0
+        self.misses = 0
+
+    async def resolve(self, name, rdtype="TXT"):
+        key = (name.lower().rstrip("."), rdtype.upper())
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] >= time.monotonic():
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+        self.misses += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._lookup(*key))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._lookup_done, key))
+        # shield : l'annulation d'un appelant ne doit pas annuler la requête des autres
+        records, _ = await asyncio.shield(task)
+        return list(records)
+
+    def _lookup_done(self, key, task):
+        self._inflight.pop(key, None)
+        # Tous les appelants ont pu être annulés entre-temps : on récupère l'erreur pour ne pas la perdre en warning
+        if not task.cancelled(): task.exception()
+
+    async def _lookup(self, name, rdtype):
+        try:
+            records, ttl = await self._query_direct(name, rdtype)
+        except DNSError:
+            if self.doh_client is None: raise
+            records, ttl = await self._query_doh(name, rdtype)
+        ttl = min(max(ttl, self.min_ttl), self.max_ttl)
+        self._cache[(name, rdtype)] = (time.monotonic() + ttl, tuple(records))
+        self._cache.move_to_end((name, rdtype))
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return records, ttl
+
+    async def _query_direct(self, name, rdtype):
+        errors = []
+        query = dns.message.make_query(name, rdtype)
+        wanted = dns.rdatatype.from_text(rdtype)
+        for host, port in self.nameservers:
+            try:
+                response, _ = await dns.asyncquery.udp_with_fallback(query, host, timeout=self.timeout, port=port)
+            except (dns.exception.DNSException, OSError) as e:
+                errors.append(f"{host}: {type(e).__name__}")
+                continue
+            rcode = response.rcode()
+            if rcode == dns.rcode.NXDOMAIN:
+                return [], self._negative_ttl(response)
+            if rcode != dns.rcode.NOERROR:
+                errors.append(f"{host}: {dns.rcode.to_text(rcode)}")
+                continue
+            rrsets = [r for r in response.answer if r.rdtype == wanted]
+            if not rrsets:
+                return [], self._negative_ttl(response)
+            return [_rdata_to_text(rd) for r in rrsets for rd in r], min(r.ttl for r in rrsets)
+        raise DNSError(f"DNS {rdtype} {name}: " + ", ".join(errors))
+
+    def _negative_ttl(self, response):
+        for rrset in response.authority:
+            if rrset.rdtype == dns.rdatatype.SOA:
+                return min(rrset.ttl, rrset[0].minimum)
+        return self.negative_ttl
+
+    async def _query_doh(self, name, rdtype):
+        try:
+            r = await self.doh_client().get(self.doh_url, params={"name": name, "type": rdtype}, timeout=self.timeout * 2)
+            data = r.json()
+        except Exception as e:
+            raise DNSError(f"DoH {rdtype} {name}: {type(e).__name__}")
+        if data.get("Status") == 3:
+            return [], self.negative_ttl
+        if data.get("Status") != 0:
+            raise DNSError(f"DoH {rdtype} {name}: status {data.get('Status')}")
+        wanted = int(dns.rdatatype.from_text(rdtype))
+        answers = [a for a in data.get("Answer", []) if a.get("type") == wanted]
+        if not answers:
+            return [], self.negative_ttl
+        return [_doh_data_to_text(rdtype, a.get("data", "")) for a in answers], min(a.get("TTL", 0) for a in answers)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._cache), "inflight": len(self._inflight)}
@@ -0,0 +1,157 @@
+"""Posture e-mail approfondie : arbre SPF (include/redirect), sélecteurs DKIM, MTA-STS, TLS-RPT, BIMI.
+
+Toutes les requêtes passent par le même Resolver (cache TTL + déduplication), si bien
+qu'une chaîne d'include partagée (ex : _spf.google.com) n'est résolue qu'une fois
+pour tout un lot de domaines.
+"""
+import asyncio
+import re
+
+from dns_resolver import DNSError
+from metrics import count_error
+
+SPF_LOOKUP_LIMIT = 10  # RFC 7208 §4.6.4
+SPF_MAX_DEPTH = 10
+_SPF_LOOKUP_MECHANISMS = ("include", "a", "mx", "ptr", "exists")
+
+# Sélecteurs DKIM les plus courants (Google, Microsoft 365, Mailchimp, SendGrid, Zoho, Fastmail...), du plus au moins répandu
+COMMON_DKIM_SELECTORS = [
+    "default", "google", "selector1", "selector2", "k1", "k2", "k3", "mail", "dkim", "s1", "s2",
+    "smtp", "mandrill", "mailjet", "zoho", "zmail", "protonmail", "protonmail2", "fm1", "fm2", "fm3",
+    "mxvault", "sig1", "everlytickey1", "everlytickey2", "scph0722", "key1", "key2",
+]
+
+
+async def _txt(resolver, name, prefix):
+    return [r for r in await resolver.resolve(name, "TXT") if r.strip().lower().startswith(prefix.lower())]
+
+
+def _tags(record):
+    """ "v=STSv1; id=2024" -> {"v": "STSv1", "id": "2024"}"""
+    tags = {}
+    for part in record.split(";"):
+        key, sep, value = part.strip().partition("=")
+        if sep: tags[key.strip().lower()] = value.strip()
+    return tags
+
+
+async def _spf_walk(resolver, name, stack, errors, includes):
+    """Compte les mécanismes qui coûtent une requête DNS dans l'arbre SPF de name"""
+    if name in stack:
+        errors.append(f"Boucle SPF via {name}")
+        return 0
+    if len(stack) >= SPF_MAX_DEPTH:
+        errors.append(f"Arbre SPF trop profond ({name})")
+        return 0
+    try:
+        records = await _txt(resolver, name, "v=spf1")
+    except DNSError as e:
+        errors.append(str(e))
+        return 0
+    if not records:
+        if stack: errors.append(f"{name}: pas d'enregistrement SPF")
+        return 0
+    if len(records) > 1:
+        errors.append(f"{name}: plusieurs enregistrements SPF")
+
+    lookups, children = 0, []
+    for term in records[0].split()[1:]:
+        m = re.match(r"([a-z0-9]+)(?:[:=](\S*))?", term.lower().lstrip("+-~?"))
+        if not m: continue
+        mechanism, value = m.group(1), (m.group(2) or "").split("/")[0]
+        if mechanism in ("include", "redirect"):
+            lookups += 1
+            if mechanism == "include": includes.append(value)
+            if value and "%" not in value: children.append(value)  # les macros ne se résolvent qu'à la réception
+        elif mechanism in _SPF_LOOKUP_MECHANISMS:
+            lookups += 1
+    sub = await asyncio.gather(*(_spf_walk(resolver, c, stack + (name,), errors, includes) for c in children))
+    return lookups + sum(sub)
+
+
+async def check_spf_tree(resolver, domain):
+    result = {"record": None, "lookups": 0, "too_many_lookups": False, "all_qualifier": None, "includes": [], "errors": []}
+    records = await _txt(resolver, domain, "v=spf1")
+    if not records:
+        return result
+    result["record"] = records[0]
+    m = re.search(r"(?:^|\s)([+\-~?]?)all(?:\s|$)", records[0].lower())
+    if m: result["all_qualifier"] = (m.group(1) or "+") + "all"
+    includes = []
+    result["lookups"] = await _spf_walk(resolver, domain, (), result["errors"], includes)
+    result["includes"] = list(dict.fromkeys(includes))
+    result["too_many_lookups"] = result["lookups"] > SPF_LOOKUP_LIMIT
+    return result
+
+
+async def check_dkim_selectors(resolver, domain, selectors=COMMON_DKIM_SELECTORS, all_selectors=False, wave=4):
+    """Sélecteurs publiés, sondés par vagues de `wave` dans l'ordre de la liste : on s'arrête à la première
+    vague qui en trouve un (all_selectors : toute la liste). None si rien n'est trouvé alors qu'une requête
+    a échoué : l'absence de DKIM n'est pas établie."""
+    failed = False
+    async def probe(selector):
+        nonlocal failed
+        try:
+            records = await resolver.resolve(f"{selector}._domainkey.{domain}", "TXT")
+        except DNSError as e:
+            count_error("email_posture", e)
+            failed = True
+            return None
+        # p= vide : clé révoquée
+        return selector if any(_tags(r).get("p") for r in records if "p=" in r) else None
+    found = []
+    for i in range(0, len(selectors), wave):
+        found += [s for s in await asyncio.gather(*(probe(s) for s in selectors[i:i + wave])) if s]
+        if found and not all_selectors: break
+    return found if found or not failed else None
+
+
+async def check_mta_sts(resolver, domain, http_client=None):
+    result = {"found": False, "id": None, "mode": None, "policy_error": None}
+    records = await _txt(resolver, f"_mta-sts.{domain}", "v=STSv1")
+    if not records:
+        return result
+    result["found"] = True
+    result["id"] = _tags(records[0]).get("id")
+    if http_client is not None:
+        try:
+            r = await http_client.get(f"https://mta-sts.{domain}/.well-known/mta-sts.txt", timeout=5)
+            if r.status_code == 200:
+                m = re.search(r"^mode:\s*(\w+)", r.text, re.MULTILINE | re.IGNORECASE)
+                result["mode"] = m.group(1).lower() if m else None
+            else:
+                result["policy_error"] = f"HTTP {r.status_code}"
+        except Exception as e:
+            count_error("email_posture", e)
+            result["policy_error"] = str(e) or type(e).__name__
+    return result
+
+
+async def check_tls_rpt(resolver, domain):
+    return bool(await _txt(resolver, f"_smtp._tls.{domain}", "v=TLSRPTv1"))
+
+
+async def check_bimi(resolver, domain):
+    records = await _txt(resolver, f"default._bimi.{domain}", "v=BIMI1")
+    if not records:
+        return {"found": False, "logo": None, "vmc": None}
+    tags = _tags(records[0])
+    return {"found": True, "logo": tags.get("l") or None, "vmc": tags.get("a") or None}
+
+
+async def check_email_posture(resolver, domain, http_client=None, dkim_all_selectors=False):
+    """Toutes les vérifications en parallèle ; une erreur DNS n'invalide que la vérification concernée (résultat None : inconnu)"""
+    async def safe(coro, default):
+        try:
+            return await coro
+        except DNSError as e:
+            count_error("email_posture", e)
+            return default
+    spf, dkim, mta_sts, tls_rpt, bimi = await asyncio.gather(
+        safe(check_spf_tree(resolver, domain), None),
+        safe(check_dkim_selectors(resolver, domain, all_selectors=dkim_all_selectors), None),
+        safe(check_mta_sts(resolver, domain, http_client), None),
+        safe(check_tls_rpt(resolver, domain), False),
+        safe(check_bimi(resolver, domain), None),
+    )
+    return {"spf": spf, "dkim_selectors": dkim, "mta_sts": mta_sts, "tls_rpt": tls_rpt, "bimi": bimi}
@@ -0,0 +1,494 @@
+"""Détection des technologies d'un site (CMS, frameworks, serveurs, CDN...) à la manière de Wappalyzer.
+
+Chaque signature est réduite à un littéral obligatoire ; tous ces littéraux sont compilés
+en une seule regex en arbre (une pour les en-têtes, une pour le corps). La page n'est
+parcourue qu'une fois, quel que soit le nombre de signatures, et le corps peut être
+fourni morceau par morceau (feed).
+"""
+import re
+
+# nom -> {cat, html: [regex], script: [regex dans src], meta: regex du generator, headers: {en-tête: regex},
+#         cookies: [préfixe du nom], implies: [autres technologies]}
+# Un groupe capturant dans une regex donne la version.
+SIGNATURES = {
+    # --- CMS ---
+    "WordPress": {"cat": "CMS", "html": [r"/wp-(?:content|includes)/"], "meta": r"WordPress ?([\d.]+)?",
+                  "headers": {"link": r"api\.w\.org", "x-pingback": r"/xmlrpc\.php"}, "cookies": ["wordpress_", "wp-settings-"],
+                  "implies": ["PHP"]},
+    "Joomla": {"cat": "CMS", "html": [r"/media/jui/", r"/media/system/js/"], "meta": r"Joomla!? ?([\d.]+)?",
+               "headers": {"x-content-encoded-by": r"Joomla"}, "implies": ["PHP"]},
+    "Drupal": {"cat": "CMS", "html": [r"/sites/(?:default|all)/(?:files|themes|modules)/", r"drupalSettings", r"Drupal\.settings"],
+               "meta": r"Drupal ?([\d.]+)?", "headers": {"x-drupal-cache": r"", "x-generator": r"Drupal ?([\d.]+)?"},
+               "implies": ["PHP"]},
+    "TYPO3": {"cat": "CMS", "html": [r"/typo3(?:conf|temp)/"], "meta": r"TYPO3 ?([\d.]+)? CMS", "implies": ["PHP"]},
+    "Contao": {"cat": "CMS", "html": [r"/system/modules/", r"/bundles/contao"], "meta": r"Contao Open Source CMS", "implies": ["PHP"]},
+    "Concrete CMS": {"cat": "CMS", "html": [r"/concrete/js/", r"CCM_DISPATCHER_FILENAME"], "meta": r"concrete5 ?- ?([\d.]+)?",
+                     "implies": ["PHP"]},
+    "SPIP": {"cat": "CMS", "html": [r"spip\.php\?page="], "meta": r"SPIP ?([\d.]+)?", "headers": {"composed-by": r"SPIP ?([\d.]+)?"},
+             "implies": ["PHP"]},
+    "Ghost": {"cat": "CMS", "html": [r"/ghost/api/", r"ghost-(?:portal|search)"], "meta": r"Ghost ?([\d.]+)?",
+              "headers": {"x-ghost-cache-status": r""}, "implies": ["Node.js"]},
+    "Craft CMS": {"cat": "CMS", "headers": {"x-powered-by": r"Craft CMS"}, "cookies": ["CraftSessionId"], "implies": ["PHP"]},
+    "Umbraco": {"cat": "CMS", "html": [r"/umbraco/"], "headers": {"x-umbraco-version": r"([\d.]+)"}, "implies": ["ASP.NET"]},
+    "DNN": {"cat": "CMS", "html": [r"/DesktopModules/", r"dnn_ContentPane"], "cookies": ["dnn_IsMobile"], "implies": ["ASP.NET"]},
+    "Sitecore": {"cat": "CMS", "html": [r"/-/media/", r"/sitecore/shell/"], "cookies": ["SC_ANALYTICS_GLOBAL_COOKIE"],
+                 "implies": ["ASP.NET"]},
+    "Adobe Experience Manager": {"cat": "CMS", "html": [r"/etc\.clientlibs/", r"/content/dam/"]},
+    "Kentico": {"cat": "CMS", "html": [r"/CMSPages/GetResource\.ashx"], "cookies": ["CMSPreferredCulture"], "implies": ["ASP.NET"]},
+    "Plone": {"cat": "CMS", "html": [r"portal_javascripts", r"plone-"], "meta": r"Plone", "implies": ["Python"]},
+    "Wagtail": {"cat": "CMS", "html": [r"/static/wagtail"], "implies": ["Django"]},
+    "Django CMS": {"cat": "CMS", "html": [r"cms-plugin", r"/static/cms/"], "implies": ["Django"]},
+    "Grav": {"cat": "CMS", "meta": r"GravCMS", "implies": ["PHP"]},
+    "Kirby": {"cat": "CMS", "meta": r"Kirby ?([\d.]+)?", "cookies": ["kirby_session"], "implies": ["PHP"]},
+    "October CMS": {"cat": "CMS", "meta": r"OctoberCMS", "cookies": ["october_session"], "implies": ["Laravel"]},
+    "Statamic": {"cat": "CMS", "headers": {"x-powered-by": r"Statamic"}, "implies": ["Laravel"]},
+    "ProcessWire": {"cat": "CMS", "html": [r"/site/templates/"], "headers": {"x-powered-by": r"ProcessWire"}, "implies": ["PHP"]},
+    "MODX": {"cat": "CMS", "html": [r"/assets/components/"], "headers": {"x-powered-by": r"MODX"}, "implies": ["PHP"]},
+    "Bitrix": {"cat": "CMS", "html": [r"/bitrix/(?:js|templates|cache)/"], "headers": {"x-powered-cms": r"Bitrix"},
+               "cookies": ["BITRIX_SM_"], "implies": ["PHP"]},
+    "Jimdo": {"cat": "CMS", "html": [r"jimdo(?:cdn)?\.com"], "headers": {"x-jimdo-instance": r""}},
+    "Wix": {"cat": "CMS", "html": [r"static\.wixstatic\.com", r"static\.parastorage\.com"], "meta": r"Wix\.com",
+            "headers": {"x-wix-request-id": r""}},
+    "Squarespace": {"cat": "CMS", "html": [r"static\d?\.squarespace\.com"], "headers": {"server": r"Squarespace"}},
+    "Webflow": {"cat": "CMS", "html": [r"assets\.website-files\.com", r"data-wf-page"], "meta": r"Webflow"},
+    "Weebly": {"cat": "CMS", "html": [r"editmysite\.com"]},
+    "Duda": {"cat": "CMS", "html": [r"dudamobile\.com", r"irp\.cdn-website\.com"]},
+    "Blogger": {"cat": "CMS", "html": [r"blogger\.com/static/"], "meta": r"blogger"},
+    "Medium": {"cat": "CMS", "html": [r"cdn-static-1\.medium\.com"]},
+    "HubSpot CMS": {"cat": "CMS", "html": [r"/hs/hsstatic/"], "headers": {"x-hs-hub-id": r""}},
+    "Strapi": {"cat": "CMS", "headers": {"x-powered-by": r"Strapi"}, "implies": ["Node.js"]},
+    "Contentful": {"cat": "CMS", "html": [r"(?:images|assets)\.ctfassets\.net"]},
+    "Prismic": {"cat": "CMS", "html": [r"images\.prismic\.io", r"cdn\.prismic\.io"]},
+    "Sanity": {"cat": "CMS", "html": [r"cdn\.sanity\.io"]},
+    "Storyblok": {"cat": "CMS", "html": [r"a\.storyblok\.com"]},
+    "DatoCMS": {"cat": "CMS", "html": [r"datocms-assets\.com"]},
+    "Hugo": {"cat": "CMS", "meta": r"Hugo ([\d.]+)"},
+    "Jekyll": {"cat": "CMS", "meta": r"Jekyll v?([\d.]+)"},
+    "Gatsby": {"cat": "CMS", "html": [r"id=\"___gatsby\""], "meta": r"Gatsby ?([\d.]+)?", "implies": ["React"]},
+    "Docusaurus": {"cat": "CMS", "meta": r"Docusaurus ?v?([\d.]+)?", "implies": ["React"]},
+    "MkDocs": {"cat": "CMS", "meta": r"mkdocs-([\d.]+)"},
+    "Moodle": {"cat": "LMS", "html": [r"/theme/yui_combo\.php", r"M\.cfg = "], "cookies": ["MoodleSession"], "implies": ["PHP"]},
+    "MediaWiki": {"cat": "Wiki", "html": [r"/load\.php\?lang="], "meta": r"MediaWiki ?([\d.]+)?", "implies": ["PHP"]},
+    "DokuWiki": {"cat": "Wiki", "meta": r"DokuWiki", "cookies": ["DokuWiki"], "implies": ["PHP"]},
+    "Confluence": {"cat": "Wiki", "html": [r"confluence-base-url"], "headers": {"x-confluence-request-time": r""}, "implies": ["Java"]},
+    "Discourse": {"cat": "Forum", "meta": r"Discourse ?([\d.]+)?", "implies": ["Ruby on Rails"]},
+    "phpBB": {"cat": "Forum", "html": [r"phpBB", r"/styles/prosilver/"], "cookies": ["phpbb3_"], "implies": ["PHP"]},
+    "vBulletin": {"cat": "Forum", "meta": r"vBulletin ?([\d.]+)?", "cookies": ["bblastvisit"], "implies": ["PHP"]},
+    "XenForo": {"cat": "Forum", "html": [r"XenForo", r"data-xf-init"], "cookies": ["xf_"], "implies": ["PHP"]},
+    "NodeBB": {"cat": "Forum", "headers": {"x-powered-by": r"NodeBB"}, "implies": ["Node.js"]},
+    "Roundcube": {"cat": "Webmail", "html": [r"rcmail", r"roundcube"], "cookies": ["roundcube_sessid"], "implies": ["PHP"]},
+    "Zimbra": {"cat": "Webmail", "html": [r"zimbraMail"], "cookies": ["ZM_TEST"]},
+    "Outlook Web App": {"cat": "Webmail", "html": [r"/owa/auth/"], "headers": {"x-owa-version": r"([\d.]+)"}, "implies": ["ASP.NET"]},
+    "Nextcloud": {"cat": "Stockage", "html": [r"/core/js/oc\.js", r"nextcloud"], "cookies": ["nc_sameSiteCookie"], "implies": ["PHP"]},
+    "ownCloud": {"cat": "Stockage", "html": [r"/core/js/owncloud"], "implies": ["PHP"]},
+    "GitLab": {"cat": "DevOps", "html": [r"gon\.gitlab_url", r"/assets/gitlab-"], "cookies": ["_gitlab_session"], "implies": ["Ruby on Rails"]},
+    "Gitea": {"cat": "DevOps", "html": [r"Powered by Gitea"], "cookies": ["i_like_gitea"], "implies": ["Go"]},
+    "Jenkins": {"cat": "DevOps", "headers": {"x-jenkins": r"([\d.]+)", "x-hudson": r""}, "implies": ["Java"]},
+    "Grafana": {"cat": "DevOps", "html": [r"grafana-app", r"window\.grafanaBootData"], "cookies": ["grafana_session"], "implies": ["Go"]},
+    "Kibana": {"cat": "DevOps", "headers": {"kbn-name": r"", "kbn-version": r"([\d.]+)"}, "implies": ["Node.js"]},
+    "phpMyAdmin": {"cat": "Administration", "html": [r"phpMyAdmin", r"pma_navigation"], "cookies": ["phpMyAdmin", "pma_lang"],
+                   "implies": ["PHP"]},
+    "cPanel": {"cat": "Administration", "headers": {"server": r"cpsrvd/?([\d.]+)?"}, "cookies": ["cprelogin"]},
+    "Plesk": {"cat": "Administration", "headers": {"x-powered-by-plesk": r""}, "html": [r"/plesk-stat/"]},
+    "Webmin": {"cat": "Administration", "headers": {"server": r"MiniServ/?([\d.]+)?"}},
+    # --- E-commerce ---
+    "WooCommerce": {"cat": "E-commerce", "html": [r"/wp-content/plugins/woocommerce/", r"woocommerce-"], "meta": r"WooCommerce ?([\d.]+)?",
+                    "cookies": ["woocommerce_"], "implies": ["WordPress"]},
+    "Shopify": {"cat": "E-commerce", "html": [r"cdn\.shopify\.com", r"Shopify\.theme"], "headers": {"x-shopid": r"", "x-shopify-stage": r""},
+                "cookies": ["_shopify_"]},
+    "Magento": {"cat": "E-commerce", "html": [r"/static/version\d+/frontend/", r"Mage\.Cookies", r"/skin/frontend/"],
+                "headers": {"x-magento-cache-debug": r"", "x-magento-tags": r""}, "cookies": ["mage-cache-storage", "frontend"],
+                "implies": ["PHP"]},
+    "PrestaShop": {"cat": "E-commerce", "html": [r"var prestashop = ", r"/modules/ps_"], "meta": r"PrestaShop",
+                   "headers": {"powered-by": r"PrestaShop"}, "cookies": ["PrestaShop-"], "implies": ["PHP"]},
+    "OpenCart": {"cat": "E-commerce", "html": [r"catalog/view/theme/", r"index\.php\?route=common/home"], "cookies": ["OCSESSID"],
+                 "implies": ["PHP"]},
+    "BigCommerce": {"cat": "E-commerce", "html": [r"cdn\d*\.bigcommerce\.com"], "headers": {"x-bc-storefront-request-id": r""}},
+    "Salesforce Commerce Cloud": {"cat": "E-commerce", "html": [r"/on/demandware\.store/", r"demandware\.static"],
+                                  "cookies": ["dwsid", "dwanonymous_"]},
+    "Shopware": {"cat": "E-commerce", "html": [r"/themes/Frontend/", r"shopware"], "headers": {"sw-version-id": r""},
+                 "cookies": ["session-"], "implies": ["PHP"]},
+    "Wix eCommerce": {"cat": "E-commerce", "html": [r"wixstores"], "implies": ["Wix"]},
+    "Ecwid": {"cat": "E-commerce", "script": [r"app\.ecwid\.com"]},
+    "Squarespace Commerce": {"cat": "E-commerce", "html": [r"squarespace-commerce"], "implies": ["Squarespace"]},
+    "Wizishop": {"cat": "E-commerce", "html": [r"wizishop"]},
+    "Oxatis": {"cat": "E-commerce", "html": [r"oxatis"]},
+    "Sylius": {"cat": "E-commerce", "html": [r"sylius"], "implies": ["Symfony"]},
+    "osCommerce": {"cat": "E-commerce", "cookies": ["osCsid"], "implies": ["PHP"]},
+    "Zen Cart": {"cat": "E-commerce", "cookies": ["zenid"], "implies": ["PHP"]},
+    "Stripe": {"cat": "Paiement", "script": [r"js\.stripe\.com"]},
+    "PayPal": {"cat": "Paiement", "script": [r"paypal(?:objects)?\.com/sdk/js", r"paypalobjects\.com"]},
+    # --- Langages / frameworks serveur ---
+    "PHP": {"cat": "Langage", "headers": {"x-powered-by": r"PHP/?([\d.]+)?"}, "cookies": ["PHPSESSID"]},
+    "ASP.NET": {"cat": "Framework", "headers": {"x-aspnet-version": r"([\d.]+)", "x-powered-by": r"ASP\.NET", "x-aspnetmvc-version": r""},
+                "html": [r"__VIEWSTATE", r"__EVENTVALIDATION"], "cookies": ["ASP.NET_SessionId", ".AspNetCore."]},
+    "Java": {"cat": "Langage", "cookies": ["JSESSIONID"]},
+    "Python": {"cat": "Langage", "headers": {"server": r"Python/?([\d.]+)?"}},
+    "Ruby": {"cat": "Langage", "headers": {"server": r"(?:Mongrel|WEBrick|Puma)"}},
+    "Go": {"cat": "Langage"},
+    "Node.js": {"cat": "Langage"},
+    "Express": {"cat": "Framework", "headers": {"x-powered-by": r"Express"}, "implies": ["Node.js"]},
+    "Next.js": {"cat": "Framework", "html": [r"/_next/static/", r"__NEXT_DATA__"], "headers": {"x-powered-by": r"Next\.js ?([\d.]+)?"},
+                "implies": ["React"]},
+    "Nuxt.js": {"cat": "Framework", "html": [r"/_nuxt/", r"window\.__NUXT__"], "implies": ["Vue.js"]},
+    "SvelteKit": {"cat": "Framework", "html": [r"__sveltekit", r"/_app/immutable/"], "implies": ["Svelte"]},
+    "Remix": {"cat": "Framework", "html": [r"__remixContext"], "implies": ["React"]},
+    "Astro": {"cat": "Framework", "html": [r"astro-island"], "meta": r"Astro v?([\d.]+)?"},
+    "Laravel": {"cat": "Framework", "cookies": ["laravel_session", "XSRF-TOKEN"], "implies": ["PHP"]},
+    "Symfony": {"cat": "Framework", "headers": {"x-debug-token": r""}, "html": [r"sf-toolbar"], "implies": ["PHP"]},
+    "CodeIgniter": {"cat": "Framework", "cookies": ["ci_session"], "implies": ["PHP"]},
+    "CakePHP": {"cat": "Framework", "cookies": ["CAKEPHP"], "implies": ["PHP"]},
+    "Yii": {"cat": "Framework", "html": [r"yii\.(?:js|activeForm)"], "cookies": ["YII_CSRF_TOKEN"], "implies": ["PHP"]},
+    "Zend Framework": {"cat": "Framework", "headers": {"x-powered-by": r"Zend"}, "implies": ["PHP"]},
+    "Django": {"cat": "Framework", "html": [r"csrfmiddlewaretoken"], "cookies": ["csrftoken", "django_language"], "implies": ["Python"]},
+    "Flask": {"cat": "Framework", "headers": {"server": r"Werkzeug/?([\d.]+)?"}, "implies": ["Python"]},
+    "Ruby on Rails": {"cat": "Framework", "html": [r"csrf-param\" content=\"authenticity_token"],
+                      "headers": {"x-powered-by": r"Phusion Passenger", "x-rack-cache": r""}, "cookies": ["_rails_session"],
+                      "implies": ["Ruby"]},
+    "Spring": {"cat": "Framework", "headers": {"x-application-context": r""}, "implies": ["Java"]},
+    "Apache Struts": {"cat": "Framework", "html": [r"\.action\b", r"struts"], "implies": ["Java"]},
+    "Liferay": {"cat": "Framework", "html": [r"Liferay\.(?:ThemeDisplay|AUI)"], "headers": {"liferay-portal": r"([\d.]+)"},
+                "implies": ["Java"]},
+    "ColdFusion": {"cat": "Langage", "cookies": ["CFID", "CFTOKEN"]},
+    "Phoenix": {"cat": "Framework", "html": [r"phx-(?:click|submit)"], "cookies": ["_phoenix_key"]},
+    # --- Bibliothèques JavaScript / CSS ---
+    "jQuery": {"cat": "JavaScript", "script": [r"jquery[.-]?([\d.]+)?(?:\.min)?\.js"], "html": [r"jQuery v([\d.]+)"]},
+    "jQuery UI": {"cat": "JavaScript", "script": [r"jquery-ui[.-]?([\d.]+)?(?:\.min)?\.js"], "implies": ["jQuery"]},
+    "jQuery Migrate": {"cat": "JavaScript", "script": [r"jquery-migrate[.-]?([\d.]+)?(?:\.min)?\.js"], "implies": ["jQuery"]},
+    "React": {"cat": "JavaScript", "html": [r"data-reactroot", r"data-reactid"], "script": [r"react(?:-dom)?(?:\.production)?(?:\.min)?\.js"]},
+    "Vue.js": {"cat": "JavaScript", "html": [r"data-v-[0-9a-f]{8}", r"v-cloak"], "script": [r"vue(?:\.runtime)?(?:\.global)?(?:\.min)?\.js"]},
+    "Angular": {"cat": "JavaScript", "html": [r"ng-version=\"([\d.]+)\"", r"<app-root"]},
+    "AngularJS": {"cat": "JavaScript", "html": [r"ng-app=", r"ng-controller="], "script": [r"angular(?:\.min)?\.js"]},
+    "Svelte": {"cat": "JavaScript", "html": [r"\bsvelte-[a-z0-9]{5,}"]},
+    "Ember.js": {"cat": "JavaScript", "html": [r"ember-application", r"id=\"ember\d+\""]},
+    "Backbone.js": {"cat": "JavaScript", "script": [r"backbone(?:[.-]min)?\.js"]},
+    "Alpine.js": {"cat": "JavaScript", "html": [r"x-data=\""], "script": [r"alpinejs"]},
+    "htmx": {"cat": "JavaScript", "html": [r"hx-(?:get|post)="], "script": [r"htmx(?:\.min)?\.js"]},
+    "Lodash": {"cat": "JavaScript", "script": [r"lodash(?:\.min)?\.js"]},
+    "Moment.js": {"cat": "JavaScript", "script": [r"moment(?:\.min)?\.js"]},
+    "core-js": {"cat": "JavaScript", "html": [r"core-js"]},
+    "Modernizr": {"cat": "JavaScript", "script": [r"modernizr[.-]?([\d.]+)?(?:\.min)?\.js"]},
+    "RequireJS": {"cat": "JavaScript", "script": [r"require(?:\.min)?\.js"]},
+    "Swiper": {"cat": "JavaScript", "script": [r"swiper(?:-bundle)?(?:\.min)?\.js"]},
+    "Slick": {"cat": "JavaScript", "script": [r"slick(?:\.min)?\.js"]},
+    "GSAP": {"cat": "JavaScript", "script": [r"gsap(?:\.min)?\.js", r"TweenMax(?:\.min)?\.js"]},
+    "three.js": {"cat": "JavaScript", "script": [r"three(?:\.module)?(?:\.min)?\.js"]},
+    "Lightbox": {"cat": "JavaScript", "script": [r"lightbox(?:-plus-jquery)?(?:\.min)?\.js"]},
+    "Bootstrap": {"cat": "CSS", "html": [r"bootstrap(?:\.bundle)?(?:\.min)?\.(?:css|js)", r"Bootstrap v([\d.]+)"]},
+    "Tailwind CSS": {"cat": "CSS", "html": [r"tailwind(?:css)?(?:\.min)?\.css", r"--tw-"]},
+    "Bulma": {"cat": "CSS", "html": [r"bulma(?:\.min)?\.css"]},
+    "Foundation": {"cat": "CSS", "html": [r"foundation(?:\.min)?\.css"]},
+    "Font Awesome": {"cat": "Polices", "html": [r"font-?awesome", r"kit\.fontawesome\.com"]},
+    "Google Font API": {"cat": "Polices", "html": [r"fonts\.googleapis\.com"]},
+    "Adobe Fonts": {"cat": "Polices", "html": [r"use\.typekit\.net"]},
+    # --- Constructeurs de pages / extensions WordPress ---
+    "Elementor": {"cat": "Page builder", "html": [r"/wp-content/plugins/elementor/", r"elementor-kit-"],
+                  "meta": r"Elementor ?([\d.]+)?", "implies": ["WordPress"]},
+    "Divi": {"cat": "Page builder", "html": [r"/wp-content/themes/Divi/", r"et_pb_"], "implies": ["WordPress"]},
+    "WPBakery": {"cat": "Page builder", "html": [r"js_composer", r"vc_row"], "meta": r"WPBakery", "implies": ["WordPress"]},
+    "Beaver Builder": {"cat": "Page builder", "html": [r"fl-builder"], "implies": ["WordPress"]},
+    "Avada": {"cat": "Page builder", "html": [r"/wp-content/themes/Avada/", r"fusion-builder"], "implies": ["WordPress"]},
+    "Yoast SEO": {"cat": "SEO", "html": [r"This site is optimized with the Yoast SEO (?:plugin )?v?([\d.]+)?", r"yoast-schema-graph"],
+                  "implies": ["WordPress"]},
+    "Rank Math": {"cat": "SEO", "html": [r"rank-math-schema", r"Search Engine Optimization by Rank Math"], "implies": ["WordPress"]},
+    "All in One SEO": {"cat": "SEO", "html": [r"All in One SEO(?: Pack)? ?v?([\d.]+)?"], "implies": ["WordPress"]},
+    "Contact Form 7": {"cat": "Formulaires", "html": [r"/wp-content/plugins/contact-form-7/", r"wpcf7"], "implies": ["WordPress"]},
+    "Gravity Forms": {"cat": "Formulaires", "html": [r"gform_wrapper", r"/plugins/gravityforms/"], "implies": ["WordPress"]},
+    "WPForms": {"cat": "Formulaires", "html": [r"wpforms-"], "implies": ["WordPress"]},
+    "Jetpack": {"cat": "WordPress", "html": [r"/wp-content/plugins/jetpack/", r"jetpack-"], "implies": ["WordPress"]},
+    "WP Rocket": {"cat": "Cache", "html": [r"This website is like a Rocket", r"wp-rocket"], "headers": {"x-rocket-nginx-bypass": r""},
+                  "implies": ["WordPress"]},
+    "W3 Total Cache": {"cat": "Cache", "html": [r"Performance optimized by W3 Total Cache"], "headers": {"x-powered-by": r"W3 Total Cache"},
+                       "implies": ["WordPress"]},
+    "WP Super Cache": {"cat": "Cache", "html": [r"Cached page generated by WP-Super-Cache"], "implies": ["WordPress"]},
+    "LiteSpeed Cache": {"cat": "Cache", "headers": {"x-litespeed-cache": r""}, "html": [r"litespeed-cache"]},
+    "Autoptimize": {"cat": "Cache", "html": [r"/wp-content/cache/autoptimize/"], "implies": ["WordPress"]},
+    "WPML": {"cat": "Traduction", "html": [r"/wp-content/plugins/sitepress-multilingual-cms/"], "cookies": ["wp-wpml_current_language"],
+             "implies": ["WordPress"]},
+    "Polylang": {"cat": "Traduction", "cookies": ["pll_language"], "implies": ["WordPress"]},
+    "Weglot": {"cat": "Traduction", "script": [r"cdn\.weglot\.com"]},
+    "Slider Revolution": {"cat": "WordPress", "html": [r"revslider", r"rev_slider"], "meta": r"Powered by Slider Revolution ([\d.]+)"},
+    "Wordfence": {"cat": "Sécurité", "html": [r"wordfence"], "cookies": ["wfwaf-authcookie-"], "implies": ["WordPress"]},
+    # --- Serveurs web / proxys ---
+    "Nginx": {"cat": "Serveur web", "headers": {"server": r"nginx(?:/([\d.]+))?"}},
+    "Apache": {"cat": "Serveur web", "headers": {"server": r"Apache(?:/([\d.]+))?"}},
+    "Microsoft IIS": {"cat": "Serveur web", "headers": {"server": r"Microsoft-IIS(?:/([\d.]+))?"}},
+    "LiteSpeed": {"cat": "Serveur web", "headers": {"server": r"LiteSpeed"}},
+    "OpenResty": {"cat": "Serveur web", "headers": {"server": r"openresty(?:/([\d.]+))?"}, "implies": ["Nginx"]},
+    "Caddy": {"cat": "Serveur web", "headers": {"server": r"Caddy"}},
+    "Tengine": {"cat": "Serveur web", "headers": {"server": r"Tengine(?:/([\d.]+))?"}},
+    "lighttpd": {"cat": "Serveur web", "headers": {"server": r"lighttpd(?:/([\d.]+))?"}},
+    "Apache Tomcat": {"cat": "Serveur web", "headers": {"server": r"Apache-Coyote|Tomcat"}, "implies": ["Java"]},
+    "Jetty": {"cat": "Serveur web", "headers": {"server": r"Jetty(?:\(([\d.]+)[^)]*\))?"}, "implies": ["Java"]},
+    "Kestrel": {"cat": "Serveur web", "headers": {"server": r"Kestrel"}, "implies": ["ASP.NET"]},
+    "gunicorn": {"cat": "Serveur web", "headers": {"server": r"gunicorn(?:/([\d.]+))?"}, "implies": ["Python"]},
+    "uvicorn": {"cat": "Serveur web", "headers": {"server": r"uvicorn"}, "implies": ["Python"]},
+    "Envoy": {"cat": "Proxy", "headers": {"server": r"envoy", "x-envoy-upstream-service-time": r""}},
+    "Varnish": {"cat": "Cache", "headers": {"via": r"varnish", "x-varnish": r""}},
+    "Squid": {"cat": "Proxy", "headers": {"via": r"squid", "x-squid-error": r""}},
+    "HAProxy": {"cat": "Proxy", "headers": {"server": r"HAProxy"}},
+    "Traefik": {"cat": "Proxy", "headers": {"server": r"Traefik"}},
+    "Cowboy": {"cat": "Serveur web", "headers": {"server": r"Cowboy"}},
+    "OpenSSL": {"cat": "Sécurité", "headers": {"server": r"OpenSSL(?:/([\d.]+[a-z]?))?"}},
+    "mod_ssl": {"cat": "Serveur web", "headers": {"server": r"mod_ssl(?:/([\d.]+))?"}, "implies": ["Apache"]},
+    "Phusion Passenger": {"cat": "Serveur web", "headers": {"server": r"Phusion_Passenger(?:/([\d.]+))?"}},
+    "Ubuntu": {"cat": "Système", "headers": {"server": r"Ubuntu"}},
+    "Debian": {"cat": "Système", "headers": {"server": r"Debian"}},
+    "CentOS": {"cat": "Système", "headers": {"server": r"CentOS"}},
+    "Windows Server": {"cat": "Système", "headers": {"server": r"Win(?:32|64)"}},
+    # --- CDN / hébergement / sécurité ---
+    "Cloudflare": {"cat": "CDN", "headers": {"server": r"cloudflare", "cf-ray": r""}, "cookies": ["__cf_bm", "__cfduid", "cf_clearance"]},
+    "Amazon CloudFront": {"cat": "CDN", "headers": {"x-amz-cf-id": r"", "via": r"CloudFront"}},
+    "Fastly": {"cat": "CDN", "headers": {"x-served-by": r"cache-[a-z0-9-]+", "fastly-debug-digest": r""}},
+    "Akamai": {"cat": "CDN", "headers": {"x-akamai-transformed": r"", "server": r"AkamaiGHost"}, "cookies": ["ak_bmsc", "bm_sv"]},
+    "KeyCDN": {"cat": "CDN", "headers": {"server": r"keycdn-engine"}},
+    "BunnyCDN": {"cat": "CDN", "headers": {"server": r"BunnyCDN", "cdn-pullzone": r""}},
+    "StackPath": {"cat": "CDN", "headers": {"x-hw": r""}},
+    "Azure CDN": {"cat": "CDN", "headers": {"x-azure-ref": r"", "x-msedge-ref": r""}},
+    "Google Cloud CDN": {"cat": "CDN", "headers": {"via": r"1\.1 google"}},
+    "jsDelivr": {"cat": "CDN", "script": [r"cdn\.jsdelivr\.net"]},
+    "cdnjs": {"cat": "CDN", "script": [r"cdnjs\.cloudflare\.com"]},
+    "unpkg": {"cat": "CDN", "script": [r"unpkg\.com"]},
+    "Amazon S3": {"cat": "Hébergement", "headers": {"server": r"AmazonS3", "x-amz-request-id": r""}},
+    "Amazon ELB": {"cat": "Hébergement", "cookies": ["AWSALB", "AWSELB"]},
+    "Microsoft Azure": {"cat": "Hébergement", "cookies": ["ARRAffinity"], "headers": {"x-ms-request-id": r""}},
+    "Google App Engine": {"cat": "Hébergement", "headers": {"server": r"Google Frontend"}},
+    "Heroku": {"cat": "Hébergement", "headers": {"via": r"vegur"}},
+    "Vercel": {"cat": "Hébergement", "headers": {"server": r"Vercel", "x-vercel-id": r""}},
+    "Netlify": {"cat": "Hébergement", "headers": {"server": r"Netlify", "x-nf-request-id": r""}},
+    "GitHub Pages": {"cat": "Hébergement", "headers": {"server": r"GitHub\.com", "x-github-request-id": r""}},
+    "Firebase": {"cat": "Hébergement", "html": [r"firebaseapp\.com", r"/__/firebase/"]},
+    "OVHcloud": {"cat": "Hébergement", "html": [r"ovh\.(?:net|com)/"], "headers": {"x-ovh-request-id": r""}},
+    "o2switch": {"cat": "Hébergement", "html": [r"o2switch"]},
+    "Hostinger": {"cat": "Hébergement", "headers": {"platform": r"hostinger"}},
+    "WP Engine": {"cat": "Hébergement", "headers": {"x-powered-by": r"WP Engine", "wpe-backend": r""}, "implies": ["WordPress"]},
+    "Kinsta": {"cat": "Hébergement", "headers": {"x-kinsta-cache": r""}, "implies": ["WordPress"]},
+    "Pantheon": {"cat": "Hébergement", "headers": {"x-pantheon-styx-hostname": r""}},
+    "Sucuri": {"cat": "WAF", "headers": {"server": r"Sucuri", "x-sucuri-id": r""}},
+    "Imperva": {"cat": "WAF", "headers": {"x-iinfo": r"", "x-cdn": r"Incapsula"}, "cookies": ["incap_ses_", "visid_incap_"]},
+    "F5 BIG-IP": {"cat": "WAF", "headers": {"server": r"BigIP"}, "cookies": ["BIGipServer", "TS01"]},
+    "Barracuda": {"cat": "WAF", "cookies": ["barra_counter_session"]},
+    "ModSecurity": {"cat": "WAF", "headers": {"server": r"Mod_Security"}},
+    "DDoS-Guard": {"cat": "WAF", "headers": {"server": r"ddos-guard"}, "cookies": ["__ddg"]},
+    "reCAPTCHA": {"cat": "Sécurité", "script": [r"google\.com/recaptcha/", r"recaptcha/api\.js"]},
+    "hCaptcha": {"cat": "Sécurité", "script": [r"hcaptcha\.com/1/api\.js"]},
+    "Cloudflare Turnstile": {"cat": "Sécurité", "script": [r"challenges\.cloudflare\.com/turnstile"]},
+    "HSTS": {"cat": "Sécurité", "headers": {"strict-transport-security": r""}},
+    # --- Analytics / marketing / widgets ---
+    "Google Analytics": {"cat": "Analytics", "script": [r"google-analytics\.com/(?:ga|analytics)\.js", r"googletagmanager\.com/gtag/js"],
+                         "cookies": ["_ga"]},
+    "Google Tag Manager": {"cat": "Analytics", "html": [r"googletagmanager\.com/gtm\.js", r"GTM-[A-Z0-9]{4,}"]},
+    "Matomo": {"cat": "Analytics", "html": [r"matomo\.js", r"piwik\.js", r"_paq\.push"], "cookies": ["_pk_id"]},
+    "Plausible": {"cat": "Analytics", "script": [r"plausible\.io/js/"]},
+    "Hotjar": {"cat": "Analytics", "html": [r"static\.hotjar\.com", r"hjSiteSettings"]},
+    "Microsoft Clarity": {"cat": "Analytics", "html": [r"clarity\.ms/tag/"]},
+    "Facebook Pixel": {"cat": "Marketing", "html": [r"connect\.facebook\.net/[a-z_A-Z]+/fbevents\.js"]},
+    "LinkedIn Insight Tag": {"cat": "Marketing", "html": [r"snap\.licdn\.com/li\.lms-analytics"]},
+    "TikTok Pixel": {"cat": "Marketing", "html": [r"analytics\.tiktok\.com"]},
+    "Google Ads": {"cat": "Marketing", "html": [r"googleadservices\.com", r"AW-\d{6,}"]},
+    "HubSpot": {"cat": "Marketing", "script": [r"js\.hs-scripts\.com", r"js\.hs-analytics\.net"], "cookies": ["hubspotutk"]},
+    "Mailchimp": {"cat": "Marketing", "html": [r"chimpstatic\.com", r"list-manage\.com"]},
+    "Brevo": {"cat": "Marketing", "html": [r"sibautomation\.com", r"sendinblue"]},
+    "Intercom": {"cat": "Chat", "html": [r"widget\.intercom\.io", r"intercomSettings"]},
+    "Crisp": {"cat": "Chat", "html": [r"client\.crisp\.chat"]},
+    "Tawk.to": {"cat": "Chat", "html": [r"embed\.tawk\.to"]},
+    "Zendesk": {"cat": "Chat", "html": [r"static\.zdassets\.com"]},
+    "Drift": {"cat": "Chat", "html": [r"js\.driftt\.com"]},
+    "Axeptio": {"cat": "Consentement", "html": [r"axept\.io"]},
+    "Didomi": {"cat": "Consentement", "html": [r"sdk\.privacy-center\.org", r"didomi"]},
+    "OneTrust": {"cat": "Consentement", "html": [r"cdn\.cookielaw\.org", r"optanon"], "cookies": ["OptanonConsent"]},
+    "Cookiebot": {"cat": "Consentement", "html": [r"consent\.cookiebot\.com"], "cookies": ["CookieConsent"]},
+    "tarteaucitron.js": {"cat": "Consentement", "html": [r"tarteaucitron"]},
+    "Complianz": {"cat": "Consentement", "html": [r"cmplz-"], "implies": ["WordPress"]},
+    "Google Maps": {"cat": "Cartographie", "html": [r"maps\.googleapis\.com/maps/api/js", r"google\.com/maps/embed"]},
+    "Leaflet": {"cat": "Cartographie", "html": [r"leaflet(?:\.min)?\.(?:js|css)"]},
+    "YouTube": {"cat": "Vidéo", "html": [r"youtube(?:-nocookie)?\.com/embed/"]},
+    "Vimeo": {"cat": "Vidéo", "html": [r"player\.vimeo\.com"]},
+    "Calendly": {"cat": "Widgets", "html": [r"assets\.calendly\.com"]},
+    "Sentry": {"cat": "Monitoring", "html": [r"browser\.sentry-cdn\.com", r"Sentry\.init"]},
+    "New Relic": {"cat": "Monitoring", "html": [r"js-agent\.newrelic\.com", r"NREUM"]},
+    "Datadog RUM": {"cat": "Monitoring", "html": [r"datadoghq-browser-agent"]},
+}
+
+_OVERLAP = 1024  # octets gardés d'un morceau à l'autre : motifs à cheval sur deux morceaux
+_WINDOW = 700    # contexte lu avant une ancre pour vérifier la regex complète
+_MIN_ANCHOR = 3
+
+
+def _literal_runs(pattern):
+    """Chaînes littérales obligatoires d'une regex, par branche de l'alternance de premier niveau.
+
+    "jquery[.-]?([\\d.]+)?\\.js" -> [["jquery", ".js"]] ; "Apache-Coyote|Tomcat" -> [["Apache-Coyote"], ["Tomcat"]]"""
+    branches, runs, run, depth, i = [], [], "", 0, 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\" and i + 1 < len(pattern):
+            nxt = pattern[i + 1]
+            i += 2
+            if depth == 0 and not nxt.isalnum(): run += nxt  # \. \/ \- ...
+            elif depth == 0: runs.append(run); run = ""  # \d \s \b ...
+            continue
+        if c == "[":
+            end = pattern.index("]", i + 2 if pattern[i + 1:i + 2] in ("]", "^") else i + 1)
+            if depth == 0: runs.append(run); run = ""
+            i = end + 1
+            continue
+        if c == "(": depth += 1
+        elif c == ")": depth -= 1
+        if depth == 0 and c not in "()":
+            if c in "?*{": run = run[:-1]  # le caractère précédent est facultatif
+            if c == "{": i = pattern.index("}", i)
+            if c in "?*{+.^$": runs.append(run); run = ""
+            elif c == "|": branches.append(runs + [run]); runs, run = [], ""
+            else: run += c
+        elif depth > 0 or c in "()":
+            if run: runs.append(run); run = ""
+        i += 1
+    branches.append(runs + [run])
+    return [[r for r in b if r] for b in branches]
+
+
+def _anchors(pattern, fallback):
+    """Une ancre (littéral en minuscules) par branche ; None si une branche n'en a pas d'assez longue"""
+    anchors = []
+    for runs in _literal_runs(pattern):
+        best = max(runs, key=len, default="")
+        if len(best) < _MIN_ANCHOR: best = fallback
+        if not best or len(best) < _MIN_ANCHOR: return None
+        anchors.append(best.lower().encode())
+    return anchors
+
+
+def _trie_regex(words):
+    """Littéraux -> regex en arbre : au plus une branche par premier caractère à chaque position"""
+    trie = {}
+    for word in words:
+        node = trie
+        for c in word: node = node.setdefault(c, {})
+        node[None] = {}
+
+    def emit(node):
+        branches = [re.escape(bytes([c])) + emit(child) for c, child in sorted((k, v) for k, v in node.items() if k is not None)]
+        if not branches: return b""
+        body = branches[0] if len(branches) == 1 else b"(?:" + b"|".join(branches) + b")"
+        return b"(?:" + body + b")?" if None in node else body
+    return re.compile(emit(trie))
+
+
+class _MultiPattern:
+    """Recherche simultanée de nombreuses regex en une passe.
+
+    Chaque regex est réduite à un littéral obligatoire (son ancre) ; toutes les ancres forment
+    une seule regex en arbre parcourue sur le texte mis en minuscules. La regex complète
+    n'est évaluée qu'autour d'une ancre trouvée, c'est-à-dire rarement."""
+
+    def __init__(self, entries):
+        self.entries = entries  # [(technologie, regex bytes, ancres ou None)]
+        self.singles = [re.compile(p, re.IGNORECASE | re.MULTILINE) for _, p, _ in entries]
+        self.by_anchor = {}     # ancre -> index des regex à vérifier
+        self.unanchored = []    # sans littéral exploitable : évaluées à chaque passage (à éviter)
+        for index, (_, _, anchors) in enumerate(entries):
+            if anchors is None: self.unanchored.append(index)
+            for anchor in anchors or []: self.by_anchor.setdefault(anchor, []).append(index)
+        # Une ancre trouvée vaut aussi pour ses préfixes (l'arbre renvoie la plus longue)
+        self.prefixes = {a: [p for p in self.by_anchor if a.startswith(p)] for a in self.by_anchor}
+        self.regex = _trie_regex(self.by_anchor) if self.by_anchor else None
+
+    def scan(self, data, found, window=_WINDOW):
+        lowered = data.lower()
+        for index in self.unanchored: self._verify(index, data, found)
+        pos = 0
+        while self.regex is not None:
+            m = self.regex.search(lowered, pos)
+            if m is None: break
+            start = max(m.start() - window, 0) if window else 0
+            end = m.end() + window if window else len(data)
+            for anchor in self.prefixes[m.group(0)]:
+                for index in self.by_anchor[anchor]: self._verify(index, data, found, start, end)
+            pos = m.start() + 1  # les ancres peuvent se chevaucher
+
+    def _verify(self, index, data, found, start=0, end=None):
+        name = self.entries[index][0]
+        if found.get(name): return  # déjà trouvée avec sa version
+        m = self.singles[index].search(data, start, len(data) if end is None else end)
+        if m is None: return
+        version = next((g for g in m.groups() if g), None)
+        found[name] = version.decode("ascii", "replace") if version else None
+
+
+# Plusieurs CMS détectés (thème WordPress servant des images AEM, extension...) : le premier dans
+# l'ordre de SIGNATURES l'emporte, les CMS auto-hébergés courants avant les SaaS et les traces génériques
+CMS_PRIORITY = {name: rank for rank, name in enumerate(n for n, sig in SIGNATURES.items() if sig["cat"] == "CMS")}
+
+
+def primary_cms(technologies):
+    """CMS principal parmi les résultats de FingerprintSession.results(), ou None"""
+    return min((name for name in technologies if name in CMS_PRIORITY), key=CMS_PRIORITY.get, default=None)
+
+
+class Fingerprinter:
+    def __init__(self, signatures=SIGNATURES):
+        self.signatures = signatures
+        headers, body = [], []
+        for name, sig in signatures.items():
+            for header, pattern in sig.get("headers", {}).items():
+                regex = f"^{re.escape(header)}:[^\\n]{{0,300}}?{pattern}" if pattern else f"^{re.escape(header)}:"
+                headers.append((name, regex.encode(), _anchors(pattern, f"{header}:")))
+            for cookie in sig.get("cookies", []):
+                regex = f"^set-cookie:(?:[^\\n]{{0,300}}?[\\s,])?{re.escape(cookie)}[^=;\\s]{{0,64}}="
+                headers.append((name, regex.encode(), [cookie.lower().encode()] if len(cookie) >= _MIN_ANCHOR else None))
+            for pattern in sig.get("html", []):
+                body.append((name, pattern.encode(), _anchors(pattern, None)))
+            for pattern in sig.get("script", []):
+                regex = f"<script[^>]{{0,300}}?src=[\"'][^\"'>]{{0,300}}?{pattern}"
+                body.append((name, regex.encode(), _anchors(pattern, None)))
+            if "meta" in sig:
+                regex = f"<meta[^>]{{0,60}}generator[\"'][^>]{{0,30}}content=[\"']{sig['meta']}"
+                body.append((name, regex.encode(), _anchors(sig["meta"], "generator")))
+        self.headers = _MultiPattern(headers)
+        self.body = _MultiPattern(body)
+
+    def session(self):
+        return FingerprintSession(self)
+
+    def scan(self, headers, body=b""):
+        """Raccourci quand tout le corps est déjà en mémoire"""
+        session = self.session()
+        session.feed_headers(headers)
+        session.feed(body)
+        return session.results()
+
+
+class FingerprintSession:
+    """Détection incrémentale sur une réponse : feed_headers() une fois, puis feed() par morceau de corps"""
+
+    def __init__(self, fingerprinter):
+        self.fingerprinter = fingerprinter
+        self._found = {}  # technologie -> version ou None
+        self._tail = b""
+
+    def feed_headers(self, headers):
+        items = headers.multi_items() if hasattr(headers, "multi_items") else headers.items()
+        text = "\n".join(f"{k.lower()}: {v}" for k, v in items).encode("latin-1", "replace")
+        self.fingerprinter.headers.scan(text, self._found, window=None)
+
+    def feed(self, chunk):
+        if not chunk: return
+        data = self._tail + chunk
+        self.fingerprinter.body.scan(data, self._found)
+        self._tail = data[-_OVERLAP:]
+
+    def results(self):
+        """{technologie: {"category", "version"}}, technologies impliquées comprises"""
+        signatures = self.fingerprinter.signatures
+        found = dict(self._found)
+        pending = list(found)
+        while pending:
+            for implied in signatures[pending.pop()].get("implies", []):
+                if implied not in found:
+                    found[implied] = None
+                    pending.append(implied)
+        return {name: {"category": signatures[name]["cat"], "version": version} for name, version in sorted(found.items())}
+
+
+fingerprinter = Fingerprinter()
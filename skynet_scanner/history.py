@@ -0,0 +1,130 @@
+"""Historique des rapports de scan (SQLite, WAL), interrogeable sans rescanner.
+
+Les rapports sont mis en tampon puis écrits par lots, dans un thread, par une tâche de
+fond : l'écriture ne pèse ni sur la réponse HTTP ni sur la boucle asyncio. Index par
+domaine, date, modèle d'e-mail et raison de vulnérabilité ; une raison est indexée
+telle quelle ("Port critique: 22 (SSH)") et par sa famille ("Port critique").
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+from collections import deque
+
+from metrics import count_error
+
+
+def reason_kind(reason):
+    """ "Serveur exposé (Apache/2.4)" -> "Serveur exposé" ; "Port critique: 22 (SSH)" -> "Port critique" """
+    return reason.split(" (")[0].split(":")[0].strip()
+
+
+class HistoryStore:
+    def __init__(self, path=":memory:"):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")  # WAL : une coupure ne perd que les derniers lots, sans corruption
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS scan_history ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, domain TEXT NOT NULL, scanned_at TEXT NOT NULL, criticality_score INTEGER, "
+            "email_template_id TEXT, report TEXT NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS scan_history_reasons ("
+            "scan_id INTEGER NOT NULL, kind TEXT NOT NULL, reason TEXT NOT NULL, scanned_at TEXT NOT NULL)")
+        for index in ("scan_history_domain ON scan_history(domain, scanned_at)",
+                      "scan_history_scanned_at ON scan_history(scanned_at)",
+                      "scan_history_template ON scan_history(email_template_id, scanned_at)",
+                      "scan_history_reason_kind ON scan_history_reasons(kind, scanned_at)",
+                      "scan_history_reason ON scan_history_reasons(reason, scanned_at)",
+                      "scan_history_reason_scan ON scan_history_reasons(scan_id)"):
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS {index}")
+        self._db.commit()
+
+    def add_many(self, reports):
+        """Écrit un lot de rapports dans une seule transaction"""
+        with self._lock:
+            for report in reports:
+                cur = self._db.execute(
+                    "INSERT INTO scan_history (domain, scanned_at, criticality_score, email_template_id, report) VALUES (?, ?, ?, ?, ?)",
+                    (report["domain"].lower(), report["scanned_at"], report["criticality_score"], report["email_template_id"],
+                     json.dumps(report, ensure_ascii=False)))
+                self._db.executemany("INSERT INTO scan_history_reasons VALUES (?, ?, ?, ?)",
+                                     [(cur.lastrowid, reason_kind(r), r, report["scanned_at"]) for r in report["vulnerability_reasons"]])
+            self._db.commit()
+
+    def query(self, domain=None, reason=None, template=None, since=None, until=None, limit=100, offset=0, full=False):
+        """Rapports du plus récent au plus ancien ; reason accepte une raison exacte ou sa famille"""
+        clauses, params = [], []
+        if domain: clauses.append("h.domain = ?"); params.append(domain.lower())
+        if template: clauses.append("h.email_template_id = ?"); params.append(template)
+        if since: clauses.append("h.scanned_at >= ?"); params.append(since)
+        if until: clauses.append("h.scanned_at < ?"); params.append(until)
+        if reason:
+            clauses.append("h.id IN (SELECT scan_id FROM scan_history_reasons WHERE kind = ? UNION "
+                           "SELECT scan_id FROM scan_history_reasons WHERE reason = ?)")
+            params += [reason, reason]
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) FROM scan_history h {where}", params).fetchone()[0]
+            rows = self._db.execute(f"SELECT h.id, h.report FROM scan_history h {where} ORDER BY h.scanned_at DESC, h.id DESC "
+                                    "LIMIT ? OFFSET ?", params + [limit, offset]).fetchall()
+        items = []
+        for id_, raw in rows:
+            report = json.loads(raw)
+            if not full: report.pop("raw_data", None)
+            items.append({"id": id_, **report})
+        return {"total": total, "limit": limit, "offset": offset, "items": items}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class HistoryRecorder:
+    """Tampon des rapports à historiser, vidé par lots de batch_size ou toutes les flush_interval secondes"""
+
+    def __init__(self, store, batch_size=500, flush_interval=1.0, max_pending=100000):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = deque(maxlen=max_pending)  # au-delà, les plus anciens sont perdus plutôt que la mémoire
+        self.written = 0
+        self._task = None
+        self._wake = None
+
+    async def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Arrête la tâche de fond et écrit ce qui reste en tampon"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        while self._pending: await self.flush()
+
+    def record(self, report):
+        self._pending.append(report)
+        if self._wake and len(self._pending) >= self.batch_size: self._wake.set()
+
+    async def flush(self):
+        batch = [self._pending.popleft() for _ in range(min(len(self._pending), self.batch_size))]
+        if not batch: return
+        try:
+            await asyncio.to_thread(self.store.add_many, batch)
+            self.written += len(batch)
+        except Exception as e:
+            count_error("history", e)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            while self._pending: await self.flush()
+
+    def stats(self):
+        return {"pending": len(self._pending), "written": self.written}
@@ -0,0 +1,210 @@
+"""Import en flux de listes de prospects (CSV, JSONL ou texte) vers des domaines à scanner.
+
+Chaque entrée (URL, e-mail, domaine en majuscules, IDN...) est ramenée à son domaine
+enregistrable en punycode : "https://WWW.Boutique.example.co.uk/contact" et
+"jean@example.co.uk" donnent tous deux "example.co.uk". Le suffixe public vient de
+publicsuffixlist, domaines privés compris : boutique.myshopify.com et alice.github.io
+restent deux prospects distincts.
+
+Le fichier est lu ligne à ligne et les doublons sont écartés par un filtre de Bloom :
+la mémoire reste constante quelle que soit la taille du fichier (3 octets par domaine
+attendu, au prix de ~1/1000 de faux doublons à pleine capacité). Les stats donnent le taux
+estimé en fin de lecture (false_positive_rate) et le nombre attendu de domaines écartés à tort
+(estimated_false_duplicates).
+
+En ligne de commande : python importer.py prospects.csv [--column email] > domaines.txt
+"""
+import argparse
+import csv
+import itertools
+import json
+import math
+import random
+import re
+import sys
+from array import array
+
+import idna
+from publicsuffixlist import PublicSuffixList
+
+_psl = PublicSuffixList()
+_DOMAIN_RE = re.compile(r"^(?=.{1,253}$)(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+(?:[a-z]{2,63}|xn--[a-z0-9-]{1,59})$")
+_JSON_FIELDS = ("domain", "url", "website", "site", "email")
+
+
+def registrable_domain(host):
+    """Domaine enregistrable de host (déjà en minuscules et punycode), ou None si host est un suffixe public"""
+    return _psl.privatesuffix(host)
+
+
+def normalize_domain(entry):
+    """URL, e-mail ou nom d'hôte -> domaine enregistrable en punycode ; None si l'entrée n'en contient pas"""
+    value = entry.strip().strip("\"'<>").lower()
+    if value.startswith("mailto:"): value = value[7:]
+    # Découpage à la main plutôt que urlsplit : c'est le coût principal sur un million de lignes
+    if "://" in value: value = value.split("://", 1)[1]
+    value = value.split("/", 1)[0].split("?", 1)[0].split("#", 1)[0]
+    if "@" in value: value = value.rsplit("@", 1)[1]  # e-mail, ou identifiants dans une URL
+    if value.count(":") == 1: value = value.split(":", 1)[0]  # port ; plusieurs ":" = IPv6, rejetée plus bas
+    value = value.strip(".")
+    if not value.isascii():
+        try:
+            value = idna.encode(value, uts46=True).decode("ascii")
+        except idna.IDNAError:
+            return None
+    if not _DOMAIN_RE.match(value):
+        return None
+    return registrable_domain(value)
+
+
+class BloomFilter:
+    """Ensemble approché à taille fixe : add() renvoie False si l'élément a (probablement) déjà été vu.
+
+    Variante "par mot" : les bits d'un élément tombent tous dans le même mot de 64 bits,
+    selon un motif tiré d'une table précalculée ; un ajout coûte une lecture et une
+    écriture, sans boucle Python. hash() suffit : le filtre ne vit que le temps d'un import."""
+
+    _PATTERN_BITS = 16
+    _patterns = None
+
+    def __init__(self, capacity=2_000_000, bits_per_item=24, hashes=8):
+        if BloomFilter._patterns is None:
+            rng = random.Random(0)
+            BloomFilter._patterns = array("Q", (sum(1 << b for b in rng.sample(range(64), hashes))
+                                                for _ in range(1 << self._PATTERN_BITS)))
+        self.hashes = hashes
+        self.words = max(1, capacity * bits_per_item // 64)
+        self._bits = array("Q", bytes(8 * self.words))
+
+    def add(self, item):
+        h = hash(item) & 0xFFFFFFFFFFFFFFFF
+        mask = self._patterns[h & 0xFFFF]
+        i = (h >> self._PATTERN_BITS) % self.words
+        word = self._bits[i]
+        if word & mask == mask:
+            return False
+        self._bits[i] = word | mask
+        return True
+
+    def false_positive_rate(self, count):
+        """Probabilité qu'un élément nouveau soit pris pour un doublon une fois count éléments ajoutés.
+
+        Le nombre d'éléments par mot suit une loi de Poisson ; s'y ajoute le cas d'un élément
+        du même mot qui a tiré le même motif (1 chance sur 65536)."""
+        load = count / self.words
+        unset = 1 - self.hashes / 64
+        term, rate = math.exp(-load), 0.0
+        for x in range(int(load + 10 * math.sqrt(load)) + 20):
+            rate += term * (1 - unset ** x) ** self.hashes
+            term *= load / (x + 1)
+        return min(rate + load / (1 << self._PATTERN_BITS), 1.0)
+
+    def expected_false_positives(self, count, steps=32):
+        """Nombre attendu d'éléments écartés à tort pendant l'ajout de count éléments (intégrale du taux, méthode des trapèzes)"""
+        if count <= 0: return 0.0
+        rates = [self.false_positive_rate(count * i / steps) for i in range(steps + 1)]
+        return count / steps * (sum(rates) - (rates[0] + rates[-1]) / 2)
+
+
+def _detect_format(first_line):
+    # Un CSV entièrement entre guillemets ("Société","Site","Email") commence aussi par " : seul un JSON valide compte
+    try:
+        if isinstance(json.loads(first_line), (dict, str)): return "jsonl"
+    except ValueError:
+        pass
+    if any(sep in first_line for sep in ",;\t"): return "csv"
+    return "txt"
+
+
+def _json_entries(lines, field):
+    for line in lines:
+        if not line.strip(): continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield None
+            continue
+        if isinstance(row, str):
+            yield row
+        elif isinstance(row, dict):
+            yield next((row[f] for f in ([field] if field else _JSON_FIELDS) if isinstance(row.get(f), str)), None)
+        else:
+            yield None
+
+
+def _csv_entries(lines, column, first_line):
+    dialect = csv.Sniffer().sniff(first_line, delimiters=",;\t") if any(sep in first_line for sep in ",;\t") else csv.excel
+    rows = csv.reader(lines, dialect)
+    if column is None:
+        # Pas de colonne désignée : toutes les cellules sont candidates (l'en-tête compte comme invalide)
+        yield from rows
+        return
+    index = int(column) if str(column).isdigit() else None
+    if index is None:
+        header = [h.strip().lower() for h in next(rows, [])]
+        if column.lower() not in header: raise ValueError(f"Colonne absente de l'en-tête : {column}")
+        index = header.index(column.lower())
+    for row in rows:
+        yield row[index] if index < len(row) else None
+
+
+class DomainImporter:
+    """Transforme un flux de lignes en domaines dédupliqués, dans l'ordre du fichier ; stats au fil de l'eau"""
+
+    def __init__(self, fmt="auto", column=None, capacity=2_000_000):
+        self.format = fmt
+        self.column = column
+        self.seen = BloomFilter(capacity)
+        self.stats = {"rows": 0, "accepted": 0, "duplicates": 0, "invalid": 0}
+
+    def domains(self, lines):
+        lines = iter(lines)
+        first = next(lines, None)
+        if first is None: return
+        lines = itertools.chain([first], lines)
+        fmt = _detect_format(first) if self.format == "auto" else self.format
+        if fmt == "txt" and self.column is not None:
+            # Sans séparateur, une colonne désignée fait lire l'entrée comme un CSV à une colonne (en-tête compris)
+            if self.format != "auto": raise ValueError("--column ne s'applique pas au format txt (un domaine par ligne)")
+            fmt = "csv"
+        if fmt == "jsonl": entries = _json_entries(lines, self.column)
+        elif fmt == "csv": entries = _csv_entries(lines, self.column, first)
+        else: entries = (line for line in lines if line.strip())
+        stats = self.stats
+        for entry in entries:
+            stats["rows"] += 1
+            if isinstance(entry, list):
+                domain = next(filter(None, map(normalize_domain, entry)), None)  # première cellule qui contient un domaine
+            else:
+                domain = normalize_domain(entry) if entry else None
+            if domain is None:
+                stats["invalid"] += 1
+            elif not self.seen.add(domain):
+                stats["duplicates"] += 1
+            else:
+                stats["accepted"] += 1
+                yield domain
+        stats["false_positive_rate"] = float(f"{self.seen.false_positive_rate(stats['accepted']):.2e}")
+        stats["estimated_false_duplicates"] = round(self.seen.expected_false_positives(stats["accepted"]), 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Normalise et déduplique une liste de prospects (un domaine par ligne en sortie)")
+    parser.add_argument("file", help="CSV, JSONL ou texte ; - pour l'entrée standard")
+    parser.add_argument("--format", default="auto", choices=("auto", "csv", "jsonl", "txt"))
+    parser.add_argument("--column", help="colonne CSV (nom ou index) ou champ JSONL contenant le domaine, l'URL ou l'e-mail")
+    parser.add_argument("--capacity", type=int, default=2_000_000, help="nombre de domaines attendu (dimensionne le filtre de Bloom)")
+    args = parser.parse_args(argv)
+    importer = DomainImporter(args.format, args.column, args.capacity)
+    source = sys.stdin if args.file == "-" else open(args.file, newline="", encoding="utf-8-sig", errors="replace")
+    with source:
+        try:
+            for domain in importer.domains(source):
+                sys.stdout.write(domain + "\n")
+        except ValueError as e:
+            parser.error(str(e))
+    print(json.dumps(importer.stats), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Rescans incrémentaux : seules les vérifications dont les entrées ont changé sont relancées.
+
+Chaque scan incrémental garde, par domaine, le résultat brut de chaque vérification et
+des signaux de changement peu coûteux à relever :
+- addresses : ensemble des IP résolues ;
+- dns : empreinte des TXT du domaine et de _dmarc, et des MX ;
+- certificate : empreinte SHA-256 du certificat présenté ;
+- homepage : ETag / Last-Modified de la page d'accueil ;
+- ports : profil de ports demandé.
+Au scan suivant, une vérification est relancée si l'un de ses signaux a changé (ou est
+inconnu), si son dernier résultat était en erreur, ou s'il date de plus de max_age.
+
+Depuis la boucle asyncio, passer par SnapshotStore.aget() / asave() : SQLite et le
+(dé)codage JSON du snapshot partent dans un thread.
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from dns_resolver import DNSError
+
+CHECK_SIGNALS = {
+    "ssl": ("certificate", "addresses"),
+    "web": ("homepage", "certificate"),
+    "email_security": ("dns",),
+    "exposed_ports": ("addresses", "ports"),
+}
+_DNS_SIGNAL_QUERIES = (("", "TXT"), ("_dmarc.", "TXT"), ("", "MX"))
+
+
+async def dns_signal(resolver, domain):
+    """Empreinte des enregistrements lus par la vérification e-mail (un NXDOMAIN compte comme vide)"""
+    digest = hashlib.sha256()
+    for prefix, rdtype in _DNS_SIGNAL_QUERIES:
+        try:
+            records = sorted(await resolver.resolve(prefix + domain, rdtype))
+        except DNSError:
+            records = []
+        digest.update(json.dumps([rdtype, prefix, records]).encode())
+    return digest.hexdigest()
+
+
+def stale_checks(previous, signals, max_age, now=None):
+    """{vérification: raison} pour celles à relancer ; les autres peuvent reprendre le résultat précédent"""
+    now = time.time() if now is None else now
+    if previous is None:
+        return {check: "premier scan" for check in CHECK_SIGNALS}
+    stale = {}
+    for check, names in CHECK_SIGNALS.items():
+        result = previous["results"].get(check)
+        changed = [n for n in names if signals.get(n) is None or signals.get(n) != previous["signals"].get(n)]
+        if result is None or result.get("error") or result.get("timed_out"):
+            stale[check] = "erreur précédente"
+        elif changed:
+            stale[check] = ", ".join(changed)
+        elif now - previous["checked_at"].get(check, 0) > max_age:
+            stale[check] = "résultat trop ancien"
+    return stale
+
+
+def diff_reports(before, after):
+    """Écarts entre deux rapports : score, raisons, et champs modifiés de chaque vérification"""
+    if before is None:
+        return None
+    changes = {}
+    for check in CHECK_SIGNALS:
+        old, new = before["raw_data"].get(check) or {}, after["raw_data"].get(check) or {}
+        fields = {k: {"before": old.get(k), "after": new.get(k)} for k in old.keys() | new.keys() if old.get(k) != new.get(k)}
+        if fields: changes[check] = fields
+    return {
+        "previous_scanned_at": before["scanned_at"],
+        "criticality_score": {"before": before["criticality_score"], "after": after["criticality_score"]},
+        "reasons_added": [r for r in after["vulnerability_reasons"] if r not in before["vulnerability_reasons"]],
+        "reasons_removed": [r for r in before["vulnerability_reasons"] if r not in after["vulnerability_reasons"]],
+        "changes": changes,
+    }
+
+
+class SnapshotStore:
+    """Dernier scan incrémental de chaque domaine ; path=":memory:" si aucune persistance n'est voulue"""
+
+    def __init__(self, path=":memory:"):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS scan_snapshots (domain TEXT PRIMARY KEY, saved_at TEXT NOT NULL, snapshot TEXT NOT NULL)")
+        self._db.commit()
+
+    def get(self, domain):
+        """{"signals", "results", "checked_at", "report"} ou None"""
+        with self._lock:
+            row = self._db.execute("SELECT snapshot FROM scan_snapshots WHERE domain = ?", (domain.lower(),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def aget(self, domain):
+        return await asyncio.to_thread(self.get, domain)
+
+    def save(self, domain, signals, results, checked_at, report):
+        snapshot = {"signals": signals, "results": results, "checked_at": checked_at, "report": report}
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO scan_snapshots VALUES (?, ?, ?)",
+                             (domain.lower(), datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                              json.dumps(snapshot, ensure_ascii=False)))
+            self._db.commit()
+
+    async def asave(self, domain, signals, results, checked_at, report):
+        await asyncio.to_thread(self.save, domain, signals, results, checked_at, report)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,194 @@
+"""File de jobs de scan : le POST rend un scan_id tout de suite, un pool de workers vide la file.
+
+Le stockage des jobs est interchangeable : en mémoire par défaut, SQLite si
+SCAN_JOB_DB est défini (les jobs non terminés sont alors repris au redémarrage).
+Un stockage marqué blocking est appelé par JobQueue dans un thread : un commit par
+changement d'état ne bloque pas la boucle.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _new_job(domain, webhook_url, options):
+    return {
+        "scan_id": uuid.uuid4().hex, "domain": domain, "webhook_url": webhook_url, "options": options or {}, "status": QUEUED,
+        "submitted_at": _now(), "started_at": None, "finished_at": None, "result": None, "error": None,
+    }
+
+
+class MemoryJobStore:
+    """Jobs en mémoire ; au-delà de max_jobs, les plus anciens jobs terminés sont oubliés"""
+
+    blocking = False
+
+    def __init__(self, max_jobs=10000):
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+
+    def create(self, domain, webhook_url=None, options=None):
+        job = _new_job(domain, webhook_url, options)
+        self._jobs[job["scan_id"]] = job
+        if len(self._jobs) > self.max_jobs:
+            for scan_id, old in list(self._jobs.items()):
+                if old["status"] in (DONE, FAILED):
+                    del self._jobs[scan_id]
+                    break
+        return dict(job)
+
+    def get(self, scan_id):
+        job = self._jobs.get(scan_id)
+        return dict(job) if job else None
+
+    def update(self, scan_id, **fields):
+        if scan_id in self._jobs: self._jobs[scan_id].update(fields)
+
+    def unfinished(self):
+        return []  # rien ne survit à un redémarrage en mémoire
+
+    def close(self):
+        pass
+
+
+class SQLiteJobStore:
+    """Jobs persistés dans SQLite (un seul fichier, accès sérialisé par un verrou)"""
+
+    blocking = True
+    _COLUMNS = ("scan_id", "domain", "webhook_url", "options", "status", "submitted_at", "started_at", "finished_at", "result", "error")
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS scan_jobs ("
+            "scan_id TEXT PRIMARY KEY, domain TEXT NOT NULL, webhook_url TEXT, options TEXT, status TEXT NOT NULL, "
+            "submitted_at TEXT, started_at TEXT, finished_at TEXT, result TEXT, error TEXT)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS scan_jobs_status ON scan_jobs(status, submitted_at)")
+        self._db.commit()
+
+    def _row_to_job(self, row):
+        job = dict(zip(self._COLUMNS, row))
+        job["options"] = json.loads(job["options"] or "{}")
+        if job["result"]: job["result"] = json.loads(job["result"])
+        return job
+
+    def create(self, domain, webhook_url=None, options=None):
+        job = _new_job(domain, webhook_url, options)
+        with self._lock:
+            self._db.execute(f"INSERT INTO scan_jobs VALUES ({','.join('?' * len(self._COLUMNS))})",
+                             [json.dumps(job[c]) if c == "options" else job[c] for c in self._COLUMNS])
+            self._db.commit()
+        return job
+
+    def get(self, scan_id):
+        with self._lock:
+            row = self._db.execute(f"SELECT {','.join(self._COLUMNS)} FROM scan_jobs WHERE scan_id = ?",
+                                   (scan_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def update(self, scan_id, **fields):
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"], ensure_ascii=False)
+        with self._lock:
+            self._db.execute(f"UPDATE scan_jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE scan_id = ?",
+                             [*fields.values(), scan_id])
+            self._db.commit()
+
+    def unfinished(self):
+        with self._lock:
+            rows = self._db.execute(f"SELECT {','.join(self._COLUMNS)} FROM scan_jobs WHERE status IN (?, ?) "
+                                    "ORDER BY submitted_at", (QUEUED, RUNNING)).fetchall()
+        return [self._row_to_job(r) for r in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobQueue:
+    """File asyncio bornée + pool de workers qui exécutent run_scan(domain, **options).
+
+    on_done(job) est appelé pour chaque job terminé (ex : envoi du webhook)."""
+
+    def __init__(self, store, run_scan, on_done=None, workers=16, max_queued=10000):
+        self.store = store
+        self.run_scan = run_scan
+        self.on_done = on_done
+        self.workers = workers
+        self._queue = asyncio.Queue(maxsize=max_queued)
+        self._reserved = 0  # places promises à des submit() dont le job est en cours d'écriture
+        self._tasks = []
+
+    def depth(self):
+        return self._queue.qsize()
+
+    async def _store(self, method, *args, **fields):
+        """Appel au stockage ; dans un thread s'il est bloquant (SQLite)"""
+        method = getattr(self.store, method)
+        if self.store.blocking: return await asyncio.to_thread(method, *args, **fields)
+        return method(*args, **fields)
+
+    async def start(self):
+        for job in await self._store("unfinished"):
+            await self._store("update", job["scan_id"], status=QUEUED, started_at=None)
+            self._queue.put_nowait(job["scan_id"])
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for t in self._tasks: t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, domain, webhook_url=None, options=None):
+        if self._queue.maxsize and self._queue.qsize() + self._reserved >= self._queue.maxsize:
+            raise QueueFullError("File de scans pleine")
+        self._reserved += 1
+        try:
+            job = await self._store("create", domain, webhook_url, options)
+        finally:
+            self._reserved -= 1
+        await self._queue.put(job["scan_id"])  # immédiat, sauf si un submit_wait a pris la place entre-temps
+        return job
+
+    async def submit_wait(self, domain, webhook_url=None, options=None):
+        """Comme submit, mais attend qu'une place se libère au lieu d'échouer (imports en masse, dans l'ordre)"""
+        job = await self._store("create", domain, webhook_url, options)
+        try:
+            await self._queue.put(job["scan_id"])
+        except asyncio.CancelledError:
+            await asyncio.shield(self._store("update", job["scan_id"], status=FAILED, finished_at=_now(), error="Import interrompu"))
+            raise
+        return job
+
+    async def _worker(self):
+        while True:
+            scan_id = await self._queue.get()
+            try:
+                job = await self._store("get", scan_id)
+                if job is None: continue
+                await self._store("update", scan_id, status=RUNNING, started_at=_now())
+                try:
+                    report = await self.run_scan(job["domain"], **job["options"])
+                    await self._store("update", scan_id, status=DONE, finished_at=_now(), result=report)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    await self._store("update", scan_id, status=FAILED, finished_at=_now(), error=str(e) or type(e).__name__)
+                if self.on_done: self.on_done(await self._store("get", scan_id))
+            finally:
+                self._queue.task_done()
@@ -1,147 +1,295 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Header, Query, Request
+from fastapi.responses import StreamingResponse, JSONResponse, Response
+from pydantic import BaseModel, Field
+import os
 import ssl
-import socket
 from datetime import datetime, timezone
-import requests
 import json
-import urllib3
 import re
-import concurrent.futures
+import asyncio
+import contextlib
+import functools
+import io
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+import httpx
+from jobs import JobQueue, MemoryJobStore, SQLiteJobStore, QueueFullError
+from cache import ResultCache, SQLiteCacheBackend, DEFAULT_TTLS
+from dns_resolver import Resolver, DNSError, parse_nameservers
+from email_posture import check_email_posture
+from portscan import PortScanner, PortSpecError, ProbeMemo, PORT_PROFILES as EXTRA_PORT_PROFILES, parse_ports, service_name
+from network import resolve_addresses, race_connections
+from cert_store import CertificateStore, days_remaining
+from incremental import CHECK_SIGNALS, SnapshotStore, diff_reports, dns_signal, stale_checks
+from tls_inspect import describe_certificate, legacy_protocol, probe_matrix, probe_stapling, weak_ciphers
+from metrics import (CHECK_DURATION, CHECK_TIMEOUTS, CHECKS_IN_FLIGHT, SCANS_IN_FLIGHT, CONTENT_TYPE_LATEST, count_error,
+                     generate_latest, watch_stats, watch_workers)
+from webhooks import WebhookDispatcher, WebhookOutbox
+from fingerprints import fingerprinter, primary_cms
+from history import HistoryRecorder, HistoryStore
+from importer import DomainImporter
+from workers import ScanWorkerPool
+from ratelimit import RateLimiter, RateLimitedTransport, WaitClock
 
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+# Mode job : nombre de workers, taille max de la file, stockage SQLite optionnel
+SCAN_JOB_WORKERS = int(os.getenv("SCAN_JOB_WORKERS", "16"))
+SCAN_JOB_QUEUE_MAX = int(os.getenv("SCAN_JOB_QUEUE_MAX", "10000"))
+SCAN_JOB_DB = os.getenv("SCAN_JOB_DB")  # ex: /data/jobs.db ; en mémoire si absent
 
-app = FastAPI(title="Skynet Scanner API", description="API de scan OSINT pour automatisation")
+# Pools HTTP partagés (keep-alive) : DoH et webhooks réutilisent leurs connexions d'un scan à l'autre
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100"))
+HTTP_POOL_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20"))
+
+# Cache des résultats par domaine : TTL par vérification (SCAN_CACHE_TTL_SSL=..., 0 = désactivé), SQLite optionnel
+SCAN_CACHE_MAX_ENTRIES = int(os.getenv("SCAN_CACHE_MAX_ENTRIES", "50000"))
+SCAN_CACHE_DB = os.getenv("SCAN_CACHE_DB")
+SCAN_CACHE_TTLS = {check: int(os.getenv(f"SCAN_CACHE_TTL_{check.upper()}", ttl)) for check, ttl in DEFAULT_TTLS.items()}
+
+result_cache = ResultCache(SCAN_CACHE_TTLS, SCAN_CACHE_MAX_ENTRIES,
+                           SQLiteCacheBackend(SCAN_CACHE_DB) if SCAN_CACHE_DB else None)
+# Certificats vus (empreinte SHA-256) et domaine -> certificat présenté : suivi des expirations sans rescanner
+CERT_STORE_DB = os.getenv("CERT_STORE_DB")  # ex: /data/certs.db ; en mémoire si absent
+cert_store = CertificateStore(CERT_STORE_DB or ":memory:", SCAN_CACHE_MAX_ENTRIES)
+# Rescans incrémentaux (incremental=true) : dernier scan de chaque domaine et signaux de changement
+INCREMENTAL_DB = os.getenv("INCREMENTAL_DB")
+INCREMENTAL_MAX_AGE = int(os.getenv("INCREMENTAL_MAX_AGE", str(7 * 24 * 3600)))  # au-delà, la vérification est relancée quoi qu'il arrive
+snapshots = SnapshotStore(INCREMENTAL_DB or ":memory:")
+# Résolveur DNS direct : DNS_RESOLVERS="1.1.1.1,127.0.0.1:5353" (défaut : /etc/resolv.conf), DoH en secours
+DNS_RESOLVERS = os.getenv("DNS_RESOLVERS")
+DNS_TIMEOUT = float(os.getenv("DNS_TIMEOUT", "2"))
+DNS_DOH_FALLBACK = os.getenv("DNS_DOH_FALLBACK", "1") == "1"
+EMAIL_POSTURE_DEEP = os.getenv("EMAIL_POSTURE_DEEP", "1") == "1"  # arbre SPF, DKIM, MTA-STS, TLS-RPT, BIMI
+EMAIL_DKIM_ALL_SELECTORS = os.getenv("EMAIL_DKIM_ALL_SELECTORS", "0") == "1"  # sinon arrêt au premier sélecteur DKIM trouvé
+TLS_INSPECT_DEEP = os.getenv("TLS_INSPECT_DEEP", "1") == "1"  # familles de chiffrements, agrafage OCSP (sinon versions seules)
+
+# Balayage de ports : profil par défaut (critical, top100, well_known ou "22,80,8000-8100") et plafond de sockets
+SCAN_PORT_PROFILE = os.getenv("SCAN_PORT_PROFILE", "critical")
+SCAN_MAX_SOCKETS = int(os.getenv("SCAN_MAX_SOCKETS", "2000"))
+
+# Politesse : connexions par seconde (et rafale) vers une même IP et vers un même réseau /24 (/48 en IPv6),
+# toutes sondes confondues (ports, TLS, HTTP) ; 0 = pas de limite à ce niveau
+RATE_LIMIT_IP = float(os.getenv("RATE_LIMIT_IP", "20"))
+RATE_LIMIT_IP_BURST = int(os.getenv("RATE_LIMIT_IP_BURST", "40"))
+RATE_LIMIT_NET = float(os.getenv("RATE_LIMIT_NET", "60"))
+RATE_LIMIT_NET_BURST = int(os.getenv("RATE_LIMIT_NET_BURST", "120"))
+RATE_LIMIT_PORT_COST = float(os.getenv("RATE_LIMIT_PORT_COST", "0.1"))  # jeton par sonde de port (un SYN, pas une requête)
+rate_limiter = RateLimiter(RATE_LIMIT_IP, RATE_LIMIT_IP_BURST, RATE_LIMIT_NET, RATE_LIMIT_NET_BURST)
+
+# Corps HTTP lus au plus sur WEB_BODY_CAP octets (le <head> suffit aux fingerprints) : mémoire bornée par scan
+WEB_BODY_CAP = int(os.getenv("WEB_BODY_CAP", str(256 * 1024)))
+# Les fingerprints reçoivent le corps par paquets de 64 Ko ; la recherche coûte ~60 µs/Ko (plus sur du texte hostile) :
+# un paquet de plus de 16 Ko part dans un thread plutôt que de figer la boucle, et donc les autres scans
+FINGERPRINT_BATCH = 64 * 1024
+FINGERPRINT_INLINE_BYTES = 16 * 1024
+XMLRPC_BODY_CAP = 4096
+
+# Délai maximal d'un scan (secondes, surchargeable par requête) et part de ce délai accordée à chaque vérification
+# (SCAN_BUDGET_WEB=0.8...) : une vérification hors budget est annulée et marquée timed_out dans le rapport
+SCAN_DEADLINE = float(os.getenv("SCAN_DEADLINE", "15"))
+DEFAULT_BUDGET_SHARES = {"ssl": 0.6, "web": 1.0, "email_security": 0.6, "exposed_ports": 0.6}
+SCAN_BUDGET_SHARES = {check: float(os.getenv(f"SCAN_BUDGET_{check.upper()}", share)) for check, share in DEFAULT_BUDGET_SHARES.items()}
+
+# Webhooks : outbox (SQLite si WEBHOOK_OUTBOX_DB, sinon en mémoire), essais, POST simultanés par hôte,
+# et nombre de rapports par POST (1 = un rapport par appel ; au-delà, corps {"count", "reports"})
+WEBHOOK_OUTBOX_DB = os.getenv("WEBHOOK_OUTBOX_DB")
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_PER_HOST = int(os.getenv("WEBHOOK_PER_HOST", "4"))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "1"))
+
+# Historique des rapports (SQLite si SCAN_HISTORY_DB, sinon en mémoire), écrit par lots en tâche de fond
+SCAN_HISTORY_DB = os.getenv("SCAN_HISTORY_DB")
+SCAN_HISTORY_BATCH = int(os.getenv("SCAN_HISTORY_BATCH", "500"))
+
+# Processus de scan (0 = tout dans le processus de l'API) et scans simultanés par processus ; limites partagées entre eux.
+# Chaque processus a ses propres caches en mémoire : CERT_STORE_DB et INCREMENTAL_DB sont alors obligatoires,
+# sans quoi certificats et instantanés resteraient dans le worker qui a fait le scan
+SCAN_PROCESSES = int(os.getenv("SCAN_PROCESSES", "0"))
+SCAN_PROCESS_CONCURRENCY = int(os.getenv("SCAN_PROCESS_CONCURRENCY", "16"))
+
+job_queue: JobQueue = None
+scan_pool: ScanWorkerPool = None
+# Créneaux de vérification de tout le processus (jobs, /api/scan, flux, lots) ; en mode pool, ceux partagés avec les workers
+scan_limiter = None
+webhooks: WebhookDispatcher = None
+history: HistoryRecorder = None
+imports = OrderedDict()  # import_id -> état de l'import (les 100 derniers)
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global job_queue, scan_pool, scan_limiter, webhooks, history
+    if SCAN_PROCESSES > 0 and not (CERT_STORE_DB and INCREMENTAL_DB):
+        raise RuntimeError("SCAN_PROCESSES > 0 : CERT_STORE_DB et INCREMENTAL_DB doivent désigner des fichiers SQLite "
+                           "partagés par les processus de scan")
+    history = HistoryRecorder(HistoryStore(SCAN_HISTORY_DB or ":memory:"), batch_size=SCAN_HISTORY_BATCH)
+    await history.start()
+    webhooks = WebhookDispatcher(WebhookOutbox(WEBHOOK_OUTBOX_DB or ":memory:"), lambda: get_shared_client("webhook"),
+                                 per_host=WEBHOOK_PER_HOST, max_attempts=WEBHOOK_MAX_ATTEMPTS, batch_size=WEBHOOK_BATCH_SIZE)
+    await webhooks.start()
+    store = SQLiteJobStore(SCAN_JOB_DB) if SCAN_JOB_DB else MemoryJobStore()
+    if SCAN_PROCESSES > 0:
+        # Jobs exécutés par le pool de processus : autant de jobs en vol que de créneaux dans le pool
+        scan_pool = ScanWorkerPool(SCAN_PROCESSES, SCAN_PROCESS_CONCURRENCY, SCAN_GLOBAL_CONCURRENCY, SCAN_PER_TARGET_CONCURRENCY)
+        await scan_pool.start()
+        watch_workers(scan_pool.check_samples)  # /metrics : durées, erreurs et timeouts des vérifications faites par les workers
+        scan_limiter = scan_pool.limiter
+        rate_limiter.store = scan_pool.buckets  # seaux communs aux workers (flux et lots tournent dans ce processus)
+        job_queue = JobQueue(store, _scan_in_pool, on_done=_on_job_done, workers=SCAN_PROCESSES * SCAN_PROCESS_CONCURRENCY,
+                             max_queued=SCAN_JOB_QUEUE_MAX)
+    else:
+        scan_limiter = ScanLimiter()
+        job_queue = JobQueue(store, lambda domain, **options: execute_full_scan_async(domain, scan_limiter, **options),
+                             on_done=_on_job_done, workers=SCAN_JOB_WORKERS, max_queued=SCAN_JOB_QUEUE_MAX)
+    await job_queue.start()
+    try:
+        yield
+    finally:
+        for state in imports.values():
+            if state["task"]: state["task"].cancel()
+        await job_queue.stop()
+        if scan_pool: await scan_pool.stop()
+        store.close()
+        await webhooks.stop()
+        webhooks.outbox.close()
+        await history.stop()
+        history.store.close()
+        await close_shared_clients()
+
+app = FastAPI(title="Skynet Scanner API", description="API de scan OSINT pour automatisation", lifespan=lifespan)
+
+# Limites du scan par lot (surchargées par variables d'environnement)
+SCAN_GLOBAL_CONCURRENCY = int(os.getenv("SCAN_GLOBAL_CONCURRENCY", "200"))      # vérifications simultanées, tous domaines confondus
+SCAN_PER_TARGET_CONCURRENCY = int(os.getenv("SCAN_PER_TARGET_CONCURRENCY", "2"))  # vérifications simultanées sur un même domaine
+BATCH_MAX_DOMAINS = int(os.getenv("BATCH_MAX_DOMAINS", "20000"))
+
+DOMAIN_RE = re.compile(r'^[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
 
 class ScanRequest(BaseModel):
     domain: str
     webhook_url: str = None  # Optionnel: si Make veut qu'on le prévienne à la fin
+    mode: str = "sync"       # "job": renvoie un scan_id tout de suite, résultat via GET /api/scan/{scan_id}
+    force_refresh: bool = False  # ignore le cache de résultats
+    ports: str = None        # profil de ports (critical, top100, well_known) ou liste "22,80,8000-8100"
+    deadline: float = Field(None, gt=0, le=300)  # délai max du scan en secondes (défaut : SCAN_DEADLINE)
+    incremental: bool = False  # ne relance que les vérifications dont les entrées ont changé depuis le dernier scan incrémental
+
+class BatchScanRequest(BaseModel):
+    domains: list[str] = Field(..., min_length=1, max_length=BATCH_MAX_DOMAINS)
+    webhook_url: str = None  # Optionnel: un appel par domaine terminé
+    stream: bool = True      # NDJSON au fil de l'eau, sinon une seule réponse JSON à la fin
+    force_refresh: bool = False
+    ports: str = None
+    deadline: float = Field(None, gt=0, le=300)  # par domaine
+    incremental: bool = False
 
 # ----------------- COPIE DES FONCTIONS DE SCAN (Identiques au script) -----------------
 
-def check_ssl(domain):
-    port = 443
-    result = {"has_ssl": False, "expired": False, "days_remaining": 0, "tls_version": None, "weak_tls": False, "error": None}
-    context = ssl.create_default_context()
-    try:
-        with socket.create_connection((domain, port), timeout=5) as sock:
-            with context.wrap_socket(sock, server_hostname=domain) as ssock:
-                cert = ssock.getpeercert()
-                result["has_ssl"] = True
-                result["tls_version"] = ssock.version()
-                if ssock.version() in ("TLSv1", "TLSv1.1"): result["weak_tls"] = True
-                not_after = datetime.strptime(cert['notAfter'], '%b %d %H:%M:%S %Y %Z')
-                days_remaining = (not_after - datetime.now(timezone.utc).replace(tzinfo=None)).days
-                result["days_remaining"] = days_remaining
-                result["expired"] = days_remaining < 15
-    except ssl.SSLCertVerificationError:
-        result["has_ssl"] = True; result["expired"] = True; result["error"] = "Certificat invalide ou expiré"
-    except Exception as e:
-        result["error"] = str(e)
-    return result
+def _empty_ssl_result():
+    return {"has_ssl": False, "expired": False, "days_remaining": 0, "tls_version": None, "weak_tls": False,
+            "legacy_tls_accepted": None, "protocols": None, "cipher_groups": None, "weak_ciphers": [], "certificate": None,
+            "ocsp_stapled": None, "ip": None, "error": None}
 
-def check_web(domain):
-    result = {
+async def _acertificate(ssock):
+    """Résumé du certificat présenté ; décodé seulement à la première rencontre (cert_store), SQLite hors de la boucle"""
+    return await cert_store.acertificate(ssock.getpeercert(binary_form=True), ssock.getpeercert)
+
+def _fill_ssl_result(result, certificate, tls_version):
+    result["has_ssl"] = True
+    result["tls_version"] = tls_version
+    if tls_version in ("TLSv1", "TLSv1.1"): result["weak_tls"] = True
+    result["days_remaining"] = days_remaining(certificate)
+    result["expired"] = result["days_remaining"] < 15
+    result["certificate"] = {"chain_valid": True, "chain_error": None,
+                             **{k: v for k, v in certificate.items() if k != "expires_at"}, "chain": None}
+
+def _fill_cert_error(result, error):
+    result["has_ssl"] = True; result["expired"] = True; result["error"] = "Certificat invalide ou expiré"
+    result["certificate"] = describe_certificate(None, getattr(error, "verify_message", None) or str(error))
+
+def _empty_web_result():
+    return {
         "redirects_http_to_https": False, "server_exposed": False, "server_version": None,
         "php_version_exposed": False, "php_version": None, "missing_security_headers": [],
         "missing_csp": False, "insecure_cookies": [], "cms_detected": None,
-        "cms_version_exposed": None, "wordpress_xmlrpc_open": False, "robots_admin_paths": [], "error": None
+        "cms_version_exposed": None, "technologies": {}, "wordpress_xmlrpc_open": False, "robots_admin_paths": [], "error": None
     }
-    try:
-        r_http = requests.get(f"http://{domain}", timeout=5, allow_redirects=False, verify=False)
-        result["redirects_http_to_https"] = r_http.headers.get("Location", "").startswith("https://")
-    except: pass
 
-    try:
-        response = requests.get(f"https://{domain}", timeout=5, verify=False)
-        headers = response.headers
-        html = response.text.lower()
-
-        server_val = headers.get("Server", headers.get("server", ""))
-        if server_val:
-            result["server_version"] = server_val
-            if any(c.isdigit() for c in server_val): result["server_exposed"] = True
-
-        xpb = headers.get("X-Powered-By", "")
-        if "php/" in xpb.lower():
-            result["php_version_exposed"] = True
-            result["php_version"] = xpb
-
-        sec_hdrs = ["Strict-Transport-Security", "X-Frame-Options", "X-Content-Type-Options", "Permissions-Policy"]
-        result["missing_security_headers"] = [h for h in sec_hdrs if h not in headers]
-        result["missing_csp"] = "Content-Security-Policy" not in headers
-
-        if "wp-content" in html or "wp-includes" in html:
-            result["cms_detected"] = "WordPress"
-            m = re.search(r'<meta name="generator" content="(wordpress[^"]+)"', html)
-            if m: result["cms_version_exposed"] = m.group(1)
-            try:
-                xr = requests.get(f"https://{domain}/xmlrpc.php", timeout=4, verify=False)
-                if xr.status_code in (200, 405) and "xmlrpc" in xr.text.lower():
-                    result["wordpress_xmlrpc_open"] = True
-            except: pass
-    except Exception as e:
-        result["error"] = str(e)
-    return result
+def _analyze_web_response(result, headers, technologies):
+    """Analyse les headers de la page d'accueil HTTPS et les technologies détectées (fingerprints.py)"""
+    server_val = headers.get("Server", headers.get("server", ""))
+    if server_val:
+        result["server_version"] = server_val
+        if any(c.isdigit() for c in server_val): result["server_exposed"] = True
 
-def check_email_security(domain):
-    result = {"spf_found": False, "dmarc_found": False, "dmarc_policy": None, "dmarc_weak_policy": False, "spoofable": False}
-    try:
-        r_spf = requests.get(f"https://dns.google/resolve?name={domain}&type=TXT", timeout=5).json()
-        if "Answer" in r_spf:
-            for a in r_spf["Answer"]:
-                if "v=spf1" in a.get("data", ""): result["spf_found"] = True
-
-        r_dmarc = requests.get(f"https://dns.google/resolve?name=_dmarc.{domain}&type=TXT", timeout=5).json()
-        if "Answer" in r_dmarc:
-            for a in r_dmarc["Answer"]:
-                data = a.get("data", "")
-                if "v=DMARC1" in data:
-                    result["dmarc_found"] = True
-                    m = re.search(r'p=(\w+)', data)
-                    if m:
-                        policy = m.group(1).lower()
-                        result["dmarc_policy"] = policy
-                        if policy == "none": result["dmarc_weak_policy"] = True
-
-        if not result["spf_found"] or not result["dmarc_found"] or result["dmarc_weak_policy"]:
-            result["spoofable"] = True
-    except: pass
-    return result
+    xpb = headers.get("X-Powered-By", "")
+    if "php/" in xpb.lower():
+        result["php_version_exposed"] = True
+        result["php_version"] = xpb
+
+    sec_hdrs = ["Strict-Transport-Security", "X-Frame-Options", "X-Content-Type-Options", "Permissions-Policy"]
+    result["missing_security_headers"] = [h for h in sec_hdrs if h not in headers]
+    result["missing_csp"] = "Content-Security-Policy" not in headers
+
+    result["technologies"] = technologies
+    cms = primary_cms(technologies)
+    if cms:
+        result["cms_detected"] = cms
+        if technologies[cms]["version"]: result["cms_version_exposed"] = f"{cms} {technologies[cms]['version']}"
+
+def _is_xmlrpc_open(status_code, text):
+    return status_code in (200, 405) and "xmlrpc" in text.lower()
+
+def _empty_email_result():
+    return {"spf_found": False, "dmarc_found": False, "dmarc_policy": None, "dmarc_weak_policy": False, "spoofable": False}
+
+def _doh_records(answer):
+    return [a.get("data", "") for a in answer.get("Answer", [])]
+
+def _parse_spf_records(result, records):
+    for data in records:
+        if "v=spf1" in data: result["spf_found"] = True
+
+def _parse_dmarc_records(result, records):
+    for data in records:
+        if "v=DMARC1" in data:
+            result["dmarc_found"] = True
+            m = re.search(r'p=(\w+)', data)
+            if m:
+                policy = m.group(1).lower()
+                result["dmarc_policy"] = policy
+                if policy == "none": result["dmarc_weak_policy"] = True
+
+def _finalize_email_result(result):
+    if not result["spf_found"] or not result["dmarc_found"] or result["dmarc_weak_policy"]:
+        result["spoofable"] = True
 
 CRITICAL_PORTS = {21: "FTP", 22: "SSH", 23: "Telnet", 3306: "MySQL", 3389: "RDP", 5432: "PostgreSQL"}
+PORT_PROFILES = {"critical": list(CRITICAL_PORTS), **EXTRA_PORT_PROFILES}
 
-def _probe_port(domain, port):
-    try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.settimeout(2)
-            return port if s.connect_ex((domain, port)) == 0 else None
-    except: return None
-
-def check_open_ports(domain):
-    open_ports = {}
-    with concurrent.futures.ThreadPoolExecutor(max_workers=6) as ex:
-        futures = {ex.submit(_probe_port, domain, p): p for p in CRITICAL_PORTS}
-        for f in concurrent.futures.as_completed(futures):
-            p = f.result()
-            if p: open_ports[str(p)] = CRITICAL_PORTS[p]
-    return open_ports
-
-def evaluate_risk(domain, ssl_r, web_r, email_r, ports_r):
+def evaluate_risk(domain, ssl_r, web_r, email_r, ports_r, ports_by_ip=None):
     reasons = []
     criticality = 0
     if ssl_r.get("expired"): reasons.append("SSL expiré"); criticality += 3
-    if ssl_r.get("weak_tls"): reasons.append(f"TLS obsolète ({ssl_r.get('tls_version')})"); criticality += 3
+    if ssl_r.get("weak_tls"):
+        weak_version = ssl_r.get("tls_version") if ssl_r.get("tls_version") in ("TLSv1", "TLSv1.1") else ssl_r.get("legacy_tls_accepted")
+        reasons.append(f"TLS obsolète ({weak_version})"); criticality += 3
+    if ssl_r.get("weak_ciphers"): reasons.append(f"Chiffrements faibles ({', '.join(ssl_r['weak_ciphers'])})"); criticality += 2
     if web_r.get("server_exposed"): reasons.append(f"Serveur exposé ({web_r.get('server_version')})"); criticality += 2
     if web_r.get("php_version_exposed"): reasons.append(f"PHP exposé ({web_r.get('php_version')})"); criticality += 2
-    if not web_r.get("redirects_http_to_https"): reasons.append("Pas de HTTPS forcé"); criticality += 2
+    if not web_r.get("redirects_http_to_https") and not web_r.get("timed_out"): reasons.append("Pas de HTTPS forcé"); criticality += 2
     if len(web_r.get("missing_security_headers", [])) >= 3: reasons.append("Manque headers sécu"); criticality += 1
     if web_r.get("wordpress_xmlrpc_open"): reasons.append("WP xmlrpc exposé"); criticality += 4
     if email_r.get("spoofable"): reasons.append("Domaine usurpable (Fake Email possible)"); criticality += 4
-    for port, service in ports_r.items(): reasons.append(f"Port critique: {port} ({service})"); criticality += 3
+    spf_tree = email_r.get("spf") or {}
+    if spf_tree.get("too_many_lookups"): reasons.append(f"SPF invalide ({spf_tree.get('lookups')} lookups DNS > 10)"); criticality += 2
+    if spf_tree.get("all_qualifier") == "+all": reasons.append("SPF permissif (+all)"); criticality += 3
+    # Un profil de ports large remonte aussi 80/443... : seuls les ports critiques comptent dans le risque
+    critical_ports = {port: service for port, service in ports_r.items() if int(port) in CRITICAL_PORTS}
+    for port, service in critical_ports.items(): reasons.append(f"Port critique: {port} ({service})"); criticality += 3
 
     has_vulnerability = len(reasons) > 0
-    if criticality >= 8 or ports_r or (email_r.get("spoofable") and not email_r.get("dmarc_found")):
+    if criticality >= 8 or critical_ports or (email_r.get("spoofable") and not email_r.get("dmarc_found")):
         template = "template_alerte_critique"
     elif has_vulnerability:
         template = "template_alerte_rouge"
@@ -155,56 +303,818 @@ def evaluate_risk(domain, ssl_r, web_r, email_r, ports_r):
         "criticality_score": criticality,
         "vulnerability_reasons": reasons,
         "email_template_id": template,
-        "raw_data": {"ssl": ssl_r, "web": web_r, "email_security": email_r, "exposed_ports": ports_r}
+        "timed_out_checks": [name for name, r in (("ssl", ssl_r), ("web", web_r), ("email_security", email_r),
+                                                  ("exposed_ports", ports_by_ip or {})) if r.get("timed_out")],
+        "raw_data": {"ssl": ssl_r, "web": web_r, "email_security": email_r, "exposed_ports": ports_r,
+                     **({"addresses": ports_by_ip["addresses"], "exposed_ports_by_ip": ports_by_ip["by_ip"]} if ports_by_ip else {})}
     }
 
 # ----------------- FIN DES FONCTIONS COPIÉES -----------------
 
+# ----------------- MOTEUR DE SCAN ASYNCHRONE -----------------
+# Les vérifications tournent sur une seule boucle asyncio : aucun thread bloqué sur des sockets pendant le scan.
+
+_shared_clients = {}  # nom -> (boucle, client httpx)
+
+def get_shared_client(name, **kwargs):
+    """Client httpx partagé entre les scans (DoH, webhooks), un par boucle asyncio"""
+    loop = asyncio.get_running_loop()
+    entry = _shared_clients.get(name)
+    if entry is None or entry[0] is not loop:
+        limits = httpx.Limits(max_connections=HTTP_POOL_MAX_CONNECTIONS,
+                              max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE, keepalive_expiry=30)
+        entry = (loop, httpx.AsyncClient(limits=limits, timeout=5, **kwargs))
+        _shared_clients[name] = entry
+    return entry[1]
+
+async def close_shared_clients():
+    loop = asyncio.get_running_loop()
+    for name, (client_loop, client) in list(_shared_clients.items()):
+        if client_loop is loop: await client.aclose()
+        del _shared_clients[name]
+
+async def _aread_capped(response, cap, sink=None, batch=FINGERPRINT_BATCH):
+    """Lit au plus cap octets du corps (décompressé), dans un bloc client.stream() ;
+    sink (coroutine) reçoit le corps par paquets d'environ batch octets au lieu de le garder"""
+    body, read = bytearray(), 0
+    async for chunk in response.aiter_bytes():
+        chunk = chunk[:cap - read]
+        read += len(chunk)
+        body += chunk
+        if sink and len(body) >= batch:
+            await sink(bytes(body))
+            body.clear()
+        if read >= cap: break
+    if sink and body:
+        await sink(bytes(body))
+        body.clear()
+    return bytes(body)
+
+async def _feed_fingerprints(fingerprints, data):
+    if len(data) > FINGERPRINT_INLINE_BYTES: await asyncio.to_thread(fingerprints.feed, data)
+    else: fingerprints.feed(data)
+
+def _cert_error(exc):
+    """ssl.SSLCertVerificationError à l'origine de exc, ou None"""
+    while exc is not None:
+        if isinstance(exc, ssl.SSLCertVerificationError): return exc
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+async def _tls_info(response):
+    """Certificat, version TLS et IP de la connexion qui a servi la réponse (HTTP/1.1 ou HTTP/2)"""
+    stream = response.extensions.get("network_stream")
+    ssock = stream.get_extra_info("ssl_object") if stream else None
+    if ssock is None: return None
+    server_addr = stream.get_extra_info("server_addr")
+    return {"certificate": await _acertificate(ssock), "version": ssock.version(), "ip": server_addr[0] if server_addr else None}
+
+def _polite_transport(**kwargs):
+    """Transport httpx HTTP/2 qui prend un jeton du RateLimiter par requête (le client ignore alors http2, limits, verify)"""
+    return RateLimitedTransport(rate_limiter, lambda host: resolve_addresses(host, dns_resolver), http2=True, **kwargs)
+
+class TargetContext:
+    """Connexions d'un scan vers un domaine, partagées par check_ssl et check_web.
+
+    La page d'accueil HTTPS n'est chargée qu'une fois, par un client qui vérifie le certificat
+    et parle HTTP/2 si le serveur le propose : cette seule poignée de main TLS donne le
+    certificat et la version TLS (check_ssl), les en-têtes et les fingerprints (check_web),
+    et la connexion resservira à la sonde xmlrpc. Certificat invalide : check_ssl le signale
+    et check_web repasse par un client sans vérification."""
+
+    def __init__(self, domain):
+        self.domain = domain
+        limits = httpx.Limits(max_connections=2, max_keepalive_connections=2)
+        self.client = httpx.AsyncClient(timeout=5, transport=_polite_transport(limits=limits))
+        self._insecure = None
+        self._homepage = None
+
+    def web_client(self, insecure=False):
+        if not insecure: return self.client
+        if self._insecure is None:
+            self._insecure = httpx.AsyncClient(timeout=5, transport=_polite_transport(verify=False, limits=httpx.Limits(max_connections=2)))
+        return self._insecure
+
+    def homepage(self):
+        """{"tls", "cert_error", "headers", "technologies", "http_version"} ; un seul chargement quel que soit l'appelant"""
+        if self._homepage is None: self._homepage = asyncio.ensure_future(self._fetch_homepage())
+        # shield : le budget dépassé d'une vérification n'annule pas le chargement pour l'autre
+        return asyncio.shield(self._homepage)
+
+    async def _fetch_homepage(self):
+        try:
+            return {"cert_error": None, **await self._get_homepage(self.client)}
+        except httpx.ConnectError as e:
+            cert_error = _cert_error(e)
+            if cert_error is None: raise
+            return {**await self._get_homepage(self.web_client(insecure=True)), "cert_error": cert_error}
+
+    async def _get_homepage(self, client):
+        # Première réponse sans suivre les redirections : c'est le certificat du domaine lui-même qui compte
+        response = await client.send(client.build_request("GET", f"https://{self.domain}"), stream=True)
+        try:
+            # Certificat non vérifié (client de secours) : getpeercert() n'a rien à dire
+            tls = await _tls_info(response) if client is self.client else None
+            if response.next_request is not None:
+                await response.aclose()
+                response = await client.send(response.next_request, stream=True, follow_redirects=True)
+            # Corps en flux, plafonné : les fingerprints avancent paquet par paquet, seul le paquet en cours est gardé
+            fingerprints = fingerprinter.session()
+            fingerprints.feed_headers(response.headers)
+            await _aread_capped(response, WEB_BODY_CAP, functools.partial(_feed_fingerprints, fingerprints))
+            return {"tls": tls, "headers": response.headers, "technologies": fingerprints.results(),
+                    "http_version": response.http_version}
+        finally:
+            await response.aclose()
+
+    async def head(self):
+        """(empreinte du certificat, {ETag, Last-Modified} de la page d'accueil) par une requête HEAD"""
+        async with self.client.stream("HEAD", f"https://{self.domain}") as response:
+            tls = await _tls_info(response)
+            validators = {k: response.headers[k] for k in ("ETag", "Last-Modified") if k in response.headers}
+        return (tls["certificate"]["fingerprint"] if tls else None), validators or None
+
+    async def aclose(self):
+        if self._homepage is not None and not self._homepage.done():
+            self._homepage.cancel()
+            await asyncio.gather(self._homepage, return_exceptions=True)
+        elif self._homepage is not None and not self._homepage.cancelled():
+            self._homepage.exception()  # déjà remontée aux vérifications
+        await self.client.aclose()
+        if self._insecure is not None: await self._insecure.aclose()
+
+async def _stapling_or_none(ip, domain):
+    try:
+        return await probe_stapling(ip, domain, limiter=rate_limiter)
+    except Exception as e:
+        count_error("ssl", e)
+        return None
+
+async def _inspect_tls(result, domain, probe_memo):
+    """Versions et chiffrements acceptés par l'IP (une fois par IP dans un lot), agrafage OCSP et chaîne pour le domaine"""
+    ip = result["ip"]
+    start = functools.partial(probe_matrix, ip, domain, ciphers=TLS_INSPECT_DEEP, limiter=rate_limiter)
+    matrix = start() if probe_memo is None else asyncio.shield(probe_memo.get_or_start(("tls_matrix", ip), start))
+    stapling = _stapling_or_none(ip, domain) if TLS_INSPECT_DEEP else asyncio.sleep(0)
+    matrix, stapling = await asyncio.gather(matrix, stapling)
+    result["protocols"] = matrix["protocols"]
+    result["cipher_groups"] = matrix["cipher_groups"] or None
+    result["legacy_tls_accepted"] = legacy_protocol(matrix)
+    if result["legacy_tls_accepted"]: result["weak_tls"] = True
+    result["weak_ciphers"] = weak_ciphers(matrix)
+    if stapling:
+        result["ocsp_stapled"] = stapling["ocsp_stapled"]
+        result["certificate"]["chain"] = stapling["chain"]
+
+async def check_ssl_async(domain, addresses=None, probe_memo: ProbeMemo = None, target: TargetContext = None):
+    result = _empty_ssl_result()
+    context = ssl.create_default_context()
+    writer = None
+    try:
+        page = None
+        if target is not None:
+            try:
+                page = await target.homepage()
+            except Exception as e:
+                count_error("ssl", e)  # pas de réponse HTTPS : poignée de main dédiée ci-dessous
+        if page and page["cert_error"]:
+            raise page["cert_error"]
+        if page and page["tls"]:
+            tls = page["tls"]
+            _fill_ssl_result(result, tls["certificate"], tls["version"])
+            result["ip"] = tls["ip"]
+        else:
+            if addresses is None: addresses = await resolve_addresses(domain, dns_resolver)
+            # Toutes les adresses (IPv6/IPv4) en course : une IP morte ne coûte plus un timeout complet
+            result["ip"], _, writer = await race_connections(addresses, 443, timeout=5, limiter=rate_limiter, ssl=context,
+                                                             server_hostname=domain)
+            ssock = writer.get_extra_info("ssl_object")
+            _fill_ssl_result(result, await _acertificate(ssock), ssock.version())
+        await cert_store.aseen(domain, result["certificate"]["fingerprint"])
+        if result["ip"]: await _inspect_tls(result, domain, probe_memo)
+    except ssl.SSLCertVerificationError as e:
+        count_error("ssl", e)
+        _fill_cert_error(result, e)
+    except asyncio.TimeoutError as e:
+        count_error("ssl", e)
+        result["error"] = "timed out"
+    except Exception as e:
+        count_error("ssl", e)
+        result["error"] = str(e)
+    finally:
+        if writer: writer.close()
+    return result
+
+async def check_web_async(domain, target: TargetContext = None):
+    result = _empty_web_result()
+    async with contextlib.AsyncExitStack() as stack:
+        if target is None:
+            target = TargetContext(domain)
+            stack.push_async_callback(target.aclose)
+        try:
+            # Seuls les en-têtes comptent : le corps n'est ni lu ni décodé
+            async with target.client.stream("GET", f"http://{domain}") as r_http:
+                result["redirects_http_to_https"] = r_http.headers.get("Location", "").startswith("https://")
+        except Exception as e: count_error("web", e)
+
+        try:
+            page = await target.homepage()
+            _analyze_web_response(result, page["headers"], page["technologies"])
+
+            if "WordPress" in result["technologies"]:
+                try:
+                    # Même client (donc même connexion TLS / HTTP/2) que la page d'accueil
+                    client = target.web_client(insecure=page["cert_error"] is not None)
+                    async with client.stream("GET", f"https://{domain}/xmlrpc.php", timeout=4, follow_redirects=True) as xr:
+                        xr_body = await _aread_capped(xr, XMLRPC_BODY_CAP)
+                    if _is_xmlrpc_open(xr.status_code, xr_body.decode("utf-8", "replace")):
+                        result["wordpress_xmlrpc_open"] = True
+                except Exception as e: count_error("web", e)
+        except Exception as e:
+            count_error("web", e)
+            result["error"] = str(e) or type(e).__name__
+    return result
+
+dns_resolver = Resolver(parse_nameservers(DNS_RESOLVERS) if DNS_RESOLVERS else None, timeout=DNS_TIMEOUT,
+                        doh_client=(lambda: get_shared_client("doh")) if DNS_DOH_FALLBACK else None)
+
+async def check_email_security_async(domain):
+    result = _empty_email_result()
+    posture = asyncio.ensure_future(check_email_posture(dns_resolver, domain, get_shared_client("mta-sts"),
+                                                                                EMAIL_DKIM_ALL_SELECTORS)) if EMAIL_POSTURE_DEEP else None
+    try:
+        try:
+            spf, dmarc = await asyncio.gather(dns_resolver.resolve(domain, "TXT"), dns_resolver.resolve(f"_dmarc.{domain}", "TXT"))
+        except DNSError as e:
+            count_error("email_security", e)
+            result["error"] = str(e)
+            return result
+        _parse_spf_records(result, spf)
+        _parse_dmarc_records(result, dmarc)
+        _finalize_email_result(result)
+        if posture: result.update(await posture)
+    finally:
+        # Erreur DNS, ou vérification annulée (budget dépassé) : la posture détaillée ne continue pas seule
+        if posture and not posture.done(): posture.cancel()
+    return result
+
+port_scanner = PortScanner(max_sockets=SCAN_MAX_SOCKETS, timeout=2, rate_limiter=rate_limiter, rate_cost=RATE_LIMIT_PORT_COST)
+
+def _ports_by_ip(swept):
+    return {ip: {str(p): service_name(p, CRITICAL_PORTS) for p in sorted(open_ports)} for ip, open_ports in swept.items()}
+
+async def check_ports_by_ip_async(domain, ports=None, addresses=None, probe_memo: ProbeMemo = None, progress: dict = None):
+    """Ports ouverts sur chaque adresse IPv4/IPv6 du domaine ; progress reçoit {"addresses", "found"} au fil du balayage"""
+    result = {"addresses": [], "by_ip": {}, "error": None}
+    ports = ports or PORT_PROFILES[SCAN_PORT_PROFILE]
+    try:
+        if addresses is None: addresses = await resolve_addresses(domain, dns_resolver)
+    except OSError as e:
+        count_error("exposed_ports", e)
+        result["error"] = str(e)
+        return result
+    result["addresses"] = [ip for _, ip in addresses]
+    found = None
+    if progress is not None:
+        progress.update({"addresses": result["addresses"], "found": {}})
+        found = progress["found"]
+    result["by_ip"] = _ports_by_ip(await port_scanner.sweep(addresses, ports, probe_memo, found))
+    return result
+
+def _partial_ports_result(progress, budget):
+    """Balayage interrompu : les ports déjà trouvés ouverts restent dans le rapport (et dans le risque)"""
+    result = _timed_out_result("exposed_ports", budget)
+    result.update({"addresses": progress.get("addresses", []), "by_ip": _ports_by_ip(progress.get("found", {})), "partial": True})
+    return result
+
+def _merge_ports(ports_by_ip):
+    merged = {}
+    for open_ports in ports_by_ip["by_ip"].values(): merged.update(open_ports)
+    return dict(sorted(merged.items(), key=lambda kv: int(kv[0])))
+
+class ScanLimiter:
+    """Borne le nombre de vérifications en vol : globalement et par domaine cible"""
+
+    def __init__(self, global_limit=SCAN_GLOBAL_CONCURRENCY, per_target_limit=SCAN_PER_TARGET_CONCURRENCY):
+        self.global_limit = global_limit
+        self.per_target_limit = per_target_limit
+        self._global = asyncio.Semaphore(global_limit)
+        self._targets = {}  # cible -> [sémaphore, nb d'utilisateurs]
+
+    @contextlib.asynccontextmanager
+    async def slot(self, target):
+        entry = self._targets.setdefault(target, [asyncio.Semaphore(self.per_target_limit), 0])
+        entry[1] += 1
+        try:
+            # On prend d'abord le créneau de la cible pour ne pas bloquer un créneau global en attendant
+            async with entry[0], self._global:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0: del self._targets[target]
+
+async def _timed_check(name, check, domain):
+    with CHECK_DURATION.labels(name).time(), CHECKS_IN_FLIGHT.labels(name).track_inprogress():
+        return await check(domain)
+
+async def _run_check(name, check, domain, limiter=None, force_refresh=False, variant=None, budget=None, on_timeout=None):
+    if not force_refresh:
+        cached = await result_cache.aget(domain, name, variant)
+        if cached is not None: return cached
+    if limiter is None:
+        result = await _within_budget(name, _timed_check(name, check, domain), budget, on_timeout)
+    else:
+        async with limiter.slot(domain):
+            # Le budget ne court qu'une fois le créneau obtenu : l'attente derrière les autres vérifications n'est pas un timeout
+            result = await _within_budget(name, _timed_check(name, check, domain), budget, on_timeout)
+    # Les échecs (timeout, DNS...) sont souvent passagers : on ne les garde pas
+    if not (isinstance(result, dict) and result.get("error")):
+        await result_cache.aset(domain, name, result, variant)
+    return result
+
+async def _resolve_or_none(domain):
+    try:
+        return await resolve_addresses(domain, dns_resolver)
+    except OSError as e:
+        count_error("resolve", e)
+        return None
+
+def _timed_out_result(name, budget):
+    empty = {"ssl": _empty_ssl_result, "web": _empty_web_result, "email_security": _empty_email_result,
+             "exposed_ports": lambda: {"addresses": [], "by_ip": {}}}
+    result = empty[name]()
+    result["error"] = f"Délai dépassé ({budget:g} s)"
+    result["timed_out"] = True
+    return result
+
+async def _within_budget(name, coro, budget, on_timeout=None):
+    """Annule la vérification (et tout ce qu'elle a lancé) si elle dépasse son budget ; budget=None : pas de limite.
+
+    Le temps passé à attendre des jetons du rate_limiter (WaitClock) ne compte pas dans le budget.
+    on_timeout(budget) construit le résultat d'une vérification annulée (vide par défaut)."""
+    if budget is None:
+        return await coro
+    clock = WaitClock()
+    task = asyncio.ensure_future(clock.run(coro))
+    # Tâche annulée avant son premier pas (délai du scan) : coro n'a jamais démarré, on le ferme (sinon "never awaited")
+    task.add_done_callback(lambda _: coro.close())
+    started = time.monotonic()
+    try:
+        while True:
+            remaining = started + budget + clock.paused(time.monotonic()) - time.monotonic()
+            if remaining <= 0: break
+            await asyncio.wait([task], timeout=remaining)
+            if task.done(): return task.result()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    finally:
+        task.cancel()  # vérification elle-même annulée (délai du scan, client parti)
+    CHECK_TIMEOUTS.labels(name).inc()
+    return on_timeout(budget) if on_timeout else _timed_out_result(name, budget)
+
+async def _change_signals(domain, addresses, ports, target):
+    """Signaux de changement du mode incrémental (voir incremental.py) ; None = inconnu, la vérification sera relancée"""
+    dns, head = await asyncio.gather(dns_signal(dns_resolver, domain), target.head(), return_exceptions=True)
+    for e in (dns, head):
+        if isinstance(e, Exception): count_error("incremental", e)
+    certificate, homepage = head if not isinstance(head, Exception) else (None, None)
+    return {"addresses": sorted(ip for _, ip in addresses) if addresses else None, "dns": None if isinstance(dns, Exception) else dns,
+            "certificate": certificate, "homepage": homepage, "ports": ports or SCAN_PORT_PROFILE}
+
+async def iter_scan_events(domain: str, limiter: ScanLimiter = None, force_refresh: bool = False, ports: str = None,
+                           probe_memo: ProbeMemo = None, addresses=None, deadline: float = None, incremental: bool = False):
+    """Lance les quatre vérifications en parallèle et produit (nom, résultat) dès que chacune se termine,
+    puis ("report", rapport final de evaluate_risk).
+
+    deadline (secondes, SCAN_DEADLINE par défaut) couvre tout le scan, résolution DNS et attente des
+    créneaux du limiter comprises ; chaque vérification dispose en plus de sa part (SCAN_BUDGET_SHARES)
+    du temps restant, décomptée à partir du moment où elle obtient son créneau.
+    incremental : reprend les résultats du scan incrémental précédent dont les signaux n'ont pas changé,
+    et ajoute au rapport la liste des vérifications relancées et l'écart avec ce scan précédent."""
+    loop = asyncio.get_running_loop()
+    deadline = deadline or SCAN_DEADLINE
+    expires_at = loop.time() + deadline
+    port_list = parse_ports(ports or SCAN_PORT_PROFILE, PORT_PROFILES)
+    ports_variant = ports if ports not in (None, SCAN_PORT_PROFILE) else None
+    # Une seule poignée de main TLS vers le domaine, partagée par check_ssl et check_web (chargée seulement si besoin)
+    target = TargetContext(domain)
+    SCANS_IN_FLIGHT.inc()
+    try:
+        # Résolution A/AAAA une seule fois pour le TLS et les ports ; en cas d'échec chaque vérification remonte l'erreur
+        if addresses is None:
+            try:
+                addresses = await asyncio.wait_for(_resolve_or_none(domain), expires_at - loop.time())
+            except asyncio.TimeoutError:
+                pass
+        results, previous, signals, stale = {}, None, None, {}
+        if incremental:
+            previous = await snapshots.aget(domain)
+            try:
+                signals = await asyncio.wait_for(_change_signals(domain, addresses, ports, target), max(expires_at - loop.time(), 0))
+            except asyncio.TimeoutError:
+                signals = {}
+            stale = {name: "rafraîchissement forcé" for name in CHECK_SIGNALS} if force_refresh else \
+                stale_checks(previous, signals, INCREMENTAL_MAX_AGE)
+            for name in CHECK_SIGNALS.keys() - stale.keys():
+                results[name] = previous["results"][name]
+                yield name, _merge_ports(results[name]) if name == "exposed_ports" else results[name]
+        remaining = max(expires_at - loop.time(), 0)
+        # Vérification relancée en mode incrémental : ses entrées ont changé, le cache de résultats n'est plus valable
+        fresh = {name: force_refresh or name in stale for name in CHECK_SIGNALS}
+        port_progress = {}
+        on_timeout = {"exposed_ports": functools.partial(_partial_ports_result, port_progress)}
+        checks = {
+            "ssl": functools.partial(_run_check, "ssl", functools.partial(check_ssl_async, addresses=addresses, probe_memo=probe_memo,
+                                                                          target=target), domain, limiter, fresh["ssl"]),
+            "web": functools.partial(_run_check, "web", functools.partial(check_web_async, target=target), domain, limiter, fresh["web"]),
+            "email_security": functools.partial(_run_check, "email_security", check_email_security_async, domain, limiter,
+                                                fresh["email_security"]),
+            "exposed_ports": functools.partial(_run_check, "exposed_ports", functools.partial(check_ports_by_ip_async, ports=port_list,
+                                                                                              addresses=addresses, probe_memo=probe_memo,
+                                                                                              progress=port_progress),
+                                               domain, limiter, fresh["exposed_ports"], ports_variant),
+        }
+        names = {asyncio.ensure_future(check(budget=round(remaining * SCAN_BUDGET_SHARES[name], 3), on_timeout=on_timeout.get(name))): name
+                 for name, check in checks.items() if name not in results}
+        pending = set(names)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(expires_at - loop.time(), 0),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = names[task]
+                    results[name] = task.result()
+                    yield name, _merge_ports(results[name]) if name == "exposed_ports" else results[name]
+                if not done:
+                    # Délai du scan écoulé : vérifications encore en attente d'un créneau, ou budget plus long que le délai restant
+                    for task in pending:
+                        task.cancel()
+                        name = names[task]
+                        CHECK_TIMEOUTS.labels(name).inc()
+                        results[name] = on_timeout[name](deadline) if name in on_timeout else _timed_out_result(name, deadline)
+                        yield name, _merge_ports(results[name]) if name == "exposed_ports" else results[name]
+                    break
+        finally:
+            for task in pending: task.cancel()
+        ports_by_ip = results["exposed_ports"]
+        with CHECK_DURATION.labels("evaluate_risk").time():
+            report = evaluate_risk(domain, results["ssl"], results["web"], results["email_security"], _merge_ports(ports_by_ip),
+                                   ports_by_ip)
+        if incremental:
+            now = time.time()
+            checked_at = {name: now if name in stale else previous["checked_at"][name] for name in CHECK_SIGNALS}
+            report["incremental"] = {"rerun": stale, "reused": sorted(CHECK_SIGNALS.keys() - stale.keys())}
+            report["diff"] = diff_reports(previous and previous["report"], report)
+            await snapshots.asave(domain, signals, results, checked_at, {k: v for k, v in report.items() if k not in ("diff", "incremental")})
+        if history: history.record(report)
+        yield "report", report
+    finally:
+        SCANS_IN_FLIGHT.dec()
+        await target.aclose()
+
+async def execute_full_scan_async(domain: str, limiter: ScanLimiter = None, force_refresh: bool = False, ports: str = None,
+                                  probe_memo: ProbeMemo = None, addresses=None, deadline: float = None, incremental: bool = False):
+    async with contextlib.aclosing(iter_scan_events(domain, limiter, force_refresh, ports, probe_memo, addresses, deadline,
+                                                    incremental)) as events:
+        async for name, value in events:
+            if name == "report": return value
+
+BATCH_RESOLVE_CONCURRENCY = int(os.getenv("BATCH_RESOLVE_CONCURRENCY", "500"))
+BATCH_SCAN_TOKENS = float(os.getenv("BATCH_SCAN_TOKENS", "4"))     # jetons à avoir dans le seau d'une IP pour y lancer un scan de plus
+BATCH_DEFER_MAX = int(os.getenv("BATCH_DEFER_MAX", "2000"))        # domaines mis de côté au plus en attendant que leur IP se libère
+
+async def plan_batch(domains):
+    """Résout tous les domaines d'un lot avant de scanner et les regroupe par IP.
+
+    Renvoie ({domaine: adresses ou None}, {ip: [domaines]})."""
+    sem = asyncio.Semaphore(BATCH_RESOLVE_CONCURRENCY)
+    async def resolve(domain):
+        async with sem:
+            return domain, await _resolve_or_none(domain)
+    resolved = dict(await asyncio.gather(*(resolve(d) for d in domains)))
+    by_ip = {}
+    for domain, addresses in resolved.items():
+        for _, ip in addresses or []: by_ip.setdefault(ip, []).append(domain)
+    return resolved, by_ip
+
+async def iter_batch_scan(domains, limiter: ScanLimiter = None, force_refresh: bool = False, ports: str = None, plan_stats: dict = None,
+                          deadline: float = None, incremental: bool = False):
+    """Scanne une liste de domaines et produit les rapports dans l'ordre où ils se terminent.
+
+    Tous les domaines sont d'abord résolus et regroupés par IP : les vérifications à l'échelle
+    de l'IP (ports, TLS obsolète) ne tournent qu'une fois par IP et sont redistribuées à chaque
+    domaine. Seule une fenêtre de domaines est ensuite planifiée à la fois (la limite globale),
+    pour qu'un lot de 20k domaines ne crée pas 80k coroutines d'un coup.
+
+    Un domaine dont l'IP n'a plus assez de jetons (rate_limiter) est mis de côté et les suivants
+    passent devant : 300 domaines sur une même IP s'étalent au rythme du seau au lieu de
+    consommer leur budget en attente. Un scan par IP tourne toujours, pour que le lot avance."""
+    limiter = limiter or ScanLimiter()
+    probe_memo = ProbeMemo()
+    resolved, by_ip = await plan_batch(domains)
+    if plan_stats is not None:
+        plan_stats.update({"domains": len(resolved), "unresolved": sum(1 for a in resolved.values() if a is None),
+                           "unique_ips": len(by_ip), "shared_ips": sum(1 for d in by_ip.values() if len(d) > 1)})
+    pending = {}       # tâche -> IP du domaine (None : non résolu)
+    running = {}       # IP -> scans en cours
+    deferred = []
+    queue = iter(domains)
+    def admit(domain):
+        ip = resolved[domain][0][1] if resolved[domain] else None
+        if ip is not None and running.get(ip) and rate_limiter.available(ip) < BATCH_SCAN_TOKENS * (1 + running[ip]):
+            return False
+        running[ip] = running.get(ip, 0) + 1
+        pending[asyncio.create_task(execute_full_scan_async(domain, limiter, force_refresh, ports, probe_memo,
+                                                            resolved[domain], deadline, incremental))] = ip
+        return True
+    try:
+        while True:
+            deferred = [domain for domain in deferred if len(pending) >= limiter.global_limit or not admit(domain)]
+            for domain in queue:
+                if len(pending) >= limiter.global_limit:
+                    deferred.append(domain)
+                    break
+                if not admit(domain): deferred.append(domain)
+                if len(deferred) >= BATCH_DEFER_MAX: break
+            if not pending and not deferred: return
+            if not pending:
+                await asyncio.sleep(0.25)
+                continue
+            done, _ = await asyncio.wait(pending, timeout=0.25 if deferred else None, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                running[pending.pop(task)] -= 1
+                yield task.result()
+    finally:
+        for task in pending: task.cancel()
+
 def execute_full_scan(domain: str):
-    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as ex:
-        f_ssl   = ex.submit(check_ssl, domain)
-        f_web   = ex.submit(check_web, domain)
-        f_email = ex.submit(check_email_security, domain)
-        f_ports = ex.submit(check_open_ports, domain)
-        ssl_r   = f_ssl.result()
-        web_r   = f_web.result()
-        email_r = f_email.result()
-        ports_r = f_ports.result()
-    
-    return evaluate_risk(domain, ssl_r, web_r, email_r, ports_r)
-
-
-def send_webhook_async(report: dict, webhook_url: str):
-    """Fonction qui tourne en arrière-plan pour pousser le résultat à Make"""
+    """Point d'entrée synchrone (scripts), hors boucle asyncio"""
+    async def run():
+        try:
+            return await execute_full_scan_async(domain)
+        finally:
+            await close_shared_clients()
+    return asyncio.run(run())
+
+
+def send_webhook(report: dict, webhook_url: str):
+    """Confie le rapport à l'outbox : Make le reçoit en tâche de fond, avec reprises en cas d'échec"""
+    webhooks.enqueue(webhook_url, report)
+
+
+def _validate_ports(ports):
+    if ports is None: return
     try:
-        requests.post(webhook_url, json=report, timeout=5)
-    except:
-        pass
+        parse_ports(ports, PORT_PROFILES)
+    except PortSpecError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _validate_domain(domain):
+    domain = domain.strip()
+    # Validation basique du domaine
+    if not DOMAIN_RE.match(domain):
+        raise HTTPException(status_code=400, detail="Format de domaine invalide")
+    return domain
 
+def _event_stream(events, sse: bool):
+    """Flux d'événements (nom, données) en NDJSON (une ligne par événement) ou en Server-Sent Events"""
+    async def body():
+        async for name, payload in events:
+            data = json.dumps(payload, ensure_ascii=False)
+            yield f"event: {name}\ndata: {data}\n\n" if sse else data + "\n"
+    if sse:
+        # X-Accel-Buffering : empêche nginx de retenir les événements
+        return StreamingResponse(body(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+def _wants_sse(accept):
+    return "text/event-stream" in (accept or "")
 
 @app.post("/api/scan")
-def scan_endpoint(request: ScanRequest, background_tasks: BackgroundTasks):
+async def scan_endpoint(request: ScanRequest):
     """
     Déclenche un scan complet du domaine fourni.
     """
-    domain = request.domain.strip()
-    
-    # Validation basique du domaine
-    if not re.match(r'^[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', domain):
-        raise HTTPException(status_code=400, detail="Format de domaine invalide")
+    domain = _validate_domain(request.domain)
+    _validate_ports(request.ports)
 
-    # Exécution du scan
-    report = execute_full_scan(domain)
+    # Mode job : on met en file et on rend la main immédiatement
+    if request.mode == "job":
+        try:
+            job = await job_queue.submit(domain, request.webhook_url, {"force_refresh": request.force_refresh, "ports": request.ports,
+                                                                 "deadline": request.deadline, "incremental": request.incremental})
+        except QueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        return JSONResponse(status_code=202, content={"scan_id": job["scan_id"], "status": job["status"]})
+    if request.mode != "sync":
+        raise HTTPException(status_code=400, detail="Mode inconnu (sync ou job)")
+
+    # Exécution du scan : par un worker en mode pool, sinon ici ; dans les deux cas sous les limites communes aux jobs
+    options = {"force_refresh": request.force_refresh, "ports": request.ports, "deadline": request.deadline,
+               "incremental": request.incremental}
+    report = await (_scan_in_pool(domain, **options) if scan_pool else execute_full_scan_async(domain, scan_limiter, **options))
 
     # Si Make a fourni une URL webhook de retour, on lui envoie le résultat en arrière plan
     if request.webhook_url:
-        background_tasks.add_task(send_webhook_async, report, request.webhook_url)
+        send_webhook(report, request.webhook_url)
 
     return report
 
+@app.post("/api/scan/stream")
+async def scan_stream_endpoint(request: ScanRequest, accept: str = Header(None)):
+    """
+    Scan complet en flux : un événement "check" par vérification dès qu'elle se termine,
+    puis un événement "report" avec le rapport final.
+    NDJSON par défaut, Server-Sent Events si le client envoie Accept: text/event-stream.
+    """
+    domain = _validate_domain(request.domain)
+    _validate_ports(request.ports)
+
+    async def events():
+        # Les événements par vérification ne sortent pas du pool : le scan tourne ici, sous les limites partagées
+        async for name, value in iter_scan_events(domain, scan_limiter, force_refresh=request.force_refresh, ports=request.ports,
+                                                  deadline=request.deadline, incremental=request.incremental):
+            if name == "report":
+                if request.webhook_url: send_webhook(value, request.webhook_url)
+                yield "report", {"event": "report", "domain": domain, "report": value}
+            else:
+                yield "check", {"event": "check", "domain": domain, "check": name, "result": value}
+
+    return _event_stream(events(), _wants_sse(accept))
+
+@app.post("/api/scan/batch")
+async def batch_scan_endpoint(request: BatchScanRequest, accept: str = Header(None)):
+    """
+    Scanne une liste de domaines en une seule requête.
+    Les rapports sont renvoyés en NDJSON (une ligne par domaine) au fur et à mesure,
+    ou en Server-Sent Events (un événement "report" par domaine) si Accept: text/event-stream.
+    """
+    _validate_ports(request.ports)
+    domains, rejected, seen = [], [], set()
+    for raw in request.domains:
+        domain = raw.strip()
+        if domain.lower() in seen: continue
+        seen.add(domain.lower())
+        if DOMAIN_RE.match(domain): domains.append(domain)
+        else: rejected.append({"domain": domain, "error": "Format de domaine invalide"})
+
+    plan = {}
+
+    async def reports():
+        for r in rejected: yield r
+        # Dans ce processus (mémo par IP du lot), sous les limites partagées avec les jobs et les workers
+        async for report in iter_batch_scan(domains, scan_limiter, force_refresh=request.force_refresh, ports=request.ports,
+                                            plan_stats=plan, deadline=request.deadline, incremental=request.incremental):
+            if request.webhook_url: send_webhook(report, request.webhook_url)
+            yield report
+
+    if request.stream:
+        async def events():
+            async for r in reports():
+                yield "report" if "scanned_at" in r else "rejected", r
+        return _event_stream(events(), _wants_sse(accept))
+
+    results = [r async for r in reports()]
+    return {"count": len(results), "plan": plan, "reports": results}
+
+def _normalize_upload(importer: DomainImporter, upload):
+    """Fichier reçu -> fichier temporaire de domaines normalisés (un par ligne), sans tout charger en mémoire"""
+    text = io.TextIOWrapper(upload, encoding="utf-8-sig", errors="replace", newline="")
+    domains = tempfile.TemporaryFile("w+", encoding="utf-8")
+    try:
+        for domain in importer.domains(text): domains.write(domain + "\n")
+    except Exception:
+        domains.close()
+        raise
+    finally:
+        text.detach()
+    domains.seek(0)
+    return domains
+
+async def _feed_import(state, domains, webhook_url, options):
+    """Met les domaines en file dans l'ordre du fichier ; attend qu'une place se libère quand la file est pleine"""
+    try:
+        with domains:
+            for line in domains:
+                await job_queue.submit_wait(line.rstrip("\n"), webhook_url, options)
+                state["submitted"] += 1
+        state["status"] = "done"
+    except asyncio.CancelledError:
+        state["status"] = "cancelled"
+        raise
+    finally:
+        state["task"] = None
+
+@app.post("/api/import")
+async def import_endpoint(request: Request, format: str = "auto", column: str = None, webhook_url: str = None, ports: str = None,
+                          deadline: float = Query(None, gt=0, le=300), incremental: bool = False):
+    """
+    Import en masse d'une liste de prospects (corps brut : CSV, JSONL ou un domaine / une URL / un e-mail par ligne).
+    Chaque entrée est ramenée à son domaine enregistrable et dédupliquée (importer.py), puis mise en file
+    de scans (mode job) dans l'ordre du fichier. Réponse immédiate avec les compteurs ;
+    avancement via GET /api/import/{import_id}, rapports via webhook_url ou /api/history.
+    """
+    _validate_ports(ports)
+    if format not in ("auto", "csv", "jsonl", "txt"):
+        raise HTTPException(status_code=400, detail="Format inconnu (auto, csv, jsonl ou txt)")
+    importer = DomainImporter(format, column)
+    with tempfile.TemporaryFile() as upload:
+        async for chunk in request.stream(): upload.write(chunk)
+        upload.seek(0)
+        try:
+            domains = await asyncio.to_thread(_normalize_upload, importer, upload)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    state = {"import_id": uuid.uuid4().hex, "status": "queuing", "stats": importer.stats, "submitted": 0,
+             "submitted_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"), "task": None}
+    options = {"ports": ports, "deadline": deadline, "incremental": incremental}
+    state["task"] = asyncio.create_task(_feed_import(state, domains, webhook_url, options))
+    imports[state["import_id"]] = state
+    while len(imports) > 100: imports.popitem(last=False)
+    return JSONResponse(status_code=202, content={k: v for k, v in state.items() if k != "task"})
+
+@app.get("/api/import/{import_id}")
+def import_status_endpoint(import_id: str):
+    """
+    Avancement d'un import : compteurs de normalisation et nombre de domaines déjà mis en file.
+    """
+    state = imports.get(import_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Import introuvable")
+    return {k: v for k, v in state.items() if k != "task"}
+
+@app.get("/api/scan/{scan_id}")
+def scan_status_endpoint(scan_id: str):
+    """
+    Statut d'un scan lancé en mode job (queued, running, done, failed) et son résultat.
+    """
+    job = job_queue.store.get(scan_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="scan_id inconnu")
+    job.pop("webhook_url", None); job.pop("options", None)
+    return job
+
+async def _scan_in_pool(domain, **options):
+    report = await scan_pool.scan(domain, **options)
+    if history: history.record(report)  # l'historique est tenu par ce processus, pas par les workers
+    return report
+
+def _on_job_done(job: dict):
+    if job["webhook_url"] and job["status"] == "done":
+        send_webhook(job["result"], job["webhook_url"])
+
+@app.get("/api/history")
+def history_endpoint(domain: str = None, reason: str = None, template: str = None, since: str = None, until: str = None,
+                     limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0), full: bool = False):
+    """
+    Rapports déjà produits, du plus récent au plus ancien, sans rescanner.
+    Filtres : domaine, raison (exacte ou famille : "WP xmlrpc exposé", "Port critique"), modèle d'e-mail,
+    période [since, until) en ISO 8601 ("2026-09-01"). full=true inclut raw_data.
+    """
+    return history.store.query(domain, reason, template, since, until, limit, offset, full)
+
+@app.get("/api/certificates/expiring")
+def expiring_certificates_endpoint(days: int = Query(30, ge=0, le=3650), limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0)):
+    """
+    Certificats présentés par les domaines déjà scannés qui expirent d'ici `days` jours (ou ont déjà expiré),
+    du plus proche au plus lointain, avec les domaines concernés. Aucun scan n'est relancé.
+    """
+    return {"days": days, "certificates": cert_store.expiring(days, limit, offset)}
+
+@app.get("/api/webhooks/dead")
+def dead_webhooks_endpoint(limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0)):
+    """
+    Webhooks abandonnés (trop d'essais ou refus définitif), avec leur dernière erreur.
+    """
+    return {"stats": webhooks.stats(), "dead": webhooks.outbox.dead_letters(limit, offset)}
+
+@app.post("/api/webhooks/dead/{webhook_id}/retry")
+async def retry_dead_webhook_endpoint(webhook_id: int):
+    """
+    Remet un webhook abandonné dans la file d'envoi.
+    """
+    if not await webhooks.revive(webhook_id):
+        raise HTTPException(status_code=404, detail="webhook inconnu ou pas en dead-letter")
+    return {"id": webhook_id, "status": "pending"}
+
+def cache_stats():
+    """Caches de ce processus ; en mode pool, cumul des workers (c'est là que les scans tournent)"""
+    if scan_pool: return scan_pool.cache_stats()
+    return {"results": result_cache.stats(), "dns": dns_resolver.stats(), "certificates": cert_store.stats()}
+
+watch_stats(cache_stats, lambda: job_queue.depth() if job_queue else 0)
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Métriques Prometheus : latences et erreurs par vérification, scans en cours, file, caches, webhooks"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/")
 def health_check():
-    return {"status": "OpenClaw API is running", "version": "2.0"}
+    return {"status": "OpenClaw API is running", "version": "2.0", "queued_scans": job_queue.depth() if job_queue else 0,
+            "cache": cache_stats()["results"], "dns_cache": cache_stats()["dns"], "webhooks": webhooks.stats() if webhooks else None,
+            "history": history.stats() if history else None, "scan_pool": scan_pool.stats() if scan_pool else None,
+            "rate_limit": rate_limiter.stats()}
 
 if __name__ == "__main__":
     import uvicorn
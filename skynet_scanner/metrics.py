@@ -0,0 +1,88 @@
+"""Métriques Prometheus du scanner, exposées sur GET /metrics.
+
+Les compteurs déjà tenus ailleurs (caches, file de jobs) ne sont pas dupliqués :
+un collecteur les lit au moment de la collecte.
+
+En mode pool (workers.py), les vérifications tournent surtout dans les workers : chacun
+renvoie ses échantillons (check_samples) avec ses stats de cache, et /metrics expose
+la somme de ceux de ce processus et de ceux des workers (watch_workers).
+"""
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+
+# Hors du registre : exposées par _CheckCollector, additionnées de celles des workers
+CHECK_DURATION = Histogram("skynet_check_duration_seconds", "Durée d'une vérification (hors cache)", ["check"],
+                           buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30), registry=None)
+CHECK_ERRORS = Counter("skynet_check_errors_total", "Erreurs rencontrées (y compris celles ignorées), par type d'exception",
+                       ["check", "error"], registry=None)
+CHECK_TIMEOUTS = Counter("skynet_check_timeouts_total", "Vérifications annulées faute de budget", ["check"], registry=None)
+_FORWARDED = (CHECK_DURATION, CHECK_ERRORS, CHECK_TIMEOUTS)
+CHECKS_IN_FLIGHT = Gauge("skynet_checks_in_flight", "Vérifications en cours", ["check"])
+SCANS_IN_FLIGHT = Gauge("skynet_scans_in_flight", "Scans en cours")
+WEBHOOK_DELIVERIES = Counter("skynet_webhook_deliveries_total", "Envois de webhook par issue", ["outcome"])
+
+
+def count_error(check, error):
+    CHECK_ERRORS.labels(check, type(error).__name__).inc()
+
+
+def check_samples():
+    """Échantillons des métriques de vérification de ce processus : [((nom, labels triés), valeur)] (envoyés par les workers)"""
+    return [((s.name, tuple(sorted(s.labels.items()))), s.value) for metric in _FORWARDED for family in metric.collect()
+            for s in family.samples if not s.name.endswith("_created")]
+
+
+def merge_samples(total, samples):
+    """Ajoute les échantillons samples au dict total ; l'ordre d'insertion garde groupées les séries d'un histogramme"""
+    for key, value in samples:
+        total[key] = total.get(key, 0) + value
+    return total
+
+
+class _CheckCollector:
+    def __init__(self):
+        self.workers = None  # fonction -> {(nom, labels): valeur} cumulés des workers, ou None hors mode pool
+
+    def collect(self):
+        samples = merge_samples({}, check_samples())
+        if self.workers: merge_samples(samples, self.workers().items())
+        for metric in _FORWARDED:
+            for family in metric.collect():
+                merged = Metric(family.name, family.documentation, family.type, family.unit)
+                for (name, labels), value in samples.items():
+                    if name.startswith(family.name + "_"): merged.add_sample(name, dict(labels), value)
+                yield merged
+
+
+_checks = _CheckCollector()
+REGISTRY.register(_checks)
+
+
+def watch_workers(samples):
+    """Mode pool : samples() -> échantillons cumulés des workers, ajoutés à ceux de ce processus"""
+    _checks.workers = samples
+
+
+class _StatsCollector:
+    def __init__(self, caches, queue_depth):
+        self.caches = caches            # fonction -> {nom: stats() avec hits / misses / entries}
+        self.queue_depth = queue_depth  # fonction -> nombre de jobs en attente
+
+    def collect(self):
+        lookups = CounterMetricFamily("skynet_cache_lookups", "Consultations du cache", labels=["cache", "outcome"])
+        ratio = GaugeMetricFamily("skynet_cache_hit_ratio", "Part des consultations servies par le cache", labels=["cache"])
+        entries = GaugeMetricFamily("skynet_cache_entries", "Entrées en mémoire", labels=["cache"])
+        for name, stats in self.caches().items():
+            lookups.add_metric([name, "hit"], stats["hits"])
+            lookups.add_metric([name, "miss"], stats["misses"])
+            total = stats["hits"] + stats["misses"]
+            ratio.add_metric([name], stats["hits"] / total if total else 0)
+            entries.add_metric([name], stats["entries"])
+        yield lookups
+        yield ratio
+        yield entries
+        yield GaugeMetricFamily("skynet_scan_queue_depth", "Jobs de scan en attente", value=self.queue_depth())
+
+
+def watch_stats(caches, queue_depth):
+    REGISTRY.register(_StatsCollector(caches, queue_depth))
@@ -0,0 +1,81 @@
+"""Résolution A/AAAA unique par domaine et connexions "Happy Eyeballs" (RFC 8305 simplifiée).
+
+Toutes les adresses d'un domaine sont connues d'avance : les sondes peuvent alors
+viser chaque IP (résultats par IP, IP partagées sondées une seule fois par lot) et
+une première adresse morte ne coûte plus un timeout complet.
+"""
+import asyncio
+import itertools
+import socket
+import ssl
+
+from dns_resolver import DNSError
+
+
+def interleave(addresses):
+    """Alterne IPv6 / IPv4 (IPv6 d'abord), en gardant l'ordre de chaque famille"""
+    v6 = [a for a in addresses if a[0] == socket.AF_INET6]
+    v4 = [a for a in addresses if a[0] != socket.AF_INET6]
+    return [a for pair in itertools.zip_longest(v6, v4) for a in pair if a is not None]
+
+
+async def resolve_addresses(host, resolver=None):
+    """[(famille, ip), ...] pour host : A/AAAA via le résolveur partagé, getaddrinfo en secours"""
+    addresses = []
+    if resolver is not None:
+        answers = await asyncio.gather(resolver.resolve(host, "AAAA"), resolver.resolve(host, "A"), return_exceptions=True)
+        for family, records in zip((socket.AF_INET6, socket.AF_INET), answers):
+            if not isinstance(records, BaseException):
+                addresses += [(family, ip) for ip in records]
+            elif not isinstance(records, DNSError):
+                raise records
+    if not addresses:
+        # /etc/hosts, noms locaux, ou résolveur injoignable
+        infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys((i[0], i[4][0]) for i in infos))
+    return interleave(addresses)
+
+
+def _close_connection(task):
+    if not task.cancelled() and task.exception() is None:
+        task.result()[2].close()
+
+
+async def _attempt(ip, port, kwargs, limiter):
+    if limiter is not None: await limiter.acquire(ip)
+    reader, writer = await asyncio.open_connection(ip, port, **kwargs)
+    return ip, reader, writer
+
+
+async def race_connections(addresses, port, timeout, delay=0.25, limiter=None, **kwargs):
+    """Lance une tentative par adresse, décalées de `delay` ; la première connexion établie gagne.
+
+    Renvoie (ip, reader, writer). kwargs est passé à asyncio.open_connection (ssl, server_hostname...) ;
+    limiter (RateLimiter, ratelimit.py) donne un jeton par IP avant chaque tentative.
+    En cas d'échec partout, l'erreur de certificat est préférée aux autres (elle est significative)."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    remaining, pending, errors = list(addresses), set(), []
+    try:
+        while remaining or pending:
+            if remaining:
+                _, ip = remaining.pop(0)
+                pending.add(asyncio.create_task(_attempt(ip, port, kwargs, limiter)))
+            wait = deadline - loop.time()
+            if remaining: wait = min(wait, delay)
+            if wait <= 0: break
+            done, pending = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            winners = [t for t in done if t.exception() is None]
+            errors += [t.exception() for t in done if t.exception() is not None]
+            if winners:
+                for extra in winners[1:]: _close_connection(extra)
+                return winners[0].result()
+        if not addresses:
+            raise OSError(f"Aucune adresse pour le port {port}")
+        cert_errors = [e for e in errors if isinstance(e, ssl.SSLCertVerificationError)]
+        if cert_errors: raise cert_errors[0]
+        raise errors[-1] if errors and not pending else asyncio.TimeoutError()
+    finally:
+        for t in pending:
+            t.cancel()
+            t.add_done_callback(_close_connection)
@@ -0,0 +1,128 @@
+"""Balayage de ports TCP non bloquant.
+
+L'hôte est résolu une seule fois, puis chaque port de chaque adresse (IPv4 et IPv6)
+est sondé par un connect() non bloquant sur la boucle asyncio. Le nombre de sockets
+ouverts simultanément est plafonné pour tout le processus, quel que soit le nombre
+de domaines en cours, et chaque sonde peut prendre une fraction de jeton (rate_cost :
+un SYN vers un port fermé ne coûte presque rien au serveur) dans un RateLimiter
+(ratelimit.py) par IP et par réseau. Un ProbeMemo partagé par un lot évite de sonder
+deux fois la même IP quand plusieurs domaines pointent dessus (hébergement mutualisé).
+"""
+import asyncio
+import functools
+import socket
+
+# Les 100 ports TCP les plus fréquemment ouverts (classement nmap-services)
+TOP_100_PORTS = [
+    7, 9, 13, 21, 22, 23, 25, 26, 37, 53, 79, 80, 81, 88, 106, 110, 111, 113, 119, 135, 139, 143, 144, 179,
+    199, 389, 427, 443, 444, 445, 465, 513, 514, 515, 543, 544, 548, 554, 587, 631, 646, 873, 990, 993, 995,
+    1025, 1026, 1027, 1028, 1029, 1110, 1433, 1720, 1723, 1755, 1900, 2000, 2001, 2049, 2121, 2717, 3000,
+    3128, 3306, 3389, 3986, 4899, 5000, 5009, 5051, 5060, 5101, 5190, 5357, 5432, 5631, 5666, 5800, 5900,
+    6000, 6001, 6646, 7070, 8000, 8008, 8009, 8080, 8081, 8443, 8888, 9100, 9999, 10000, 32768, 49152,
+    49153, 49154, 49155, 49156, 49157,
+]
+
+PORT_PROFILES = {
+    "top100": TOP_100_PORTS,
+    "well_known": list(range(1, 1025)),
+}
+
+
+class PortSpecError(ValueError):
+    pass
+
+
+def parse_ports(spec, profiles=PORT_PROFILES):
+    """Nom de profil ou liste "22,80,8000-8100" -> liste triée de ports"""
+    if spec in profiles:
+        return sorted(set(profiles[spec]))
+    ports = set()
+    try:
+        for item in filter(None, (p.strip() for p in spec.split(","))):
+            low, _, high = item.partition("-")
+            ports.update(range(int(low), int(high or low) + 1))
+    except ValueError:
+        raise PortSpecError(f"Ports invalides: {spec}")
+    if not ports or min(ports) < 1 or max(ports) > 65535:
+        raise PortSpecError(f"Ports invalides: {spec}")
+    return sorted(ports)
+
+
+def service_name(port, known=None):
+    if known and port in known:
+        return known[port]
+    try:
+        return socket.getservbyport(port, "tcp")
+    except OSError:
+        return "inconnu"
+
+
+class ProbeMemo:
+    """Sondes (ip, port) déjà lancées pendant un lot -> tâche asyncio (résultat partagé)"""
+
+    def __init__(self):
+        self._probes = {}
+        self.reused = 0
+
+    def get_or_start(self, key, start):
+        task = self._probes.get(key)
+        if task is None:
+            task = self._probes[key] = asyncio.ensure_future(start())
+        else:
+            self.reused += 1
+        return task
+
+
+async def _record(probe, found, port):
+    is_open = await probe
+    if is_open: found.append(port)
+    return is_open
+
+
+class PortScanner:
+    def __init__(self, max_sockets=2000, timeout=2.0, rate_limiter=None, rate_cost=0.1):
+        self.max_sockets = max_sockets
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.rate_cost = rate_cost
+        self._sockets = {}  # boucle asyncio -> sémaphore (un sémaphore est lié à sa boucle)
+
+    def _socket_slots(self):
+        loop = asyncio.get_running_loop()
+        sem = self._sockets.get(loop)
+        if sem is None:
+            self._sockets = {l: s for l, s in self._sockets.items() if not l.is_closed()}
+            sem = self._sockets[loop] = asyncio.Semaphore(self.max_sockets)
+        return sem
+
+    async def probe(self, family, ip, port):
+        loop = asyncio.get_running_loop()
+        # Jeton d'abord : une sonde qui attend son tour ne bloque pas un socket
+        if self.rate_limiter is not None: await self.rate_limiter.acquire(ip, self.rate_cost)
+        async with self._socket_slots():
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            try:
+                await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), self.timeout)
+                return True
+            except (OSError, asyncio.TimeoutError):
+                return False
+            finally:
+                sock.close()
+
+    async def sweep(self, addresses, ports, memo=None, found=None):
+        """{ip: [ports ouverts]} pour chaque (famille, ip) de addresses.
+
+        found (dict) reçoit {ip: [ports ouverts]} au fil des sondes : si le balayage est annulé
+        (budget dépassé), l'appelant garde ce qui a déjà été trouvé."""
+        probes = []
+        for family, ip in addresses:
+            for port in ports:
+                if memo is None:
+                    probe = self.probe(family, ip, port)
+                else:
+                    start = functools.partial(self.probe, family, ip, port)
+                    probe = asyncio.shield(memo.get_or_start((ip, port), start))
+                probes.append(probe if found is None else _record(probe, found.setdefault(ip, []), port))
+        results = iter(await asyncio.gather(*probes))
+        return {ip: [p for p in ports if next(results)] for _, ip in addresses}
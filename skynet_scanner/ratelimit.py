@@ -0,0 +1,216 @@
+"""Politesse envers les cibles : seaux à jetons par IP et par réseau (/24 en IPv4, /48 en IPv6).
+
+Un lot de 300 domaines hébergés sur la même IP OVH ne doit pas devenir 300 rafales de
+sondes en parallèle vers cette IP : c'est ce qui nous fait bloquer, et les blocages
+coûtent ensuite des timeouts. Chaque connexion (sonde de port, poignée de main TLS,
+requête HTTP) prend un jeton dans le seau de son IP et un dans celui de son réseau,
+qui approche l'hébergeur sans base d'ASN. Un seau se remplit de `rate` jetons par
+seconde, jusqu'à `burst`.
+
+Les jetons ne sont jamais réservés : une sonde annulée (budget dépassé) pendant qu'elle
+attend ne consomme rien. Les seaux vivent dans un stockage interchangeable : en mémoire
+pour un processus, en mémoire partagée pour le pool de processus de workers.py.
+
+L'attente d'un jeton n'est pas la faute de la cible : elle est comptée sur la WaitClock de
+la vérification en cours (contextvar), que main._within_budget retire du budget consommé.
+"""
+import asyncio
+import contextvars
+import ipaddress
+import time
+import zlib
+
+import httpx
+
+
+def _wait(levels, buckets, cost):
+    """Attente (s) avant que tous les seaux aient cost jetons ; 0 s'ils les ont déjà"""
+    return max(((cost - level) / rate for level, (_, rate, _) in zip(levels, buckets) if level < cost), default=0)
+
+
+_clock = contextvars.ContextVar("ratelimit_clock", default=None)
+
+
+class WaitClock:
+    """Temps passé par une vérification à attendre des jetons ; des attentes simultanées
+    (sondes de ports en parallèle) ne comptent qu'une fois"""
+
+    def __init__(self):
+        self._waiting = 0
+        self._since = 0.0
+        self._total = 0.0
+
+    def paused(self, now):
+        return self._total + (now - self._since if self._waiting else 0)
+
+    def enter(self, now):
+        if not self._waiting: self._since = now
+        self._waiting += 1
+
+    def leave(self, now):
+        self._waiting -= 1
+        if not self._waiting: self._total += now - self._since
+
+    async def run(self, coro):
+        """Exécute coro (dans sa propre tâche) avec cette horloge : les tâches qu'elle lance en héritent"""
+        _clock.set(self)
+        return await coro
+
+
+class MemoryBucketStore:
+    """Seaux d'un seul processus ; ceux qui se sont remplis à nouveau sont oubliés (mémoire bornée)"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}  # clé -> [jetons, horodatage, instant où le seau sera plein]
+
+    def _levels(self, buckets, now):
+        levels = []
+        for key, rate, burst in buckets:
+            entry = self._buckets.get(key)
+            levels.append(burst if entry is None else min(burst, entry[0] + (now - entry[1]) * rate))
+        return levels
+
+    def take(self, buckets, now, cost=1):
+        """Prend cost jetons dans chacun des seaux [(clé, rate, burst), ...] si tous en ont ; sinon attente conseillée (s)"""
+        if len(self._buckets) > self.max_keys:
+            self._buckets = {k: b for k, b in self._buckets.items() if b[2] > now}
+        levels = self._levels(buckets, now)
+        wait = _wait(levels, buckets, cost)
+        if wait: return wait
+        for level, (key, rate, burst) in zip(levels, buckets):
+            self._buckets[key] = [level - cost, now, now + (burst - level + cost) / rate]
+        return 0
+
+    def peek(self, buckets, now):
+        """Jetons disponibles dans le plus vide des seaux, sans rien prendre"""
+        return min(self._levels(buckets, now))
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SharedBucketStore:
+    """Seaux en mémoire partagée entre processus (même idée que SharedLimiter : clés réparties sur
+    un nombre fixe de cases par hash stable ; deux clés sur la même case partagent leur budget)"""
+
+    def __init__(self, slots=65536, context=None):
+        import multiprocessing
+        context = context or multiprocessing.get_context("spawn")
+        self.slots = slots
+        self._buckets = context.Array("d", 2 * slots)  # [2i] : jetons ; [2i + 1] : horodatage (0 = jamais servi, seau plein)
+
+    def _slot(self, key):
+        return 2 * (zlib.crc32(key.encode()) % self.slots)
+
+    def _levels(self, slots, buckets, now):
+        # time.monotonic() est commun à tous les processus d'une même machine
+        levels = []
+        for slot, (_, rate, burst) in zip(slots, buckets):
+            stamp = self._buckets[slot + 1]
+            levels.append(burst if stamp == 0 else min(burst, self._buckets[slot] + (now - stamp) * rate))
+        return levels
+
+    def take(self, buckets, now, cost=1):
+        slots = [self._slot(key) for key, _, _ in buckets]
+        with self._buckets.get_lock():
+            levels = self._levels(slots, buckets, now)
+            wait = _wait(levels, buckets, cost)
+            if wait: return wait
+            for slot, level in zip(slots, levels):
+                self._buckets[slot], self._buckets[slot + 1] = level - cost, now
+            return 0
+
+    def peek(self, buckets, now):
+        slots = [self._slot(key) for key, _, _ in buckets]
+        with self._buckets.get_lock():
+            return min(self._levels(slots, buckets, now))
+
+    def __len__(self):
+        with self._buckets.get_lock():
+            return sum(1 for stamp in self._buckets.get_obj()[1::2] if stamp)
+
+
+class RateLimiter:
+    """Budgets par IP et par réseau ; rate=0 désactive le niveau correspondant"""
+
+    def __init__(self, ip_rate=20, ip_burst=40, net_rate=60, net_burst=120, store=None, v4_prefix=24, v6_prefix=48):
+        self.ip_rate, self.ip_burst = ip_rate, max(1, ip_burst)
+        self.net_rate, self.net_burst = net_rate, max(1, net_burst)
+        self.store = store or MemoryBucketStore()
+        self.prefixes = {4: v4_prefix, 6: v6_prefix}
+        self.throttled = 0     # prises de jeton qui ont dû attendre
+        self.waited = 0.0      # secondes d'attente cumulées
+
+    @property
+    def enabled(self):
+        return self.ip_rate > 0 or self.net_rate > 0
+
+    def buckets(self, ip):
+        """[(clé, rate, burst), ...] pour une connexion vers ip ; un nom d'hôte non résolu compte comme sa propre IP"""
+        buckets = []
+        if self.ip_rate > 0: buckets.append((f"ip:{ip}", self.ip_rate, self.ip_burst))
+        if self.net_rate > 0:
+            try:
+                address = ipaddress.ip_address(ip.split("%", 1)[0])
+                network = ipaddress.ip_network(f"{address}/{self.prefixes[address.version]}", strict=False)
+                buckets.append((f"net:{network}", self.net_rate, self.net_burst))
+            except ValueError:
+                pass
+        return buckets
+
+    async def acquire(self, ip, cost=1):
+        """Attend que les seaux de ip aient cost jetons et les prend ; l'attente est comptée sur la WaitClock en cours"""
+        buckets = self.buckets(ip) if self.enabled else None
+        if not buckets: return
+        wait = self.store.take(buckets, time.monotonic(), cost)
+        if not wait: return
+        self.throttled += 1
+        clock = _clock.get()
+        if clock: clock.enter(time.monotonic())
+        try:
+            while wait:
+                self.waited += wait
+                await asyncio.sleep(wait)
+                wait = self.store.take(buckets, time.monotonic(), cost)
+        finally:
+            if clock: clock.leave(time.monotonic())
+
+    def available(self, ip):
+        """Jetons disponibles pour une connexion vers ip (infini sans limite)"""
+        buckets = self.buckets(ip) if self.enabled else None
+        return self.store.peek(buckets, time.monotonic()) if buckets else float("inf")
+
+    def stats(self):
+        return {"ip_rate": self.ip_rate, "net_rate": self.net_rate, "buckets": len(self.store),
+                "throttled": self.throttled, "waited_seconds": round(self.waited, 1)}
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """Transport httpx qui prend un jeton avant chaque requête, pour la première IP de l'hôte.
+
+    resolve(hôte) -> [(famille, ip), ...] doit être rapide (résolveur avec cache) ; une
+    requête sur une connexion déjà ouverte paie aussi son jeton : le serveur la voit passer."""
+
+    def __init__(self, limiter, resolve, **kwargs):
+        self.limiter = limiter
+        self.resolve = resolve
+        self._transport = httpx.AsyncHTTPTransport(**kwargs)
+
+    async def handle_async_request(self, request):
+        if self.limiter.enabled:
+            host = request.url.host
+            try:
+                ipaddress.ip_address(host)
+                ip = host
+            except ValueError:
+                try:
+                    addresses = await self.resolve(host)
+                except OSError:
+                    addresses = None  # l'échec de résolution remontera de la connexion elle-même
+                ip = addresses[0][1] if addresses else host
+            await self.limiter.acquire(ip)
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self):
+        await self._transport.aclose()
@@ -0,0 +1,182 @@
+"""Resolver contre un serveur DNS local : partage des requêtes, TTL, cache négatif, erreurs, repli DoH"""
+import asyncio
+import collections
+import socket
+import threading
+import time
+
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+import httpx
+import pytest
+
+from dns_resolver import DNSError, Resolver
+
+
+class StubDNS:
+    """Serveur UDP en thread : records[(nom, type)] = (ttl, [valeurs]) ; rcodes[nom] force un code (SERVFAIL...).
+
+    Un nom absent de records mais présent pour un autre type répond NOERROR sans réponse (NODATA),
+    sinon NXDOMAIN ; les deux avec un SOA dont le minimum vaut negative_ttl."""
+
+    def __init__(self, delay=0.0, negative_ttl=1):
+        self.records = {}
+        self.rcodes = {}
+        self.queries = collections.Counter()
+        self.delay = delay
+        self.negative_ttl = negative_ttl
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind(("127.0.0.1", 0))
+        self.address = self._sock.getsockname()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                wire, client = self._sock.recvfrom(4096)
+            except OSError:
+                return
+            self._sock.sendto(self._answer(wire), client)
+
+    def _answer(self, wire):
+        query = dns.message.from_wire(wire)
+        question = query.question[0]
+        name, rdtype = question.name.to_text().rstrip(".").lower(), dns.rdatatype.to_text(question.rdtype)
+        self.queries[(name, rdtype)] += 1
+        if self.delay: time.sleep(self.delay)
+        response = dns.message.make_response(query)
+        if name in self.rcodes:
+            response.set_rcode(self.rcodes[name])
+        elif (name, rdtype) in self.records:
+            ttl, values = self.records[(name, rdtype)]
+            response.answer.append(dns.rrset.from_text(question.name, ttl, "IN", rdtype, *values))
+        else:
+            if not any(n == name for n, _ in self.records): response.set_rcode(dns.rcode.NXDOMAIN)
+            response.authority.append(dns.rrset.from_text(
+                name.split(".", 1)[-1] + ".", 3600, "IN", "SOA", f"ns. hostmaster. 1 7200 900 1209600 {self.negative_ttl}"))
+        return response.to_wire()
+
+    def close(self):
+        self._sock.close()
+
+
+@pytest.fixture
+def stub():
+    server = StubDNS()
+    yield server
+    server.close()
+
+
+def resolver(stub, **options):
+    return Resolver([stub.address], timeout=1, **{"min_ttl": 0, **options})
+
+
+def test_concurrent_lookups_share_one_query(stub):
+    stub.delay = 0.1
+    stub.records[("example.com", "TXT")] = (300, ['"v=spf1 -all"'])
+    r = resolver(stub)
+
+    async def run():
+        return await asyncio.gather(*(r.resolve("example.com", "TXT") for _ in range(50)))
+    results = asyncio.run(run())
+    assert results == [["v=spf1 -all"]] * 50
+    assert stub.queries[("example.com", "TXT")] == 1
+    assert r.stats()["inflight"] == 0
+
+
+def test_ttl_expiry(stub):
+    stub.records[("example.com", "A")] = (1, ["192.0.2.1"])
+    r = resolver(stub)
+
+    async def run():
+        first = await r.resolve("example.com", "A")
+        await r.resolve("EXAMPLE.com.", "A")  # même clé : servi par le cache
+        assert stub.queries[("example.com", "A")] == 1
+        stub.records[("example.com", "A")] = (1, ["192.0.2.2"])
+        await asyncio.sleep(1.1)
+        return first, await r.resolve("example.com", "A")
+    assert asyncio.run(run()) == (["192.0.2.1"], ["192.0.2.2"])
+    assert stub.queries[("example.com", "A")] == 2
+
+
+def test_min_ttl_floor(stub):
+    stub.records[("example.com", "A")] = (0, ["192.0.2.1"])
+    r = resolver(stub, min_ttl=30)
+
+    async def run():
+        for _ in range(3): await r.resolve("example.com", "A")
+    asyncio.run(run())
+    assert stub.queries[("example.com", "A")] == 1
+
+
+@pytest.mark.parametrize("name", ["missing.example.com", "example.com"], ids=["nxdomain", "nodata"])
+def test_negative_answers_are_cached(stub, name):
+    stub.records[("example.com", "A")] = (300, ["192.0.2.1"])
+    r = resolver(stub)
+
+    async def run():
+        results = [await r.resolve(name, "TXT") for _ in range(3)]
+        await asyncio.sleep(1.1)  # minimum du SOA : 1 s
+        results.append(await r.resolve(name, "TXT"))
+        return results
+    assert asyncio.run(run()) == [[]] * 4
+    assert stub.queries[(name, "TXT")] == 2
+
+
+def test_errors_are_not_cached(stub):
+    stub.rcodes["example.com"] = dns.rcode.SERVFAIL
+    r = resolver(stub)
+
+    async def run():
+        with pytest.raises(DNSError):
+            await r.resolve("example.com", "TXT")
+        del stub.rcodes["example.com"]
+        stub.records[("example.com", "TXT")] = (300, ['"ok"'])
+        return await r.resolve("example.com", "TXT")
+    assert asyncio.run(run()) == ["ok"]
+    assert stub.queries[("example.com", "TXT")] == 2
+
+
+def test_concurrent_callers_share_the_error(stub):
+    stub.delay = 0.1
+    stub.rcodes["example.com"] = dns.rcode.SERVFAIL
+    r = resolver(stub)
+
+    async def run():
+        return await asyncio.gather(*(r.resolve("example.com", "TXT") for _ in range(10)), return_exceptions=True)
+    assert all(isinstance(e, DNSError) for e in asyncio.run(run()))
+    assert stub.queries[("example.com", "TXT")] == 1
+
+
+def test_doh_fallback(stub):
+    stub.rcodes["example.com"] = dns.rcode.SERVFAIL
+    stub.rcodes["missing.example.com"] = dns.rcode.SERVFAIL
+    calls = []
+
+    def doh(request):
+        calls.append((request.url.params["name"], request.url.params["type"]))
+        if request.url.params["name"] == "missing.example.com":
+            return httpx.Response(200, json={"Status": 3})
+        return httpx.Response(200, json={"Status": 0, "Answer": [{"type": 16, "TTL": 300, "data": '"v=spf1 " "-all"'}]})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(doh)) as client:
+            r = resolver(stub, doh_client=lambda: client)
+            records = [await r.resolve("example.com", "TXT") for _ in range(2)]
+            return records, await r.resolve("missing.example.com", "TXT")
+    records, missing = asyncio.run(run())
+    assert records == [["v=spf1 -all"]] * 2
+    assert missing == []
+    assert calls == [("example.com", "TXT"), ("missing.example.com", "TXT")]  # la réponse DoH est mise en cache
+
+
+def test_doh_failure_raises(stub):
+    stub.rcodes["example.com"] = dns.rcode.SERVFAIL
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json={"Status": 2}))) as client:
+            with pytest.raises(DNSError):
+                await resolver(stub, doh_client=lambda: client).resolve("example.com", "TXT")
+    asyncio.run(run())
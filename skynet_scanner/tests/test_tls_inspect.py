@@ -0,0 +1,99 @@
+"""probe_matrix et probe_stapling contre un serveur TLS local aux versions et chiffrements imposés"""
+import asyncio
+import contextlib
+import ssl
+import warnings
+
+import pytest
+
+import tls_inspect
+
+
+@contextlib.asynccontextmanager
+async def tls_server(certificate, minimum, maximum, ciphers=None):
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ctx.load_cert_chain(*certificate)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)  # TLSVersion.TLSv1 / TLSv1_1
+        ctx.minimum_version = getattr(ssl.TLSVersion, minimum.replace(".", "_"))
+        ctx.maximum_version = getattr(ssl.TLSVersion, maximum.replace(".", "_"))
+    if ciphers: ctx.set_ciphers(ciphers)
+
+    async def serve(reader, writer):
+        writer.close()
+
+    server = await asyncio.start_server(serve, "127.0.0.1", 0, ssl=ctx)
+    asyncio.get_running_loop().set_exception_handler(lambda loop, context: None)  # poignées de main refusées : attendu
+    async with server:
+        yield server.sockets[0].getsockname()[1]
+
+
+def matrix(certificate, minimum, maximum, ciphers=None, with_ciphers=True):
+    async def run():
+        async with tls_server(certificate, minimum, maximum, ciphers) as port:
+            return await tls_inspect.probe_matrix("127.0.0.1", "localhost", port, timeout=2, ciphers=with_ciphers)
+    return asyncio.run(run())
+
+
+def test_tls12_only(certificate):
+    protocols = matrix(certificate, "TLSv1.2", "TLSv1.2", with_ciphers=False)["protocols"]
+    assert protocols["TLSv1.2"] is True
+    assert protocols["TLSv1.3"] is False
+    # Versions obsolètes refusées (ou non testables si l'OpenSSL local ne les propose plus)
+    assert protocols["TLSv1"] in (False, None) and protocols["TLSv1.1"] in (False, None)
+
+
+def test_tls13_only(certificate):
+    result = matrix(certificate, "TLSv1.3", "TLSv1.3")
+    assert result["protocols"]["TLSv1.3"] is True
+    assert result["protocols"]["TLSv1.2"] is False
+    # Les familles de chiffrements sont sondées jusqu'à TLS 1.2 : toutes refusées
+    assert not any(result["cipher_groups"].values())
+    assert tls_inspect.legacy_protocol(result) is None
+
+
+def test_forward_secrecy_only(certificate):
+    groups = matrix(certificate, "TLSv1.2", "TLSv1.2", "ECDHE+AESGCM")["cipher_groups"]
+    assert groups["FORWARD_SECRECY_AEAD"] is True
+    assert groups["RSA_KEY_EXCHANGE"] is False
+    assert all(groups[g] in (False, None) for g in tls_inspect.WEAK_CIPHER_GROUPS)
+
+
+def test_rsa_key_exchange(certificate):
+    groups = matrix(certificate, "TLSv1.2", "TLSv1.2", "AES128-GCM-SHA256")["cipher_groups"]
+    assert groups["RSA_KEY_EXCHANGE"] is True
+    assert groups["FORWARD_SECRECY_AEAD"] is False
+
+
+def test_legacy_tls10(certificate):
+    if tls_inspect._PROTOCOL_CONTEXTS["TLSv1"] is None:
+        pytest.skip("TLS 1.0 indisponible dans l'OpenSSL local")
+    try:
+        result = matrix(certificate, "TLSv1", "TLSv1", "ALL:@SECLEVEL=0")
+    except ssl.SSLError:
+        pytest.skip("TLS 1.0 refusé côté serveur par l'OpenSSL local")
+    if not result["protocols"]["TLSv1"]:
+        pytest.skip("TLS 1.0 refusé par la politique OpenSSL locale")
+    assert result["protocols"]["TLSv1.2"] is False
+    assert tls_inspect.legacy_protocol(result) == "TLSv1"
+
+
+def test_unreachable_is_unknown():
+    async def run():
+        server = await asyncio.start_server(lambda r, w: None, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        server.close()
+        await server.wait_closed()
+        return await tls_inspect.probe_matrix("127.0.0.1", "localhost", port, timeout=1, ciphers=False)
+    assert set(asyncio.run(run())["protocols"].values()) == {None}
+
+
+def test_stapling_and_chain(certificate):
+    if tls_inspect._OpenSSL is None:
+        pytest.skip("pyOpenSSL absent")
+
+    async def run():
+        async with tls_server(certificate, "TLSv1.2", "TLSv1.3") as port:
+            return await tls_inspect.probe_stapling("127.0.0.1", "localhost", port, timeout=2)
+    result = asyncio.run(run())
+    assert result == {"ocsp_stapled": False, "chain": [{"subject": "localhost", "issuer": "localhost"}]}
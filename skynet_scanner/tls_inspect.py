@@ -0,0 +1,155 @@
+"""Inspection TLS approfondie : versions et familles de chiffrements acceptées, certificat, agrafage OCSP.
+
+La poignée de main par défaut ne donne que la version négociée ; un serveur qui propose
+TLS 1.3 peut très bien accepter aussi TLS 1.0 ou RC4. Chaque version et chaque famille
+de chiffrements est donc testée par sa propre poignée de main, toutes en parallèle
+(le coût total est celui de la plus lente, pas leur somme). Les contextes client sont
+construits une seule fois au chargement du module.
+
+La matrice versions / chiffrements dépend du serveur, pas du site : dans un lot elle
+n'est sondée qu'une fois par IP (ProbeMemo). L'agrafage OCSP et la chaîne envoyée
+dépendent du certificat, donc du SNI ; ils demandent pyOpenSSL (dans requirements.txt ;
+None s'il n'est pas installé).
+"""
+import asyncio
+import select
+import socket
+import ssl
+import warnings
+
+try:
+    from OpenSSL import SSL as _OpenSSL
+except ImportError:
+    _OpenSSL = None
+
+PROTOCOLS = ("TLSv1", "TLSv1.1", "TLSv1.2", "TLSv1.3")
+LEGACY_PROTOCOLS = ("TLSv1", "TLSv1.1")
+
+# Familles de chiffrements (syntaxe OpenSSL), testées jusqu'à TLS 1.2 : TLS 1.3 n'a que des suites AEAD
+CIPHER_GROUPS = {
+    "NULL": "eNULL:aNULL",
+    "EXPORT": "EXP",
+    "RC4": "RC4",
+    "3DES": "3DES",
+    "RSA_KEY_EXCHANGE": "kRSA",                  # pas de confidentialité persistante
+    "FORWARD_SECRECY_AEAD": "ECDHE+AESGCM:ECDHE+CHACHA20:DHE+AESGCM",
+}
+WEAK_CIPHER_GROUPS = ("NULL", "EXPORT", "RC4", "3DES")
+
+
+def _client_context(minimum, maximum, ciphers="ALL:COMPLEMENTOFALL:@SECLEVEL=0"):
+    """Contexte sans vérification limité à [minimum, maximum] ; None si l'OpenSSL local ne sait pas le faire"""
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            ctx.check_hostname = False
+            ctx.verify_mode = ssl.CERT_NONE
+            ctx.minimum_version = getattr(ssl.TLSVersion, minimum.replace(".", "_"))
+            ctx.maximum_version = getattr(ssl.TLSVersion, maximum.replace(".", "_"))
+            ctx.set_ciphers(ciphers)
+        return ctx
+    except (ValueError, ssl.SSLError):
+        return None
+
+_PROTOCOL_CONTEXTS = {version: _client_context(version, version) for version in PROTOCOLS}
+_CIPHER_CONTEXTS = {group: _client_context("TLSv1", "TLSv1.2", f"{spec}:@SECLEVEL=0") for group, spec in CIPHER_GROUPS.items()}
+
+
+async def _handshake(ip, port, sni, context, timeout, limiter=None):
+    """True : poignée de main acceptée ; False : refusée par le serveur ; None : non testable ou injoignable.
+
+    La connexion TCP est établie à part : un serveur qui refuse en coupant la connexion (RST)
+    au lieu d'envoyer une alerte TLS compte comme un refus, pas comme un serveur injoignable."""
+    if context is None:
+        return None
+    if limiter is not None: await limiter.acquire(ip)  # hors du timeout : attendre son tour n'est pas un refus
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    sock = socket.socket(socket.AF_INET6 if ":" in ip else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), timeout)
+    except (OSError, asyncio.TimeoutError):
+        sock.close()
+        return None
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(sock=sock, ssl=context, server_hostname=sni),
+                                           max(deadline - loop.time(), 0.1))
+    except (OSError, EOFError, asyncio.TimeoutError):  # alerte TLS (ssl.SSLError), RST, fermeture ou silence après le connect
+        sock.close()
+        return False
+    writer.close()
+    return True
+
+
+async def probe_matrix(ip, sni, port=443, timeout=3, ciphers=True, limiter=None):
+    """{"protocols": {version: bool|None}, "cipher_groups": {famille: bool|None}} pour le serveur ip.
+
+    ciphers=False : versions seulement (4 poignées de main au lieu de 10). limiter : RateLimiter (ratelimit.py)."""
+    probes = {("protocols", v): _handshake(ip, port, sni, ctx, timeout, limiter) for v, ctx in _PROTOCOL_CONTEXTS.items()}
+    if ciphers:
+        probes.update({("cipher_groups", g): _handshake(ip, port, sni, ctx, timeout, limiter) for g, ctx in _CIPHER_CONTEXTS.items()})
+    matrix = {"protocols": {}, "cipher_groups": {}}
+    for (kind, name), accepted in zip(probes, await asyncio.gather(*probes.values())):
+        matrix[kind][name] = accepted
+    return matrix
+
+
+def legacy_protocol(matrix):
+    """Version obsolète la plus haute encore acceptée (TLSv1.1, puis TLSv1), ou None"""
+    return next((v for v in reversed(LEGACY_PROTOCOLS) if matrix["protocols"].get(v)), None)
+
+
+def weak_ciphers(matrix):
+    return [g for g in WEAK_CIPHER_GROUPS if matrix["cipher_groups"].get(g)]
+
+
+def _name(rdns, *keys):
+    """Premier attribut trouvé parmi keys dans un sujet/émetteur de getpeercert()"""
+    attrs = dict(attr for rdn in rdns for attr in rdn)
+    return next((attrs[k] for k in keys if k in attrs), None)
+
+
+def describe_certificate(cert, verify_error=None):
+    """Résumé d'un certificat vérifié (getpeercert()) ; seule l'erreur est connue si la vérification a échoué"""
+    if verify_error is not None:
+        return {"chain_valid": False, "chain_error": verify_error, "subject": None, "issuer": None, "sans": [],
+                "not_before": None, "not_after": None, "chain": None}
+    return {
+        "chain_valid": True, "chain_error": None,
+        "subject": _name(cert.get("subject", ()), "commonName"),
+        "issuer": _name(cert.get("issuer", ()), "organizationName", "commonName"),
+        "sans": [value for kind, value in cert.get("subjectAltName", ()) if kind == "DNS"],
+        "not_before": cert.get("notBefore"), "not_after": cert.get("notAfter"),
+        "chain": None,
+    }
+
+
+def _stapling(ip, sni, port, timeout):
+    """Poignée de main pyOpenSSL (bloquante, lancée dans un thread) demandant l'agrafage OCSP"""
+    stapled = []
+    ctx = _OpenSSL.Context(_OpenSSL.TLS_CLIENT_METHOD)
+    ctx.set_ocsp_client_callback(lambda conn, data, _: stapled.append(data) or True)
+    with socket.create_connection((ip, port), timeout=timeout) as sock:
+        conn = _OpenSSL.Connection(ctx, sock)
+        conn.set_tlsext_host_name(sni.encode("idna"))
+        conn.request_ocsp()
+        conn.set_connect_state()
+        while True:
+            try:
+                conn.do_handshake()
+                break
+            except _OpenSSL.WantReadError:
+                if not select.select([sock], [], [], timeout)[0]: raise TimeoutError("handshake")
+        chain = [{"subject": c.get_subject().CN, "issuer": c.get_issuer().O or c.get_issuer().CN}
+                 for c in conn.get_peer_cert_chain() or []]
+    return {"ocsp_stapled": bool(stapled and stapled[0]), "chain": chain}
+
+
+async def probe_stapling(ip, sni, port=443, timeout=3, limiter=None):
+    """{"ocsp_stapled": bool, "chain": [{"subject", "issuer"}]} envoyés pour sni ; None sans pyOpenSSL"""
+    if _OpenSSL is None:
+        return None
+    if limiter is not None: await limiter.acquire(ip)
+    return await asyncio.wait_for(asyncio.to_thread(_stapling, ip, sni, port, timeout), timeout * 2)
@@ -0,0 +1,236 @@
+"""Livraison fiable des webhooks : outbox SQLite, reprises avec backoff exponentiel, dead-letter.
+
+Un rapport à envoyer est d'abord écrit dans l'outbox, puis un répartiteur le POSTe
+en tâche de fond : le scan ne dépend plus de la latence (ni des pannes) du webhook.
+- 2xx : livré, la ligne est supprimée ;
+- 408 / 425 / 429 / 5xx / erreur réseau : nouvel essai plus tard (Retry-After respecté) ;
+- autre 4xx, ou trop d'essais : la ligne passe en dead-letter, consultable et relançable.
+Le nombre de POST simultanés est borné par hôte (Make limite le débit par compte).
+Mode lot optionnel : jusqu'à batch_size rapports d'une même URL dans un seul POST.
+Le répartiteur n'appelle l'outbox (un commit SQLite par changement d'état) que depuis un thread.
+"""
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from metrics import WEBHOOK_DELIVERIES, count_error
+
+PENDING, SENDING, DEAD = "pending", "sending", "dead"
+_RETRYABLE_STATUSES = (408, 425, 429)
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class WebhookOutbox:
+    """Webhooks en attente et en dead-letter ; path=":memory:" si aucune persistance n'est voulue"""
+
+    def __init__(self, path=":memory:"):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS webhook_outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, last_error TEXT, created_at TEXT NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS webhook_outbox_due ON webhook_outbox(status, next_attempt_at)")
+        # Envois interrompus par un arrêt : ils repartent au prochain tour
+        self._db.execute("UPDATE webhook_outbox SET status = ? WHERE status = ?", (PENDING, SENDING))
+        self._db.commit()
+
+    def add(self, url, payload):
+        with self._lock:
+            cur = self._db.execute("INSERT INTO webhook_outbox (url, payload, status, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                                   (url, json.dumps(payload, ensure_ascii=False), PENDING, time.time(), _now()))
+            self._db.commit()
+        return cur.lastrowid
+
+    def claim_due(self, limit):
+        """Passe en "sending" et renvoie jusqu'à limit envois arrivés à échéance : [(id, url, payload, attempts)]"""
+        with self._lock:
+            rows = self._db.execute("SELECT id, url, payload, attempts FROM webhook_outbox WHERE status = ? AND next_attempt_at <= ? "
+                                    "ORDER BY url, id LIMIT ?", (PENDING, time.time(), limit)).fetchall()
+            self._db.executemany("UPDATE webhook_outbox SET status = ? WHERE id = ?", [(SENDING, r[0]) for r in rows])
+            self._db.commit()
+        return [(id_, url, json.loads(payload), attempts) for id_, url, payload, attempts in rows]
+
+    def next_due_in(self):
+        with self._lock:
+            row = self._db.execute("SELECT MIN(next_attempt_at) FROM webhook_outbox WHERE status = ?", (PENDING,)).fetchone()
+        return None if row[0] is None else max(row[0] - time.time(), 0)
+
+    def delivered(self, ids):
+        with self._lock:
+            self._db.executemany("DELETE FROM webhook_outbox WHERE id = ?", [(i,) for i in ids])
+            self._db.commit()
+
+    def reschedule(self, id_, attempts, next_attempt_at, error):
+        with self._lock:
+            self._db.execute("UPDATE webhook_outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                             (PENDING, attempts, next_attempt_at, error, id_))
+            self._db.commit()
+
+    def bury(self, id_, attempts, error):
+        with self._lock:
+            self._db.execute("UPDATE webhook_outbox SET status = ?, attempts = ?, last_error = ? WHERE id = ?",
+                             (DEAD, attempts, error, id_))
+            self._db.commit()
+
+    def dead_letters(self, limit=100, offset=0):
+        with self._lock:
+            rows = self._db.execute("SELECT id, url, attempts, last_error, created_at, payload FROM webhook_outbox WHERE status = ? "
+                                    "ORDER BY id LIMIT ? OFFSET ?", (DEAD, limit, offset)).fetchall()
+        return [{"id": r[0], "url": r[1], "attempts": r[2], "last_error": r[3], "created_at": r[4], "payload": json.loads(r[5])}
+                for r in rows]
+
+    def revive(self, id_):
+        """Remet un envoi en dead-letter dans la file ; False si l'id n'y est pas"""
+        with self._lock:
+            cur = self._db.execute("UPDATE webhook_outbox SET status = ?, attempts = 0, next_attempt_at = ? WHERE id = ? AND status = ?",
+                                   (PENDING, time.time(), id_, DEAD))
+            self._db.commit()
+        return cur.rowcount > 0
+
+    def counts(self):
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM webhook_outbox GROUP BY status").fetchall()
+        return {PENDING: 0, SENDING: 0, DEAD: 0, **dict(rows)}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class WebhookDispatcher:
+    """Vide l'outbox en tâche de fond.
+
+    client : fonction sans argument qui renvoie le httpx.AsyncClient à utiliser."""
+
+    def __init__(self, outbox, client, per_host=4, max_in_flight=100, max_attempts=8, base_delay=2.0, max_delay=900.0,
+                 batch_size=1, timeout=10.0, poll_interval=5.0):
+        self.outbox = outbox
+        self.client = client
+        self.per_host = per_host
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._hosts = {}  # hôte -> sémaphore
+        self._sends = set()
+        self._adds = set()  # écritures dans l'outbox pas encore terminées
+        self._task = None
+        self._wake = None
+
+    async def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Arrête les envois en cours ; ce qui n'est pas livré reste dans l'outbox (les rapports confiés y sont tous écrits)"""
+        await asyncio.gather(*self._adds, return_exceptions=True)
+        for task in (self._task, *self._sends): task.cancel()
+        await asyncio.gather(self._task, *self._sends, return_exceptions=True)
+
+    def enqueue(self, url, report):
+        """Confie report à l'outbox sans attendre l'écriture (faite dans un thread, puis le répartiteur est réveillé)"""
+        task = asyncio.get_running_loop().create_task(self._add(url, report))
+        self._adds.add(task)
+        task.add_done_callback(self._adds.discard)
+
+    async def _add(self, url, report):
+        try:
+            await asyncio.to_thread(self.outbox.add, url, report)
+        except Exception as e:
+            count_error("webhook", e)
+            return
+        if self._wake: self._wake.set()
+
+    async def revive(self, id_):
+        revived = await asyncio.to_thread(self.outbox.revive, id_)
+        if revived and self._wake: self._wake.set()
+        return revived
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            free = self.max_in_flight - len(self._sends)
+            if free > 0:
+                for url, entries in self._groups(await asyncio.to_thread(self.outbox.claim_due, free * self.batch_size)):
+                    task = asyncio.create_task(self._deliver(url, entries))
+                    self._sends.add(task)
+                    task.add_done_callback(self._send_done)
+            # Tous les créneaux occupés : on attend qu'un envoi se termine (_send_done réveille la boucle)
+            wait = await asyncio.to_thread(self.outbox.next_due_in) if len(self._sends) < self.max_in_flight else None
+            wait = self.poll_interval if wait is None else min(wait, self.poll_interval)
+            # asyncio.wait plutôt que wait_for : en 3.11, wait_for avale l'annulation de stop() si le réveil tombe au même moment
+            waiter = asyncio.ensure_future(self._wake.wait())
+            try:
+                await asyncio.wait([waiter], timeout=max(wait, 0.01))
+            finally:
+                waiter.cancel()
+
+    def _send_done(self, task):
+        self._sends.discard(task)
+        self._wake.set()  # un créneau s'est libéré
+
+    def _groups(self, entries):
+        """(url, [entrées]) : un POST par rapport, ou par paquet de batch_size rapports d'une même URL"""
+        by_url = {}
+        for entry in entries: by_url.setdefault(entry[1], []).append(entry)
+        for url, group in by_url.items():
+            for i in range(0, len(group), self.batch_size):
+                yield url, group[i:i + self.batch_size]
+
+    def _host_slot(self, url):
+        host = urlsplit(url).hostname or url
+        sem = self._hosts.get(host)
+        if sem is None: sem = self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return sem
+
+    async def _deliver(self, url, entries):
+        payload = entries[0][2] if self.batch_size == 1 else {"count": len(entries), "reports": [e[2] for e in entries]}
+        async with self._host_slot(url):
+            try:
+                r = await self.client().post(url, json=payload, timeout=self.timeout)
+            except Exception as e:
+                count_error("webhook", e)
+                await asyncio.to_thread(self._failed, entries, str(e) or type(e).__name__, True)
+                return
+        if r.status_code < 300:
+            await asyncio.to_thread(self.outbox.delivered, [e[0] for e in entries])
+            WEBHOOK_DELIVERIES.labels("delivered").inc(len(entries))
+        else:
+            retryable = r.status_code in _RETRYABLE_STATUSES or r.status_code >= 500
+            await asyncio.to_thread(self._failed, entries, f"HTTP {r.status_code}", retryable, self._retry_after(r))
+
+    @staticmethod
+    def _retry_after(response):
+        try:
+            return float(response.headers.get("Retry-After", ""))
+        except ValueError:
+            return None  # absent, ou sous forme de date HTTP : backoff normal
+
+    def _failed(self, entries, error, retryable, retry_after=None):
+        """Reprogramme ou enterre les entrées (appelé dans un thread : écritures SQLite)"""
+        for id_, _, _, attempts in entries:
+            attempts += 1
+            if not retryable or attempts >= self.max_attempts:
+                self.outbox.bury(id_, attempts, error)
+                WEBHOOK_DELIVERIES.labels("dead").inc()
+                continue
+            # Backoff exponentiel avec jitter : les envois en échec ne repartent pas tous en même temps
+            delay = min(retry_after or self.base_delay * 2 ** (attempts - 1) * random.uniform(0.5, 1), self.max_delay)
+            self.outbox.reschedule(id_, attempts, time.time() + delay, error)
+            WEBHOOK_DELIVERIES.labels("retry").inc()
+
+    def stats(self):
+        return {**self.outbox.counts(), "in_flight": len(self._sends)}
@@ -0,0 +1,281 @@
+"""Pool de processus de scan supervisé, avec limites de débit partagées entre processus.
+
+Un seul processus plafonne vers un cœur (décodage HTML, regex, JSON sous le GIL). Avec
+SCAN_PROCESSES > 0, les jobs de scan sont répartis entre des processus workers, chacun
+avec sa propre file, sa boucle asyncio, et plusieurs scans à la fois. Pas de file commune :
+un worker tué pendant qu'il y attendait garderait son verrou et bloquerait tous les autres.
+
+Les limites globale et par cible restent celles de ScanLimiter, mais comptées dans une
+mémoire partagée : tous les processus voient les mêmes compteurs, une cible n'est donc
+jamais sondée plus que prévu quel que soit le nombre de processus. Les cibles sont
+réparties sur un nombre fixe de compteurs (hash stable du nom) ; deux cibles qui tombent
+sur le même compteur partagent leur limite, ce qui ne fait que ralentir. Les seaux à jetons
+de politesse par IP et par réseau (ratelimit.py) sont de même en mémoire partagée.
+
+Le superviseur donne chaque scan au worker le moins chargé (au plus `concurrency` chacun),
+relance un worker mort avec une file neuve, rend ses créneaux et remet ses scans en file (une fois).
+"""
+import asyncio
+import contextlib
+from collections import deque
+import itertools
+import multiprocessing
+import threading
+import zlib
+
+from metrics import check_samples, count_error, merge_samples
+from ratelimit import SharedBucketStore
+
+_STOP = None
+
+
+class SharedLimiter:
+    """Même interface que ScanLimiter (slot(cible), global_limit), compteurs en mémoire partagée.
+
+    Chaque processus se déclare avec bind(rang) : ses créneaux sont aussi comptés sur sa
+    ligne, pour que le superviseur puisse les rendre s'il meurt en les tenant."""
+
+    def __init__(self, global_limit, per_target_limit, processes, buckets=4096, context=None):
+        context = context or multiprocessing.get_context("spawn")
+        self.global_limit = global_limit
+        self.per_target_limit = per_target_limit
+        self.buckets = buckets
+        self._counts = context.Array("i", buckets + 1)  # [0] : total ; [1 + i] : compteur de cible i
+        self._held = context.Array("i", processes * (buckets + 1), lock=self._counts.get_lock())
+        self._row = None
+
+    def bind(self, row):
+        self._row = row * (self.buckets + 1)
+
+    def _bucket(self, target):
+        return 1 + zlib.crc32(target.lower().encode()) % self.buckets
+
+    def _try_acquire(self, bucket):
+        with self._counts.get_lock():
+            if self._counts[0] >= self.global_limit or self._counts[bucket] >= self.per_target_limit:
+                return False
+            for i in (0, bucket):
+                self._counts[i] += 1
+                if self._row is not None: self._held[self._row + i] += 1
+        return True
+
+    def _release(self, bucket):
+        with self._counts.get_lock():
+            for i in (0, bucket):
+                self._counts[i] -= 1
+                if self._row is not None: self._held[self._row + i] -= 1
+
+    @contextlib.asynccontextmanager
+    async def slot(self, target):
+        bucket, delay = self._bucket(target), 0.005
+        # Pas de sémaphore inter-processus attendable depuis asyncio : on réessaie avec un recul croissant
+        while not self._try_acquire(bucket):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        try:
+            yield
+        finally:
+            self._release(bucket)
+
+    def release_row(self, row):
+        """Rend les créneaux tenus par le processus row (mort)"""
+        start = row * (self.buckets + 1)
+        with self._counts.get_lock():
+            for i in range(self.buckets + 1):
+                held = self._held[start + i]
+                if held:
+                    self._counts[i] -= held
+                    self._held[start + i] = 0
+
+    def in_flight(self):
+        return self._counts[0]
+
+
+def _worker_main(index, tasks, results, limiter, buckets, concurrency):
+    """Point d'entrée d'un processus worker : exécute les scans reçus, renvoie les rapports"""
+    import main  # chaque processus a ses propres caches, clients HTTP et résolveur
+    limiter.bind(index)
+    main.rate_limiter.store = buckets
+    asyncio.run(_worker_loop(main, index, tasks, results, limiter, concurrency))
+
+
+async def _worker_loop(main, index, tasks, results, limiter, concurrency):
+    loop = asyncio.get_running_loop()
+    local = asyncio.Queue(maxsize=concurrency)
+
+    def pull():
+        while True:
+            item = tasks.get()
+            asyncio.run_coroutine_threadsafe(local.put(item), loop).result()
+            if item is _STOP: return
+
+    async def run():
+        while True:
+            item = await local.get()
+            if item is _STOP:
+                await local.put(_STOP)  # pour les autres coroutines de ce processus
+                return
+            task_id, domain, options = item
+            try:
+                report = await main.execute_full_scan_async(domain, limiter, **options)
+                results.put(("done", index, task_id, report))
+            except Exception as e:
+                results.put(("failed", index, task_id, str(e) or type(e).__name__))
+            results.put(("stats", index, None, (main.cache_stats(), check_samples())))
+
+    threading.Thread(target=pull, daemon=True).start()
+    try:
+        await asyncio.gather(*(run() for _ in range(concurrency)))
+    finally:
+        await main.close_shared_clients()
+
+
+class ScanWorkerPool:
+    """Superviseur : répartition des scans entre les workers (une file chacun), relance des workers morts.
+
+    scan(domain, **options) a la signature attendue par JobQueue (run_scan)."""
+
+    def __init__(self, processes, concurrency=16, global_limit=200, per_target_limit=2, supervise_interval=1.0):
+        self.processes = processes
+        self.concurrency = concurrency
+        self.supervise_interval = supervise_interval
+        self._context = multiprocessing.get_context("spawn")
+        self.limiter = SharedLimiter(global_limit, per_target_limit, processes, context=self._context)
+        self.buckets = SharedBucketStore(context=self._context)
+        self._results = self._context.Queue()
+        self._workers = [None] * processes
+        self._queues = [None] * processes
+        self._load = [0] * processes  # scans confiés à chaque worker et pas encore rendus
+        self._backlog = deque()      # (task_id, domain, options) en attente d'un worker
+        self._pending = {}   # task_id -> [future, domain, options, essais]
+        self._running = {}   # task_id -> rang du worker (jusqu'au résultat, même si le scan a été abandonné)
+        self._ids = itertools.count()
+        self.restarts = 0
+        self._cache_stats = {}  # rang -> dernières stats de cache du worker (main.cache_stats)
+        self._check_samples = {}  # rang -> derniers échantillons de métriques du worker (metrics.check_samples)
+        self._retired_samples = {}  # cumul des workers morts : les compteurs exposés ne reculent pas à la relance
+        self._supervisor = None
+        self._reader = None
+        self._stopping = False
+
+    def _spawn(self, index):
+        old = self._queues[index]
+        if old is not None:
+            old.cancel_join_thread()  # personne ne la lira plus
+            old.close()
+        self._queues[index] = self._context.Queue()
+        self._cache_stats.pop(index, None)
+        merge_samples(self._retired_samples, self._check_samples.pop(index, ()))
+        self._load[index] = 0
+        process = self._context.Process(target=_worker_main, name=f"skynet-scan-{index}", daemon=True,
+                                        args=(index, self._queues[index], self._results, self.limiter, self.buckets, self.concurrency))
+        process.start()
+        self._workers[index] = process
+
+    def _dispatch(self):
+        while self._backlog:
+            index = min(range(self.processes), key=self._load.__getitem__)
+            if self._load[index] >= self.concurrency: return
+            task_id, domain, options = item = self._backlog.popleft()
+            if task_id not in self._pending: continue  # abandonné avant d'avoir été confié
+            self._load[index] += 1
+            self._running[task_id] = index
+            self._queues[index].put(item)
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        for index in range(self.processes): self._spawn(index)
+        self._reader = threading.Thread(target=self._read_results, args=(loop,), daemon=True)
+        self._reader.start()
+        self._supervisor = asyncio.create_task(self._supervise())
+
+    async def stop(self):
+        self._stopping = True
+        if self._supervisor: self._supervisor.cancel()
+        for queue in self._queues: queue.put(_STOP)
+        await asyncio.to_thread(self._join)
+        self._results.put(_STOP)
+        for future, *_ in self._pending.values():
+            if not future.done(): future.set_exception(RuntimeError("Pool de scan arrêté"))
+
+    def _join(self, timeout=10):
+        for process in self._workers:
+            process.join(timeout)
+            if process.is_alive(): process.terminate()
+
+    async def scan(self, domain, **options):
+        task_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[task_id] = [future, domain, options, 1]
+        self._backlog.append((task_id, domain, options))
+        self._dispatch()
+        try:
+            return await future
+        finally:
+            self._pending.pop(task_id, None)
+
+    def _read_results(self, loop):
+        while True:
+            message = self._results.get()
+            if message is _STOP: return
+            loop.call_soon_threadsafe(self._on_result, *message)
+
+    def _on_result(self, kind, index, task_id, payload):
+        if kind == "stats":
+            self._cache_stats[index], self._check_samples[index] = payload
+            return
+        if self._running.get(task_id) == index:
+            del self._running[task_id]
+            self._load[index] -= 1
+            self._dispatch()
+        entry = self._pending.get(task_id)
+        if entry is None or entry[0].done(): return  # abandonné (annulé côté API)
+        if kind == "done": entry[0].set_result(payload)
+        else: entry[0].set_exception(RuntimeError(payload))
+
+    async def _supervise(self):
+        while True:
+            await asyncio.sleep(self.supervise_interval)
+            for index, process in enumerate(self._workers):
+                if process.is_alive() or self._stopping: continue
+                count_error("worker", RuntimeError(f"exit {process.exitcode}"))
+                self.limiter.release_row(index)
+                self._requeue(index)
+                self.restarts += 1
+                self._spawn(index)
+                self._dispatch()
+
+    def _requeue(self, index):
+        """Scans en cours dans le worker mort : remis en file une fois, puis en échec"""
+        for task_id in [t for t, i in self._running.items() if i == index]:
+            del self._running[task_id]
+            entry = self._pending.get(task_id)
+            if entry is None or entry[0].done(): continue
+            if entry[3] > 1:
+                entry[0].set_exception(RuntimeError("Le processus de scan s'est arrêté deux fois sur ce domaine"))
+                continue
+            entry[3] += 1
+            self._backlog.appendleft((task_id, entry[1], entry[2]))
+
+    def cache_stats(self):
+        """Stats de cache cumulées des workers (celles d'un worker relancé repartent de zéro)"""
+        total = {}
+        for caches in self._cache_stats.values():
+            for name, stats in caches.items():
+                merged = total.setdefault(name, {})
+                for key, value in stats.items():
+                    merged[key] = None if key == "hit_ratio" else merged.get(key, 0) + value
+        for stats in total.values():
+            lookups = stats["hits"] + stats["misses"]
+            if "hit_ratio" in stats and lookups: stats["hit_ratio"] = round(stats["hits"] / lookups, 3)
+        return {name: total.get(name, {"hits": 0, "misses": 0, "entries": 0}) for name in ("results", "dns", "certificates")}
+
+    def check_samples(self):
+        """Métriques de vérification cumulées des workers, morts compris ({(nom, labels): valeur}, pour metrics.watch_workers)"""
+        total = dict(self._retired_samples)
+        for samples in self._check_samples.values(): merge_samples(total, samples)
+        return total
+
+    def stats(self):
+        return {"processes": self.processes, "alive": sum(1 for p in self._workers if p and p.is_alive()),
+                "restarts": self.restarts, "queued_or_running": len(self._pending), "backlog": len(self._backlog), "checks_in_flight": self.limiter.in_flight()}